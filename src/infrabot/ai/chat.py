@@ -5,6 +5,11 @@ from typing import Optional, List, Dict
 from infrabot.ai.completion import completion
 from rich import print as rprint
 from infrabot.ai.config import MODEL_CONFIG
+from infrabot.infra_utils.component_manager import (
+    TerraformComponent,
+    TerraformComponentManager,
+    is_isolated_layout,
+)
 
 default_model = MODEL_CONFIG["chat"]["model"]
 
@@ -22,7 +27,9 @@ class ChatSession:
         """Load the Terraform configuration for the specified component or all components."""
         context = ""
         if component_name:
-            tf_file = os.path.join(self.workdir, f"{component_name}.tf")
+            tf_file = TerraformComponent(
+                name=component_name, terraform_code="", workdir=self.workdir
+            ).tf_file_path
             if os.path.exists(tf_file):
                 with open(tf_file, "r") as f:
                     context = f.read()
@@ -32,6 +39,11 @@ class ChatSession:
                 if file.endswith(".tf"):
                     with open(os.path.join(self.workdir, file), "r") as f:
                         context += f"\n# File: {file}\n{f.read()}\n"
+            # Isolated components live in their own directories
+            if is_isolated_layout(self.workdir):
+                for name in TerraformComponentManager.list_components(self.workdir):
+                    component = TerraformComponent.from_workdir(name, self.workdir)
+                    context += f"\n# File: {component.tf_file_name}\n{component.terraform_code}\n"
         return context
 
     def start_chat(self, component_name: Optional[str] = None):
@@ -1,3 +1,235 @@
-from litellm import completion as litellm_completion
+"""Client of LLM completions, shared by all AI modules.
 
-completion = litellm_completion
+Completions go through litellm, with HTTP clients that keep their connections
+alive in a shared pool, so that concurrent requests of the service reuse
+connections to the model providers instead of paying a TLS handshake each.
+Callers without the langfuse decorators can ask for their completions to be
+logged to Langfuse through litellm's callbacks.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+
+import httpx
+import litellm
+from openai import AsyncOpenAI
+
+from infrabot.ai.config import LANGFUSE_ENABLED
+
+logger = logging.getLogger("infrabot.completion")
+
+# Completions time out after 10 minutes by default, like litellm's
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_MAX_CONNECTIONS = 20
+# Idle connections are kept alive for a minute
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+
+
+def get_completion_timeout() -> float:
+    """Get the timeout of completions in seconds, from LLM_TIMEOUT."""
+    return float(os.getenv("LLM_TIMEOUT", DEFAULT_TIMEOUT))
+
+
+def get_max_connections() -> int:
+    """Get the size of the connection pool, from LLM_MAX_CONNECTIONS."""
+    return int(os.getenv("LLM_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+
+
+def _langfuse_callbacks(traced: bool) -> Dict[str, List[str]]:
+    """litellm arguments logging a single completion to Langfuse, if enabled."""
+    if not (traced and LANGFUSE_ENABLED):
+        return {}
+    return {"success_callback": ["langfuse"], "failure_callback": ["langfuse"]}
+
+
+class CompletionClient:
+    """Sync and async LLM completions over a shared pool of connections.
+
+    The sync HTTP client is created with the completion client and set once as
+    litellm's session, used for all providers with an OpenAI-compatible API.
+    An async HTTP client can only be used in the event loop it was created in,
+    so each event loop gets its own, passed to the completions of these
+    providers. Completions then only pass their own arguments, so threads
+    requesting completions at the same time never change litellm's global state.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+    ):
+        """
+        Args:
+            timeout: Default timeout of completions in seconds, from
+                LLM_TIMEOUT if not set
+            max_connections: Maximum number of connections, all kept alive,
+                from LLM_MAX_CONNECTIONS if not set
+            keepalive_expiry: Seconds after which idle connections are closed
+        """
+        self.timeout = timeout if timeout is not None else get_completion_timeout()
+        max_connections = max_connections or get_max_connections()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._lock = threading.Lock()
+        self.http_client: Optional[httpx.Client] = httpx.Client(
+            limits=self.limits, timeout=self.timeout
+        )
+        litellm.client_session = self.http_client
+        # Async HTTP clients by event loop, dropped with their loop
+        self._async_http_clients: weakref.WeakKeyDictionary = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def async_http_client(self) -> httpx.AsyncClient:
+        """HTTP client of the async completions of the running event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_http_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout)
+                self._async_http_clients[loop] = client
+        return client
+
+    def complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        traced: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Request a completion.
+
+        Args:
+            model: The LLM model to use
+            messages: Messages of the conversation
+            timeout: Timeout of this completion in seconds, the client's if
+                not set
+            traced: Whether to log the completion to Langfuse when enabled,
+                for callers that are not traced by the langfuse decorators
+            **kwargs: Other arguments of litellm.completion, e.g. temperature
+                or stream
+
+        Returns:
+            The response of litellm.completion, or an iterator of its chunks if
+            streamed
+        """
+        return litellm.completion(
+            model=model,
+            messages=messages,
+            timeout=timeout if timeout is not None else self.timeout,
+            **_langfuse_callbacks(traced),
+            **kwargs,
+        )
+
+    async def acomplete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        timeout: Optional[float] = None,
+        traced: bool = False,
+        **kwargs: Any,
+    ) -> Any:
+        """
+        Request a completion asynchronously.
+
+        Args:
+            model: The LLM model to use
+            messages: Messages of the conversation
+            timeout: Timeout of this completion in seconds, the client's if
+                not set
+            traced: Whether to log the completion to Langfuse when enabled,
+                for callers that are not traced by the langfuse decorators
+            **kwargs: Other arguments of litellm.acompletion
+
+        Returns:
+            The response of litellm.acompletion
+        """
+        if "client" not in kwargs:
+            client = self._async_openai_client(model, kwargs)
+            if client is not None:
+                kwargs["client"] = client
+        return await litellm.acompletion(
+            model=model,
+            messages=messages,
+            timeout=timeout if timeout is not None else self.timeout,
+            **_langfuse_callbacks(traced),
+            **kwargs,
+        )
+
+    def _async_openai_client(
+        self, model: str, kwargs: Dict[str, Any]
+    ) -> Optional[AsyncOpenAI]:
+        """Client of a provider with an OpenAI-compatible API over the loop's pool.
+
+        Returns:
+            The client, or None to let litellm create it for other providers
+        """
+        try:
+            _, provider, api_key, api_base = litellm.get_llm_provider(
+                model, api_base=kwargs.get("api_base"), api_key=kwargs.get("api_key")
+            )
+        except Exception:
+            return None
+        if provider != "openai" and provider not in litellm.openai_compatible_providers:
+            return None
+        api_key = (
+            api_key
+            or kwargs.get("api_key")
+            or litellm.api_key
+            or litellm.openai_key
+            or os.getenv("OPENAI_API_KEY")
+        )
+        if not api_key:
+            return None
+        return AsyncOpenAI(
+            api_key=api_key,
+            base_url=api_base or kwargs.get("api_base"),
+            http_client=self.async_http_client(),
+            max_retries=kwargs.get("max_retries", litellm.DEFAULT_MAX_RETRIES),
+        )
+
+    def close(self) -> None:
+        """Close the connections of the sync client.
+
+        The async clients are left to the event loops they were used in.
+        """
+        with self._lock:
+            if self.http_client is not None:
+                self.http_client.close()
+                if litellm.client_session is self.http_client:
+                    litellm.client_session = None
+                self.http_client = None
+
+
+_client: Optional[CompletionClient] = None
+_client_lock = threading.Lock()
+
+
+def get_completion_client() -> CompletionClient:
+    """Get the completion client shared by all AI modules."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = CompletionClient()
+    return _client
+
+
+def completion(**kwargs: Any) -> Any:
+    """Request a completion with the shared client, see CompletionClient.complete."""
+    return get_completion_client().complete(**kwargs)
+
+
+async def acompletion(**kwargs: Any) -> Any:
+    """Request a completion asynchronously with the shared client."""
+    return await get_completion_client().acomplete(**kwargs)
@@ -1,17 +1,17 @@
 """Configuration for AI services."""
 
 from typing import Dict, Any
+import base64
+import hashlib
+import io
 import os
-from openai import OpenAI
+import zipfile
 
 # Check if Langfuse is enabled
 LANGFUSE_ENABLED = bool(
     os.getenv("LANGFUSE_SECRET_KEY") and os.getenv("LANGFUSE_PUBLIC_KEY")
 )
 
-if LANGFUSE_ENABLED:
-    from langfuse.openai import OpenAI
-
 # Model Configuration
 MODEL_CONFIG: Dict[str, Dict] = {
     "summary": {
@@ -81,6 +81,376 @@ IMPORTANT:
 - Include relevant outputs that would be useful for the user, such as resource IDs, endpoints, or connection information.
 """
 
+
+def _lambda_package(filename: str, source: str) -> Dict[str, str]:
+    """Zip the handler of a Lambda template, as base64 and its base64 SHA-256."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        # A fixed timestamp, so that the package only changes with its code
+        info = zipfile.ZipInfo(filename, date_time=(1980, 1, 1, 0, 0, 0))
+        info.external_attr = 0o644 << 16
+        archive.writestr(info, source)
+    package = buffer.getvalue()
+    return {
+        "package": base64.b64encode(package).decode(),
+        "package_hash": base64.b64encode(hashlib.sha256(package).digest()).decode(),
+    }
+
+
+# Pre-validated templates of common components, generated without calling the
+# model when a request asks for nothing more than what they cover.
+# {{slot}} placeholders are replaced by the values found in the request, and
+# {{#slot}}...{{/slot}} ({{^slot}}...{{/slot}}) sections are only kept if the
+# slot is set (unset). {{component}} is the name of the component, prefixing
+# labels and outputs so that components sharing a root module do not clash,
+# and {{default_name}} a name of resources unique to the component and project.
+# Templates only use the aws provider, the only one initialized in projects.
+TERRAFORM_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "s3_bucket": {
+        "description": "a private S3 bucket, encrypted at rest",
+        # Any of these sets of words selects the template
+        "intents": [["s3"], ["bucket"]],
+        # Other words requests for the template may contain
+        "words": [
+            "bucket",
+            "storage",
+            "service",
+            "object",
+            "private",
+            "secure",
+            "encryption",
+            "encrypted",
+        ],
+        "name": r"[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]",
+        "flags": {"versioning": ["versioning", "versioned"]},
+        "code": """resource "aws_s3_bucket" "{{component}}" {
+  {{#name}}
+  bucket = "{{name}}"
+  {{/name}}
+  {{^name}}
+  bucket_prefix = "infrabot-"
+  {{/name}}
+}
+
+resource "aws_s3_bucket_public_access_block" "{{component}}" {
+  bucket = aws_s3_bucket.{{component}}.id
+
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+resource "aws_s3_bucket_server_side_encryption_configuration" "{{component}}" {
+  bucket = aws_s3_bucket.{{component}}.id
+
+  rule {
+    apply_server_side_encryption_by_default {
+      sse_algorithm = "AES256"
+    }
+  }
+}
+{{#versioning}}
+
+resource "aws_s3_bucket_versioning" "{{component}}" {
+  bucket = aws_s3_bucket.{{component}}.id
+
+  versioning_configuration {
+    status = "Enabled"
+  }
+}
+{{/versioning}}
+
+output "{{component}}_bucket_name" {
+  value       = aws_s3_bucket.{{component}}.id
+  description = "Name of the S3 bucket"
+}
+
+output "{{component}}_bucket_arn" {
+  value       = aws_s3_bucket.{{component}}.arn
+  description = "ARN of the S3 bucket"
+}
+""",
+    },
+    "sqs_queue": {
+        "description": "an SQS queue, encrypted at rest",
+        "intents": [["sqs"], ["queue"]],
+        "words": ["queue", "message", "messaging", "encryption", "encrypted"],
+        "name": r"[A-Za-z0-9_-]{1,70}",
+        "flags": {
+            "fifo": ["fifo"],
+            "dead_letter_queue": ["dlq", "dead", "letter", "dead-letter", "redrive"],
+        },
+        "code": """{{#dead_letter_queue}}
+resource "aws_sqs_queue" "{{component}}_dead_letter" {
+  {{#name}}
+  name = "{{name}}-dlq{{#fifo}}.fifo{{/fifo}}"
+  {{/name}}
+  {{^name}}
+  name_prefix = "infrabot-dlq-"
+  {{/name}}
+
+  fifo_queue                = {{fifo}}
+  message_retention_seconds = 1209600
+  sqs_managed_sse_enabled   = true
+}
+
+{{/dead_letter_queue}}
+resource "aws_sqs_queue" "{{component}}" {
+  {{#name}}
+  name = "{{name}}{{#fifo}}.fifo{{/fifo}}"
+  {{/name}}
+  {{^name}}
+  name_prefix = "infrabot-"
+  {{/name}}
+
+  fifo_queue              = {{fifo}}
+  sqs_managed_sse_enabled = true
+  {{#dead_letter_queue}}
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.{{component}}_dead_letter.arn
+    maxReceiveCount     = 5
+  })
+  {{/dead_letter_queue}}
+}
+
+output "{{component}}_queue_url" {
+  value       = aws_sqs_queue.{{component}}.url
+  description = "URL of the SQS queue"
+}
+
+output "{{component}}_queue_arn" {
+  value       = aws_sqs_queue.{{component}}.arn
+  description = "ARN of the SQS queue"
+}
+{{#dead_letter_queue}}
+
+output "{{component}}_dead_letter_queue_url" {
+  value       = aws_sqs_queue.{{component}}_dead_letter.url
+  description = "URL of the dead letter queue"
+}
+{{/dead_letter_queue}}
+""",
+    },
+    "lambda_function": {
+        "description": (
+            "a Lambda function, packaged in an S3 bucket, with a role allowed to "
+            "write its logs"
+        ),
+        "intents": [["lambda"]],
+        "words": [
+            "function",
+            "serverless",
+            "role",
+            "iam",
+            "execution",
+            "log",
+            "logging",
+            "runtime",
+            "memory",
+            "timeout",
+            "hello",
+            "world",
+        ],
+        "name": r"[A-Za-z0-9_-]{1,64}",
+        "values": {
+            "memory_size": {
+                "pattern": r"\b(\d+)\s*mb\b",
+                "default": 128,
+                "min": 128,
+                "max": 10240,
+            },
+            "timeout": {
+                "pattern": r"\b(\d+)\s*(?:s|secs?|seconds?)\b",
+                "default": 3,
+                "min": 1,
+                "max": 900,
+            },
+        },
+        "choices": {
+            "runtime": {
+                "default": "python",
+                "options": {
+                    "python": {
+                        "words": ["python", "python3", "py"],
+                        "params": {
+                            "runtime": "python3.12",
+                            **_lambda_package(
+                                "index.py",
+                                "def handler(event, context):\n"
+                                '    return {"statusCode": 200, "body": "Hello from Lambda"}\n',
+                            ),
+                        },
+                    },
+                    "node": {
+                        "words": ["node", "nodejs", "node.js", "javascript", "js"],
+                        "params": {
+                            "runtime": "nodejs20.x",
+                            **_lambda_package(
+                                "index.js",
+                                "exports.handler = async () => "
+                                '({ statusCode: 200, body: "Hello from Lambda" });\n',
+                            ),
+                        },
+                    },
+                },
+            },
+        },
+        "code": """resource "aws_iam_role" "{{component}}" {
+  name_prefix = "infrabot-lambda-"
+
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action    = "sts:AssumeRole"
+        Effect    = "Allow"
+        Principal = { Service = "lambda.amazonaws.com" }
+      }
+    ]
+  })
+}
+
+resource "aws_iam_role_policy_attachment" "{{component}}_logs" {
+  role       = aws_iam_role.{{component}}.name
+  policy_arn = "arn:aws:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
+}
+
+resource "aws_s3_bucket" "{{component}}_code" {
+  bucket_prefix = "infrabot-lambda-code-"
+  force_destroy = true
+}
+
+resource "aws_s3_object" "{{component}}_code" {
+  bucket         = aws_s3_bucket.{{component}}_code.id
+  key            = "lambda.zip"
+  content_base64 = "{{package}}"
+}
+
+resource "aws_lambda_function" "{{component}}" {
+  {{#name}}
+  function_name = "{{name}}"
+  {{/name}}
+  {{^name}}
+  function_name = "{{default_name}}"
+  {{/name}}
+
+  role             = aws_iam_role.{{component}}.arn
+  runtime          = "{{runtime}}"
+  handler          = "index.handler"
+  s3_bucket        = aws_s3_object.{{component}}_code.bucket
+  s3_key           = aws_s3_object.{{component}}_code.key
+  source_code_hash = "{{package_hash}}"
+  memory_size      = {{memory_size}}
+  timeout          = {{timeout}}
+
+  depends_on = [aws_iam_role_policy_attachment.{{component}}_logs]
+}
+
+output "{{component}}_function_name" {
+  value       = aws_lambda_function.{{component}}.function_name
+  description = "Name of the Lambda function"
+}
+
+output "{{component}}_function_arn" {
+  value       = aws_lambda_function.{{component}}.arn
+  description = "ARN of the Lambda function"
+}
+
+output "{{component}}_role_arn" {
+  value       = aws_iam_role.{{component}}.arn
+  description = "ARN of the execution role of the Lambda function"
+}
+""",
+    },
+    "dynamodb_table": {
+        "description": "an on-demand DynamoDB table, encrypted at rest",
+        "intents": [["dynamodb"], ["dynamo"]],
+        "words": [
+            "table",
+            "db",
+            "database",
+            "nosql",
+            "on-demand",
+            "demand",
+            "pay",
+            "per",
+            "request",
+            "serverless",
+            "encryption",
+            "encrypted",
+        ],
+        "name": r"[A-Za-z0-9_.-]{3,255}",
+        "values": {
+            "hash_key": {
+                "pattern": r"\b(?:partition|hash)\s+key\s+(?:named\s+|called\s+)?"
+                r"[\"'`]?([A-Za-z_][A-Za-z0-9_]*)[\"'`]?",
+                "default": "id",
+            },
+            "range_key": {
+                "pattern": r"\b(?:sort|range)\s+key\s+(?:named\s+|called\s+)?"
+                r"[\"'`]?([A-Za-z_][A-Za-z0-9_]*)[\"'`]?",
+            },
+        },
+        "flags": {
+            "point_in_time_recovery": [
+                "pitr",
+                "point-in-time",
+                "point",
+                "time",
+                "recovery",
+                "backup",
+            ],
+        },
+        "code": """resource "aws_dynamodb_table" "{{component}}" {
+  {{#name}}
+  name = "{{name}}"
+  {{/name}}
+  {{^name}}
+  name = "{{default_name}}"
+  {{/name}}
+
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "{{hash_key}}"
+  {{#range_key}}
+  range_key    = "{{range_key}}"
+  {{/range_key}}
+
+  attribute {
+    name = "{{hash_key}}"
+    type = "S"
+  }
+  {{#range_key}}
+
+  attribute {
+    name = "{{range_key}}"
+    type = "S"
+  }
+  {{/range_key}}
+
+  server_side_encryption {
+    enabled = true
+  }
+
+  point_in_time_recovery {
+    enabled = {{point_in_time_recovery}}
+  }
+}
+
+output "{{component}}_table_name" {
+  value       = aws_dynamodb_table.{{component}}.name
+  description = "Name of the DynamoDB table"
+}
+
+output "{{component}}_table_arn" {
+  value       = aws_dynamodb_table.{{component}}.arn
+  description = "ARN of the DynamoDB table"
+}
+""",
+    },
+}
+
 TERRAFORM_FIX_SYSTEM_PROMPT = """
 You are a terraform developer expert in debugging and fixing terraform code. Your task is to analyze terraform errors and fix the code.
 Given the original user request, the generated terraform code, and the error output from terraform plan/apply, you should:
@@ -126,52 +496,52 @@ IMPORTANT:
 - Include relevant outputs that would be useful for the user, such as resource IDs, endpoints, or connection information.
 """
 
-OUTPUT_FORMAT_SYSTEM_PROMPT = """You are a technical documentation expert who specializes in formatting infrastructure outputs in markdown."""
-
-OUTPUT_FORMAT_USER_PROMPT = """Please format the following Terraform outputs into a clear, well-structured markdown document.
-Include a title, descriptions for each output, and organize them in a logical way.
-Here are the outputs to format:
-
-{outputs}
-
-Format the response as markdown with appropriate headers, lists, and code blocks where needed.
-Focus on making the information clear and easy to understand for users."""
+TERRAFORM_PATCH_SYSTEM_PROMPT = """
+You are a terraform developer expert in debugging and fixing terraform code. Your task is to analyze terraform errors and fix the code.
+Given the original user request, the generated terraform code, and the error output from terraform plan/apply, you should:
+1. Identify the root cause of the error
+2. Fix the terraform code while maintaining the original intent
+3. Ensure all dependencies and configurations are correct
 
-# OpenAI client singleton
-_client = None
+Do not rewrite the whole terraform code. Only present the top-level blocks (resource, data, variable, output, locals...) that you change or add, each one complete, in this format:
+```terraform-patch
+<complete blocks to replace or add>
+```
+A block replaces the block of the current code with the same type and labels, or is added if there is none.
 
+If blocks must be removed, list them one per line as <type>.<labels>, e.g. resource.aws_s3_bucket.logs, in this format:
+```remove
+<blocks to remove>
+```
 
-def get_openai_client() -> OpenAI:
-    """Get or create OpenAI client instance."""
-    global _client
-    if _client is None:
-        if LANGFUSE_ENABLED:
-            _client = (
-                OpenAI()
-            )  # This will automatically use Langfuse's wrapper when enabled
-        else:
-            _client = OpenAI()
-    return _client
+Also present your explanation of the fixes in this format:
+```remarks
+<explanation of what was wrong and how you fixed it>
+```
 
+There is a provider block in the terraform project like this:
+```provider.tf
+provider "aws" {
+  region = var.aws_region
+}
 
-def ai_format_output(outputs: Dict[str, Any]) -> str:
-    """
-    Format Terraform outputs into a markdown string using LLM.
+variable "aws_region" {
+  default = null
+}
+```
 
-    Args:
-        outputs: Dictionary of Terraform outputs to format
+If the region must change, present the complete .tfvars file in the following format:
+```module.tfvars
+aws_region = <region>
+```
 
-    Returns:
-        str: Formatted markdown string
-    """
-    if not outputs:
-        return "No outputs available."
+IMPORTANT:
+- Do not generate any provider blocks in your terraform code. The provider configuration will be handled separately.
+"""
 
-    client = get_openai_client()
-    config = MODEL_CONFIG["output_format"]
+OUTPUT_FORMAT_SYSTEM_PROMPT = """You are a technical documentation expert who specializes in formatting infrastructure outputs in markdown."""
 
-    # Create a prompt that asks for markdown formatting
-    prompt = f"""Please format the following Terraform outputs into a clear, well-structured markdown document.
+OUTPUT_FORMAT_USER_PROMPT = """Please format the following Terraform outputs into a clear, well-structured markdown document.
 Include a title, descriptions for each output, and organize them in a logical way.
 Here are the outputs to format:
 
@@ -179,24 +549,3 @@ Here are the outputs to format:
 
 Format the response as markdown with appropriate headers, lists, and code blocks where needed.
 Focus on making the information clear and easy to understand for users."""
-
-    try:
-        response = client.chat.completions.create(
-            model=config["model"],
-            temperature=config["temperature"],
-            max_tokens=config["max_tokens"],
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a technical documentation expert who specializes in formatting infrastructure outputs in markdown.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-        )
-        return response.choices[0].message.content
-    except Exception:
-        # Fallback to simple formatting if LLM call fails
-        formatted = "# Terraform Outputs\n\n"
-        for key, value in outputs.items():
-            formatted += f"## {key}\n```\n{value}\n```\n\n"
-        return formatted
@@ -0,0 +1,238 @@
+"""Distill terraform failures into the context needed to fix them.
+
+Errors reported by terraform can include provider debug output, box-drawing
+decorations and the same diagnostic repeated for every instance of a resource.
+Only the deduplicated diagnostics are kept, with their summary, detail and
+source location, along with the blocks of the code they point to.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+from infrabot.infra_utils.hcl_index import HclBlock, line_number, parse_blocks
+from infrabot.infra_utils.terraform_events import Diagnostic
+
+# Longest detail kept per diagnostic, and longest raw error kept when it has
+# no diagnostics (the start and end are kept)
+MAX_DETAIL_CHARS = 1500
+MAX_ERROR_CHARS = 4000
+
+DIAGNOSTIC_START = re.compile(r"^(Error|Warning): (.*)$")
+WITH_ADDRESS = re.compile(r"^\s*with (\S+),$")
+ON_LOCATION = re.compile(r"^\s*on (\S+) line (\d+)(?:, in (.*))?:$")
+SNIPPET_LINE = re.compile(r"^\s*(\d+):(.*)$")
+# Log lines of terraform and providers, e.g. 2024-01-01T00:00:00.000Z [DEBUG] ...
+LOG_LINE = re.compile(r"^\S*\s*\[(TRACE|DEBUG|INFO|WARN)\]")
+INSTANCE_KEY = re.compile(r"\[[^\]]*\]")
+
+
+@dataclass
+class ErrorContext:
+    """The distilled diagnostics of a failure and the blocks they reference."""
+
+    diagnostics: List[Diagnostic] = field(default_factory=list)
+    # Number of times each diagnostic was reported
+    counts: List[int] = field(default_factory=list)
+    # Blocks of the code referenced by the diagnostics, in order of appearance
+    blocks: List[HclBlock] = field(default_factory=list)
+    # Raw error, trimmed, used when it had no diagnostics
+    raw_error: str = ""
+
+    def error_text(self) -> str:
+        """Render the diagnostics, or the trimmed raw error if there are none."""
+        if not self.diagnostics:
+            return self.raw_error
+        rendered = []
+        for diagnostic, count in zip(self.diagnostics, self.counts):
+            text = diagnostic.render()
+            if count > 1:
+                text += f"\n(reported {count} times)"
+            rendered.append(text)
+        return "\n\n".join(rendered)
+
+    def code_excerpt(self, code: str) -> str:
+        """Get the referenced blocks of `code`, listing the other blocks by key.
+
+        The whole code is returned if no block is referenced.
+        """
+        if not self.blocks:
+            return code
+        keys = {block.key for block in self.blocks}
+        others = [block.key for block in parse_blocks(code) if block.key not in keys]
+        excerpt = "\n\n".join(block.text for block in self.blocks)
+        if others:
+            excerpt += "\n\n# Other blocks, unchanged: " + ", ".join(others)
+        return excerpt
+
+
+def distill_error(
+    error_output: str,
+    code: str,
+    diagnostics: Optional[Sequence[Diagnostic]] = None,
+) -> ErrorContext:
+    """Distill an error into its deduplicated diagnostics and referenced blocks.
+
+    Args:
+        error_output: Error message of the failed command
+        code: Terraform code that produced the error
+        diagnostics: Structured diagnostics of the error, e.g. those of a
+            TerraformError. Parsed from `error_output` if not given.
+
+    Returns:
+        ErrorContext: The diagnostics and the blocks of `code` they reference
+    """
+    if not diagnostics:
+        diagnostics = parse_diagnostics(error_output)
+    # Warnings are only worth fixing when nothing else failed
+    errors = [d for d in diagnostics if d.severity == "error"]
+    diagnostics = errors or list(diagnostics)
+
+    unique: List[Diagnostic] = []
+    counts: List[int] = []
+    seen = {}
+    for diagnostic in diagnostics:
+        key = _dedupe_key(diagnostic)
+        if key in seen:
+            counts[seen[key]] += 1
+            continue
+        seen[key] = len(unique)
+        if len(diagnostic.detail) > MAX_DETAIL_CHARS:
+            diagnostic = Diagnostic(**vars(diagnostic))
+            diagnostic.detail = diagnostic.detail[:MAX_DETAIL_CHARS] + "\n[...]"
+        unique.append(diagnostic)
+        counts.append(1)
+
+    return ErrorContext(
+        diagnostics=unique,
+        counts=counts,
+        blocks=referenced_blocks(unique, code),
+        raw_error="" if unique else _trim(error_output),
+    )
+
+
+def parse_diagnostics(error_output: str) -> List[Diagnostic]:
+    """Parse the diagnostics of terraform's human-readable error output."""
+    diagnostics: List[Diagnostic] = []
+    current: Optional[Diagnostic] = None
+    detail: List[str] = []
+
+    def finish() -> None:
+        if current is not None:
+            current.detail = "\n".join(detail).strip()
+            diagnostics.append(current)
+
+    for line in error_output.splitlines():
+        line = _strip_decoration(line)
+        if LOG_LINE.match(line):
+            continue
+        start = DIAGNOSTIC_START.match(line)
+        if start:
+            finish()
+            current = Diagnostic(
+                severity=start.group(1).lower(), summary=start.group(2)
+            )
+            detail = []
+            continue
+        if current is None:
+            continue
+        with_address = WITH_ADDRESS.match(line)
+        location = ON_LOCATION.match(line)
+        snippet = SNIPPET_LINE.match(line)
+        if with_address and not detail:
+            current.address = with_address.group(1)
+        elif location and not detail:
+            current.filename = location.group(1)
+            current.line = int(location.group(2))
+            current.context = location.group(3)
+        elif snippet and current.line == int(snippet.group(1)) and not detail:
+            current.code = snippet.group(2)
+        elif line.strip() or detail:
+            detail.append(line)
+    finish()
+    return diagnostics
+
+
+def referenced_blocks(diagnostics: Sequence[Diagnostic], code: str) -> List[HclBlock]:
+    """Find the top-level blocks of `code` the diagnostics point to.
+
+    Blocks are matched by resource address, or by the line of the diagnostic if
+    the source at that line is the snippet terraform reported.
+    """
+    blocks = parse_blocks(code)
+    lines = code.splitlines()
+    referenced = set()
+    for diagnostic in diagnostics:
+        address = _block_address(diagnostic.address)
+        for index, block in enumerate(blocks):
+            if address and address in (block.address, _data_address(block)):
+                referenced.add(index)
+            elif diagnostic.line and _snippet_matches(diagnostic, lines):
+                start = line_number(code, block.start)
+                end = line_number(code, block.end)
+                if start <= diagnostic.line <= end:
+                    referenced.add(index)
+    return [blocks[index] for index in sorted(referenced)]
+
+
+def _dedupe_key(diagnostic: Diagnostic) -> Tuple:
+    # Instances of the same resource report the same diagnostic
+    address = INSTANCE_KEY.sub("", diagnostic.address or "")
+    return (
+        diagnostic.severity,
+        diagnostic.summary,
+        diagnostic.detail,
+        address,
+        diagnostic.filename,
+        diagnostic.line,
+    )
+
+
+def _block_address(address: Optional[str]) -> Optional[str]:
+    """Address of the top-level block declaring a resource instance."""
+    if not address:
+        return None
+    parts = INSTANCE_KEY.sub("", address).split(".")
+    if parts[0] == "module":
+        return ".".join(parts[:2])
+    if parts[0] == "data":
+        return ".".join(parts[:3])
+    return ".".join(parts[:2])
+
+
+def _data_address(block: HclBlock) -> Optional[str]:
+    if block.type == "data" and len(block.labels) == 2:
+        return f"data.{block.labels[0]}.{block.labels[1]}"
+    return None
+
+
+def _snippet_matches(diagnostic: Diagnostic, lines: List[str]) -> bool:
+    """Check that the diagnostic's line of source is in the code, not another file."""
+    if not diagnostic.code or not diagnostic.code.strip():
+        return True
+    index = diagnostic.line - 1
+    snippet = diagnostic.code.strip().splitlines()[0].strip()
+    return 0 <= index < len(lines) and lines[index].strip() == snippet
+
+
+def _strip_decoration(line: str) -> str:
+    """Remove the box drawn around diagnostics in terraform's output."""
+    line = line.rstrip()
+    if line.startswith(("│ ", "│")):
+        return line[2:] if line.startswith("│ ") else line[1:]
+    if line in ("╷", "╵"):
+        return ""
+    return line
+
+
+def _trim(error_output: str) -> str:
+    lines = [
+        line
+        for line in (_strip_decoration(line) for line in error_output.splitlines())
+        if not LOG_LINE.match(line)
+    ]
+    text = "\n".join(lines).strip()
+    if len(text) <= MAX_ERROR_CHARS:
+        return text
+    half = MAX_ERROR_CHARS // 2
+    return f"{text[:half]}\n[...]\n{text[-half:]}"
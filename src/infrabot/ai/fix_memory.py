@@ -0,0 +1,521 @@
+"""Memory of the fixes that resolved recurring terraform errors.
+
+The same errors come back across components: bucket names already taken,
+deprecated inline blocks, arguments a provider no longer accepts. When a fix
+resolves an error, the changes it made to the failing resource block are
+recorded under a signature of the error: its normalized diagnostic summaries
+and the resource type. The next time an error with the same signature occurs,
+the recorded changes are applied locally instead of calling the model.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+from infrabot.ai.error_context import ErrorContext, distill_error
+from infrabot.infra_utils.hcl_index import HclBlock, parse_blocks, parse_body
+from infrabot.infra_utils.provider_cache import INFRABOT_HOME
+from infrabot.infra_utils.terraform_events import Diagnostic
+
+logger = logging.getLogger("infrabot.fix_memory")
+
+T = TypeVar("T")
+
+# Placeholders of the address and name of the fixed resource in recorded code
+SELF_PLACEHOLDER = "__SELF__"
+NAME_PLACEHOLDER = "__NAME__"
+
+STRING_ATTRIBUTE = re.compile(
+    r'^\s*[\w-]+\s*=\s*"((?:[^"\\]|\\.)*)"\s*(?:#.*|//.*)?$', re.DOTALL
+)
+
+# Parts of diagnostic summaries specific to one occurrence of an error
+VOLATILE_PATTERNS = [
+    (re.compile(r'"[^"]*"'), '"*"'),
+    (re.compile(r"\([^)]*\)"), "(*)"),
+    (re.compile(r"arn:[^\s,]+"), "arn"),
+    (re.compile(r"\b[0-9a-f]{8,}\b"), "#"),
+    (re.compile(r"\b\d+\b"), "#"),
+]
+
+
+def get_fix_memory_path() -> Optional[str]:
+    """Get the path of the fix memory, or None if it is disabled.
+
+    Defaults to ~/.infrabot/fix-memory.json, overridden by the
+    INFRABOT_FIX_MEMORY_FILE environment variable (empty to disable).
+    """
+    path = os.getenv("INFRABOT_FIX_MEMORY_FILE")
+    if path is None:
+        path = os.path.join(INFRABOT_HOME, "fix-memory.json")
+    return path or None
+
+
+def error_signature(context: ErrorContext) -> Optional[str]:
+    """Get the signature of an error, if it is specific to a single resource block.
+
+    Args:
+        context: The distilled error
+
+    Returns:
+        str: The block type and resource type, followed by the normalized
+            summaries of the errors, e.g. `resource.aws_s3_bucket: error
+            creating s3 bucket (*): bucketalreadyexists`
+    """
+    if not context.diagnostics or len(context.blocks) != 1:
+        return None
+    block = context.blocks[0]
+    if block.type not in ("resource", "data") or len(block.labels) != 2:
+        return None
+    summaries = sorted({_normalize(d.summary) for d in context.diagnostics})
+    return f"{block.type}.{block.labels[0]}: {' | '.join(summaries)}"
+
+
+@dataclass
+class FixRecipe:
+    """Changes made by a fix to a resource block, replayable on another block.
+
+    Operations are lists whose first item is the operation:
+    ["remove_attribute", name], ["set_attribute", name, text],
+    ["extend_string", name, suffix],
+    ["remove_block", type], ["add_block", type, text] and
+    ["add_top_level_block", key, text].
+    """
+
+    operations: List[List[str]] = field(default_factory=list)
+
+    @classmethod
+    def from_fix(
+        cls, block: HclBlock, code: str, fixed_code: str
+    ) -> Optional["FixRecipe"]:
+        """Record the changes made to `block` by a fix.
+
+        Only fixes changing that block and adding new top-level blocks can be
+        replayed on other resources.
+
+        Args:
+            block: The failing block of `code`
+            code: Code the error occurred in
+            fixed_code: Code once fixed
+
+        Returns:
+            FixRecipe: The changes, or None if the fix cannot be replayed
+        """
+        fixed_blocks = {b.key: b for b in parse_blocks(fixed_code)}
+        old_blocks = {b.key: b for b in parse_blocks(code)}
+        fixed_block = fixed_blocks.get(block.key)
+        if fixed_block is None:
+            return None
+        for key, old_block in old_blocks.items():
+            if key == block.key:
+                continue
+            if key not in fixed_blocks or fixed_blocks[key].text != old_block.text:
+                return None
+
+        name = block.labels[1]
+        address = f"{block.labels[0]}.{name}"
+
+        def template(text: str) -> str:
+            return text.replace(address, SELF_PLACEHOLDER)
+
+        operations: List[List[str]] = []
+        old_attributes, old_nested = parse_body(code, block)
+        new_attributes, new_nested = parse_body(fixed_code, fixed_block)
+        old_values = {a.name: _lines(code, a.start, a.end) for a in old_attributes}
+        new_values = {
+            a.name: _lines(fixed_code, a.start, a.end) for a in new_attributes
+        }
+        for attribute, text in old_values.items():
+            if attribute not in new_values:
+                operations.append(["remove_attribute", attribute])
+        for attribute, text in new_values.items():
+            old_text = old_values.get(attribute, "")
+            if old_text.strip() == text.strip():
+                continue
+            old_value, new_value = _string_value(old_text), _string_value(text)
+            if old_value and new_value and new_value.startswith(old_value):
+                # e.g. a suffix making a name unique: replay it on any name
+                suffix = template(new_value[len(old_value) :])
+                operations.append(["extend_string", attribute, suffix])
+            else:
+                operations.append(["set_attribute", attribute, template(text)])
+
+        old_types = {b.type for b in old_nested}
+        new_types = {b.type for b in new_nested}
+        for block_type in sorted(old_types - new_types):
+            operations.append(["remove_block", block_type])
+        for nested in new_nested:
+            if nested.type not in old_types:
+                text = _lines(fixed_code, nested.start, nested.end)
+                operations.append(["add_block", nested.type, template(text)])
+
+        for key, new_block in fixed_blocks.items():
+            if key in old_blocks:
+                continue
+            text = template(new_block.text)
+            if new_block.labels and name in new_block.labels[-1]:
+                label = new_block.labels[-1]
+                text = text.replace(
+                    f'"{label}"', f'"{label.replace(name, NAME_PLACEHOLDER)}"', 1
+                )
+            operations.append(["add_top_level_block", key, text])
+
+        return cls(operations) if operations else None
+
+    def apply(self, block: HclBlock, code: str) -> Optional[str]:
+        """Replay the changes on a block of `code`.
+
+        Args:
+            block: A resource block of `code`, of the type the recipe was made for
+            code: Code to change
+
+        Returns:
+            str: The changed code, or None if the recipe changes nothing
+        """
+        name = block.labels[1]
+        address = f"{block.labels[0]}.{name}"
+
+        def render(text: str) -> str:
+            return text.replace(SELF_PLACEHOLDER, address).replace(
+                NAME_PLACEHOLDER, name
+            )
+
+        attributes, nested = parse_body(code, block)
+        edits = []  # (start, end, replacement) in code
+        insertions = []
+        for operation in self.operations:
+            kind = operation[0]
+            if kind == "remove_attribute":
+                edits += [
+                    (_line_start(code, a.start), _line_end(code, a.end), "")
+                    for a in attributes
+                    if a.name == operation[1]
+                ]
+            elif kind == "set_attribute":
+                matches = [a for a in attributes if a.name == operation[1]]
+                text = _ensure_newline(render(operation[2]))
+                if matches:
+                    start = _line_start(code, matches[0].start)
+                    edits.append((start, _line_end(code, matches[0].end), text))
+                else:
+                    insertions.append(text)
+            elif kind == "extend_string":
+                for a in attributes:
+                    value = _string_value(code[a.start : a.end])
+                    if a.name == operation[1] and value is not None:
+                        start = _line_start(code, a.start)
+                        end = _line_end(code, a.end)
+                        line = code[start:end].replace(
+                            f'"{value}"', f'"{value}{render(operation[2])}"', 1
+                        )
+                        edits.append((start, end, line))
+            elif kind == "remove_block":
+                edits += [
+                    (_line_start(code, b.start), _line_end(code, b.end), "")
+                    for b in nested
+                    if b.type == operation[1]
+                ]
+            elif kind == "add_block":
+                if not any(b.type == operation[1] for b in nested):
+                    insertions.append(_ensure_newline(render(operation[2])))
+
+        if insertions:
+            edits.append(_insertion(code, block, "".join(insertions)))
+
+        changed = code
+        for start, end, text in sorted(edits, reverse=True):
+            changed = changed[:start] + text + changed[end:]
+
+        existing = {b.key for b in parse_blocks(changed)}
+        for operation in self.operations:
+            if operation[0] != "add_top_level_block":
+                continue
+            text = render(operation[2])
+            added = parse_blocks(text)
+            if added and added[0].key not in existing:
+                changed = changed.rstrip("\n") + "\n\n" + text + "\n"
+        return changed if changed != code else None
+
+
+class FixMemory:
+    """Persistent store of fix recipes keyed by error signature.
+
+    Changes are merged into the latest content of the file under an exclusive
+    lock, so workers sharing the file do not overwrite each other's recipes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Optional[Dict[str, Any]] = None
+
+    def lookup(self, signature: str) -> Optional[FixRecipe]:
+        """Get the recipe recorded for an error signature, if any."""
+
+        def count_lookup(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            data["lookups"] += 1
+            return data["entries"].get(signature)
+
+        entry = self._update(count_lookup)
+        if entry is None:
+            return None
+        return FixRecipe(entry["operations"])
+
+    def record(self, signature: str, recipe: FixRecipe, llm_seconds: float) -> None:
+        """Record the recipe that resolved an error, found by a model call."""
+
+        def add_recipe(data: Dict[str, Any]) -> None:
+            entry = data["entries"].get(signature)
+            if entry is None or entry["operations"] != recipe.operations:
+                entry = {"operations": recipe.operations, "hits": 0, "llm_seconds": 0}
+            entry["llm_seconds"] = llm_seconds
+            entry["updated_at"] = time.time()
+            data["entries"][signature] = entry
+
+        self._update(add_recipe)
+
+    def hit(self, signature: str) -> float:
+        """Count a successful reuse of a recipe.
+
+        Returns:
+            float: Seconds the model call took when the recipe was recorded
+        """
+
+        def count_hit(data: Dict[str, Any]) -> float:
+            entry = data["entries"].get(signature)
+            if entry is None:
+                return 0.0
+            entry["hits"] += 1
+            data["hits"] += 1
+            return entry["llm_seconds"]
+
+        return self._update(count_hit)
+
+    def forget(self, signature: str) -> None:
+        """Drop a recipe that did not resolve its error."""
+        self._update(lambda data: data["entries"].pop(signature, None))
+
+    def hit_rate(self) -> float:
+        """Share of the looked up errors that a remembered fix resolved."""
+        with self._lock:
+            data = self._load()
+        return data["hits"] / data["lookups"] if data["lookups"] else 0.0
+
+    def _update(self, change: Callable[[Dict[str, Any]], T]) -> T:
+        """Apply a change to the latest content of the file, then save it."""
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(f"{self.path}.lock", "a") as lock_file:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                    try:
+                        self._data = self._read()
+                        outcome = change(self._data)
+                        self._save()
+                    finally:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                return outcome
+            except OSError as e:
+                # Keep the change for this process only
+                logger.warning(f"Failed to lock fix memory: {str(e)}")
+                return change(self._load())
+
+    def _load(self) -> Dict[str, Any]:
+        if self._data is None:
+            self._data = self._read()
+        return self._data
+
+    def _read(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {"lookups": 0, "hits": 0, "entries": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable fix memory: {str(e)}")
+        return data
+
+    def _save(self) -> None:
+        try:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to save fix memory: {str(e)}")
+
+
+_memory: Optional[FixMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_fix_memory() -> Optional[FixMemory]:
+    """Get the fix memory of INFRABOT_FIX_MEMORY_FILE, or None if disabled."""
+    global _memory
+    path = get_fix_memory_path()
+    if not path:
+        return None
+    with _memory_lock:
+        if _memory is None or _memory.path != path:
+            _memory = FixMemory(path)
+        return _memory
+
+
+@dataclass
+class AppliedFix:
+    """A fix applied during self-healing, waiting to be confirmed."""
+
+    signature: Optional[str]
+    source: str
+    duration: float
+    recipe: Optional[FixRecipe] = None
+    # Seconds saved by not calling the model, for fixes from memory
+    time_saved: float = 0.0
+    # Share of the looked up errors resolved from memory, once resolved
+    hit_rate: float = 0.0
+
+
+class FixTracker:
+    """Apply remembered fixes and learn new ones during one self-healing loop.
+
+    A fix is only known to resolve its error once the next attempt succeeds or
+    fails with a different error, so recording is deferred until then.
+    """
+
+    def __init__(self, memory: Optional[FixMemory] = None):
+        self.memory = memory
+        self.pending: Optional[AppliedFix] = None
+
+    def recall(
+        self,
+        error_output: str,
+        code: str,
+        diagnostics: Optional[Sequence[Diagnostic]] = None,
+    ) -> Optional[str]:
+        """Apply the remembered fix of an error, if there is one.
+
+        Returns:
+            str: The fixed code, or None if no remembered fix applies
+        """
+        if self.memory is None:
+            return None
+        started = time.monotonic()
+        context = distill_error(error_output, code, diagnostics)
+        signature = error_signature(context)
+        recipe = self.memory.lookup(signature) if signature else None
+        if recipe is None:
+            return None
+        fixed_code = recipe.apply(context.blocks[0], code)
+        if fixed_code is None:
+            return None
+        logger.info(f"Applying remembered fix for: {signature}")
+        self.pending = AppliedFix(
+            signature, "memory", time.monotonic() - started, recipe
+        )
+        return fixed_code
+
+    def learn(
+        self,
+        error_output: str,
+        code: str,
+        fixed_code: str,
+        duration: float,
+        diagnostics: Optional[Sequence[Diagnostic]] = None,
+    ) -> AppliedFix:
+        """Track a fix made by the model, to remember it once it is confirmed."""
+        context = distill_error(error_output, code, diagnostics)
+        signature = error_signature(context)
+        recipe = None
+        if signature:
+            recipe = FixRecipe.from_fix(context.blocks[0], code, fixed_code)
+        self.pending = AppliedFix(signature, "llm", duration, recipe)
+        return self.pending
+
+    def resolve(
+        self,
+        error_output: Optional[str] = None,
+        code: str = "",
+        diagnostics: Optional[Sequence[Diagnostic]] = None,
+    ) -> Optional[AppliedFix]:
+        """Confirm or reject the pending fix once the next attempt completed.
+
+        Args:
+            error_output: Error of the next attempt, None if it succeeded
+            code: Code of the next attempt
+            diagnostics: Structured diagnostics of the error of the next attempt
+
+        Returns:
+            AppliedFix: The pending fix, with the time it saved if it came from
+                memory and resolved its error
+        """
+        fix, self.pending = self.pending, None
+        if fix is None or self.memory is None or not fix.signature:
+            return fix
+        resolved = error_output is None or (
+            error_signature(distill_error(error_output, code, diagnostics))
+            != fix.signature
+        )
+        if fix.source == "memory":
+            if resolved:
+                fix.time_saved = max(0.0, self.memory.hit(fix.signature) - fix.duration)
+            else:
+                logger.info(f"Remembered fix did not resolve: {fix.signature}")
+                self.memory.forget(fix.signature)
+        elif resolved and fix.recipe is not None:
+            self.memory.record(fix.signature, fix.recipe, fix.duration)
+        fix.hit_rate = self.memory.hit_rate()
+        return fix
+
+
+def _normalize(summary: str) -> str:
+    summary = summary.lower()
+    for pattern, replacement in VOLATILE_PATTERNS:
+        summary = pattern.sub(replacement, summary)
+    return summary.strip()
+
+
+def _string_value(attribute: str) -> Optional[str]:
+    """Content of an attribute assigned a single string literal, e.g. `a = "b"`."""
+    match = STRING_ATTRIBUTE.match(attribute)
+    return match.group(1) if match else None
+
+
+def _line_start(code: str, pos: int) -> int:
+    return code.rfind("\n", 0, pos) + 1
+
+
+def _line_end(code: str, pos: int) -> int:
+    """Position after the line break ending the line of `pos`, if only blanks remain."""
+    if pos > 0 and code[pos - 1] == "\n":
+        return pos
+    end = pos
+    while end < len(code) and code[end] in " \t":
+        end += 1
+    if end < len(code) and code[end] == "\n":
+        return end + 1
+    return pos
+
+
+def _lines(code: str, start: int, end: int) -> str:
+    """The full lines of code spanning from `start` to `end`."""
+    return _ensure_newline(code[_line_start(code, start) : _line_end(code, end)])
+
+
+def _ensure_newline(text: str) -> str:
+    return text if text.endswith("\n") else text + "\n"
+
+
+def _insertion(code: str, block: HclBlock, text: str) -> Tuple[int, int, str]:
+    """Edit inserting `text` at the end of the body of `block`."""
+    closing = block.end - 1
+    start = _line_start(code, closing)
+    if code[start:closing].strip():
+        # Closing brace on the same line as the body, e.g. `resource "a" "b" {}`
+        return (closing, closing, "\n" + text)
+    return (start, start, text)
@@ -1,20 +1,35 @@
-"""Module for formatting Terraform outputs using AI."""
+"""Module for formatting Terraform outputs as markdown."""
 
 from typing import Dict, Any
 import logging
+import os
+from infrabot.ai.completion import completion
 from infrabot.ai.config import (
-    get_openai_client,
     MODEL_CONFIG,
     OUTPUT_FORMAT_SYSTEM_PROMPT,
     OUTPUT_FORMAT_USER_PROMPT,
 )
+from infrabot.utils.file_cache import file_cache
+from infrabot.utils.output_formatter import (
+    mask_sensitive_outputs,
+    render_outputs_markdown,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def get_output_format_mode() -> str:
+    """Get how outputs are formatted: "local" (default) or "llm"."""
+    return os.getenv("OUTPUT_FORMAT_MODE", "local").lower()
+
+
 def ai_format_output(outputs: Dict[str, Any]) -> str:
     """
-    Format Terraform outputs into a markdown string using LLM.
+    Format Terraform outputs into a markdown string.
+
+    Outputs are rendered locally, unless OUTPUT_FORMAT_MODE=llm, in which case
+    an LLM formats them and the local rendering is the fallback. Sensitive
+    values are masked in both modes.
 
     Args:
         outputs: Dictionary of Terraform outputs to format
@@ -25,27 +40,32 @@ def ai_format_output(outputs: Dict[str, Any]) -> str:
     if not outputs:
         return "No outputs available."
 
-    client = get_openai_client()
-    config = MODEL_CONFIG["output_format"]
+    if get_output_format_mode() != "llm":
+        return render_outputs_markdown(outputs)
 
     try:
-        response = client.chat.completions.create(
-            model=config["model"],
-            temperature=config["temperature"],
-            max_tokens=config["max_tokens"],
-            messages=[
-                {"role": "system", "content": OUTPUT_FORMAT_SYSTEM_PROMPT},
-                {
-                    "role": "user",
-                    "content": OUTPUT_FORMAT_USER_PROMPT.format(outputs=outputs),
-                },
-            ],
-        )
-        return response.choices[0].message.content
+        return _llm_format_output(mask_sensitive_outputs(outputs))
     except Exception as e:
         logger.error(f"Failed to format outputs: {str(e)}", exc_info=True)
-        # Fallback to simple formatting if LLM call fails
-        formatted = "# Terraform Outputs\n\n"
-        for key, value in outputs.items():
-            formatted += f"## {key}\n```\n{value}\n```\n\n"
-        return formatted
+        return render_outputs_markdown(outputs)
+
+
+@file_cache()
+def _llm_format_output(outputs: Dict[str, Any]) -> str:
+    """Format outputs with an LLM; cached by the hash of the outputs."""
+    config = MODEL_CONFIG["output_format"]
+
+    response = completion(
+        model=config["model"],
+        temperature=config["temperature"],
+        max_tokens=config["max_tokens"],
+        messages=[
+            {"role": "system", "content": OUTPUT_FORMAT_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": OUTPUT_FORMAT_USER_PROMPT.format(outputs=outputs),
+            },
+        ],
+        traced=True,
+    )
+    return response.choices[0].message.content
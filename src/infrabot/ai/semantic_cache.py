@@ -0,0 +1,370 @@
+"""Reuse of code generated for similar prompts.
+
+Prompts are embedded locally as sparse vectors of hashed word, word-bigram
+and character-trigram features, with filler words ("create", "please",
+"with", ...) dropped. Near duplicates are looked up through a banded SimHash
+of these vectors: only entries sharing at least one band of the query's
+signature are compared by cosine similarity, which keeps lookups fast
+regardless of the size of the index.
+
+Only code that was applied successfully is added to the index, and names,
+numbers, regions and other literals of the prompts must match exactly, so
+"a bucket named logs" never reuses the code of "a bucket named assets".
+Prompts asking for something the cached prompt did not mention never reuse
+its code either: "a table with a TTL" does not reuse the code of "a table".
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from itertools import chain
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+logger = logging.getLogger("infrabot.semantic_cache")
+
+DEFAULT_THRESHOLD = 0.9
+DEFAULT_MAX_ENTRIES = 100_000
+# The 64-bit signature is made of BANDS bands of BAND_BITS bits; entries sharing
+# a band with the query are candidates, the best MAX_CANDIDATES are compared
+SIGNATURE_BITS = 64
+BANDS = 8
+BAND_BITS = SIGNATURE_BITS // BANDS
+MAX_CANDIDATES = 32
+# Buckets of more entries are too common to tell prompts apart and are only
+# scanned when the query has no smaller bucket
+MAX_BUCKET_SCAN = 128
+# Prompts share most of their words, so the hashes of features are memoized
+FEATURE_CACHE_SIZE = 8192
+# Weights of the features of a prompt
+WORD_WEIGHT = 1.0
+BIGRAM_WEIGHT = 0.5
+TRIGRAM_WEIGHT = 0.3
+
+TOKEN = re.compile(r"[a-z0-9][a-z0-9._/:-]*[a-z0-9]|[a-z0-9]")
+# Numbers, and tokens mixing digits and separators: eu-west-1, t3.micro, 10.0.0.0/16
+LITERAL = re.compile(r"\d+$|(?=.*\d).*[._/:-]")
+QUOTED = re.compile(r""""([^"]*)"|'([^']*)'|`([^`]*)`""")
+# Words negating what follows them, matched exactly like literals
+NEGATIONS = frozenset(
+    ["no", "not", "non", "without", "disable", "disabled", "disabling", "never"]
+)
+# Words that do not change the infrastructure being asked for
+STOPWORDS = frozenset(
+    """
+    a an the and or with w of for to in on at by from into as that which
+    this these it its is are be been being will should must can could would
+    please i we me us my our you your need needs want wants like let lets
+    create creates creating make makes making provision provisioning deploy
+    deploying set setup up add adding build building new give get generate
+    enable enabled enabling having has have using use some also just then
+    """.split()
+)
+
+
+def get_semantic_cache_threshold() -> float:
+    """Get the similarity above which code is reused, from SEMANTIC_CACHE_THRESHOLD."""
+    return float(os.getenv("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD))
+
+
+@dataclass
+class Prompt:
+    """A prompt embedded as a normalized sparse vector."""
+
+    vector: Dict[int, float]
+    literals: FrozenSet[str]
+    signature: int
+    # Words of the prompt that were embedded
+    words: Tuple[str, ...] = ()
+
+
+@dataclass
+class Entry:
+    """Code generated for a prompt, applied successfully."""
+
+    prompt: str
+    namespace: str
+    response: str
+    created_at: float
+
+
+def embed(prompt: str) -> Prompt:
+    """Embed a prompt into its feature vector, literals and SimHash signature."""
+    literals = {
+        next(group for group in m.groups() if group is not None)
+        for m in QUOTED.finditer(prompt)
+    }
+    text = QUOTED.sub(" ", prompt.lower())
+    words = []
+    for token in TOKEN.findall(text):
+        if token in NEGATIONS or _is_literal(token):
+            literals.add(token)
+        elif token not in STOPWORDS:
+            words.append(stem(token))
+
+    features: Dict[str, float] = defaultdict(float)
+    for word in words:
+        features[f"w:{word}"] += WORD_WEIGHT
+        padded = f"#{word}#"
+        for index in range(len(padded) - 2):
+            features[f"c:{padded[index:index + 3]}"] += TRIGRAM_WEIGHT
+    for first, second in zip(words, words[1:]):
+        features[f"b:{first} {second}"] += BIGRAM_WEIGHT
+
+    vector: Dict[int, float] = {}
+    # Each feature adds its weight to the bits set in its hash and subtracts
+    # it from the others
+    bit_sums = [0.0] * SIGNATURE_BITS
+    for feature, weight in features.items():
+        feature_id, bits = _hash_feature(feature)
+        # Sublinear term frequency, so repeated words do not dominate
+        weight = 1.0 + math.log(weight) if weight > 1.0 else weight
+        vector[feature_id] = weight
+        for bit in range(SIGNATURE_BITS):
+            bit_sums[bit] += weight if bits >> bit & 1 else -weight
+
+    signature = 0
+    for bit, bit_sum in enumerate(bit_sums):
+        if bit_sum > 0:
+            signature |= 1 << bit
+
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return Prompt(
+        vector={feature: weight / norm for feature, weight in vector.items()},
+        literals=frozenset(literals),
+        signature=signature,
+        words=tuple(words),
+    )
+
+
+@functools.lru_cache(maxsize=FEATURE_CACHE_SIZE)
+def _hash_feature(feature: str) -> Tuple[int, int]:
+    """Hash a feature into its id and the 64 bits it votes for in the signature."""
+    digest = hashlib.blake2b(feature.encode(), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big")
+
+
+def cosine(first: Dict[int, float], second: Dict[int, float]) -> float:
+    """Cosine similarity of two normalized sparse vectors."""
+    return sum(
+        first[feature] * second[feature] for feature in first.keys() & second.keys()
+    )
+
+
+class SemanticCache:
+    """Index of prompts whose generated code applied successfully.
+
+    Entries are kept in memory and appended to a JSON lines file, from which
+    the index is rebuilt when first used.
+
+    Args:
+        path: JSON lines file of the entries, None to keep them in memory only
+        ttl: Seconds after which entries expire, None to keep them forever
+        max_entries: Number of entries kept, the oldest are evicted beyond it
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[Entry, Prompt]] = {}
+        # (namespace, literals, band, band value) -> ids of the entries
+        self._bands: Dict[BandKey, Set[int]] = defaultdict(set)
+        # Embedded words, literals and namespace -> id of the latest entry
+        self._keys: Dict[Tuple[Tuple[str, ...], FrozenSet[str], str], int] = {}
+        self._next_id = 0
+        self._loaded = path is None
+        self._lines = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._load()
+            return len(self._entries)
+
+    def lookup(
+        self, prompt: str, namespace: str, threshold: float = DEFAULT_THRESHOLD
+    ) -> Optional[Tuple[Entry, float]]:
+        """Find the most similar prompt of the namespace, above a threshold.
+
+        Every word of the query must be in the prompt of the entry, so that its
+        code has everything the query asks for.
+
+        Args:
+            prompt: The prompt to look up
+            namespace: Only entries of this namespace, e.g. model and system
+                prompt, are considered
+            threshold: Minimum cosine similarity
+
+        Returns:
+            Tuple[Entry, float]: The entry and its similarity, or None
+        """
+        query = embed(prompt)
+        if not query.vector:
+            return None
+        query_words = set(query.words)
+        now = time.time()
+        with self._lock:
+            self._load()
+            buckets = [
+                self._bands[key]
+                for key in _band_keys(namespace, query)
+                if key in self._bands
+            ]
+            small = [bucket for bucket in buckets if len(bucket) <= MAX_BUCKET_SCAN]
+            if not small and buckets:
+                small = [min(buckets, key=len)]
+            # Entries sharing the most bands with the query are the most similar
+            votes = Counter(chain.from_iterable(small))
+            candidates = [entry_id for entry_id, _ in votes.most_common(MAX_CANDIDATES)]
+
+            # Signatures differ in a number of bits proportional to the angle
+            # between the vectors: skip entries too far to clear the threshold
+            max_distance = (
+                SIGNATURE_BITS * math.acos(max(threshold - 0.15, -1.0)) / math.pi
+            )
+            best: Optional[Tuple[Entry, float]] = None
+            for entry_id in candidates:
+                entry, embedded = self._entries[entry_id]
+                distance = (embedded.signature ^ query.signature).bit_count()
+                if distance > max_distance or self._expired(entry, now):
+                    continue
+                # Code of a prompt lacking some of the query's words lacks
+                # what they ask for, e.g. a TTL
+                if not query_words.issubset(embedded.words):
+                    continue
+                similarity = cosine(query.vector, embedded.vector)
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (entry, similarity)
+            return best
+
+    def add(self, prompt: str, namespace: str, response: str) -> None:
+        """Add the code generated for a prompt, once it applied successfully."""
+        entry = Entry(prompt, namespace, response, time.time())
+        with self._lock:
+            self._load()
+            self._insert(entry)
+            self._evict()
+            if self.path is not None:
+                self._append(entry)
+
+    def _insert(self, entry: Entry) -> None:
+        # Prompts differing only by filler words replace each other
+        embedded = embed(entry.prompt)
+        key = (embedded.words, embedded.literals, entry.namespace)
+        if key in self._keys:
+            self._remove(self._keys[key])
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (entry, embedded)
+        self._keys[key] = entry_id
+        for key in _band_keys(entry.namespace, embedded):
+            self._bands[key].add(entry_id)
+
+    def _remove(self, entry_id: int) -> None:
+        entry, embedded = self._entries.pop(entry_id)
+        self._keys.pop((embedded.words, embedded.literals, entry.namespace), None)
+        for key in _band_keys(entry.namespace, embedded):
+            ids = self._bands[key]
+            ids.discard(entry_id)
+            if not ids:
+                del self._bands[key]
+
+    def _evict(self) -> None:
+        now = time.time()
+        # Entries are ordered by id, i.e. from the oldest
+        while self._entries:
+            entry_id = next(iter(self._entries))
+            entry, _ = self._entries[entry_id]
+            if len(self._entries) <= self.max_entries and not self._expired(entry, now):
+                break
+            self._remove(entry_id)
+
+    def _expired(self, entry: Entry, now: float) -> bool:
+        return self.ttl is not None and now - entry.created_at > self.ttl
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        self._insert(Entry(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        continue
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            logger.warning(f"Failed to load semantic cache: {str(e)}")
+            return
+        self._evict()
+
+    def _append(self, entry: Entry) -> None:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Rewrite the file once evicted and replaced entries dominate it
+            if self._lines >= 2 * max(len(self._entries), 1000):
+                self._rewrite()
+                return
+            with open(self.path, "a") as f:
+                f.write(json.dumps(vars(entry)) + "\n")
+            self._lines += 1
+        except OSError as e:
+            logger.warning(f"Failed to save semantic cache: {str(e)}")
+
+    def _rewrite(self) -> None:
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            for entry, _ in self._entries.values():
+                f.write(json.dumps(vars(entry)) + "\n")
+        os.replace(tmp_path, self.path)
+        self._lines = len(self._entries)
+
+
+BandKey = Tuple[str, FrozenSet[str], int, int]
+
+
+def _band_keys(namespace: str, prompt: Prompt) -> List[BandKey]:
+    """Keys of the buckets of a prompt, one per band of its signature.
+
+    Prompts with different literals never match, so they never share buckets.
+    """
+    mask = (1 << BAND_BITS) - 1
+    return [
+        (
+            namespace,
+            prompt.literals,
+            band,
+            prompt.signature >> (band * BAND_BITS) & mask,
+        )
+        for band in range(BANDS)
+    ]
+
+
+def _is_literal(token: str) -> bool:
+    """Check if a token is a value to match exactly: a number, region, size..."""
+    return LITERAL.match(token) is not None
+
+
+def stem(word: str) -> str:
+    """Drop plural endings, e.g. buckets -> bucket, policies -> policy."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
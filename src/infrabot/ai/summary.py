@@ -1,28 +1,53 @@
-from typing import Optional
+from typing import Any, Dict, Optional
 import logging
-from infrabot.ai.config import get_openai_client, MODEL_CONFIG
+import os
+from infrabot.ai.completion import completion
+from infrabot.ai.config import MODEL_CONFIG
+from infrabot.utils.plan_summary import summarize_plan_json
 
 logger = logging.getLogger(__name__)
 
 
-def summarize_terraform_plan(plan_output: str) -> Optional[str]:
+def get_plan_summary_mode() -> str:
+    """Get how plans are summarized: "local" (default) or "llm"."""
+    return os.getenv("PLAN_SUMMARY_MODE", "local").lower()
+
+
+def summarize_terraform_plan(
+    plan_output: str, plan_json: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
     """
-    Generate a concise summary of a Terraform plan using GPT-3.5-turbo.
+    Generate a concise summary of a Terraform plan.
+
+    The summary is rendered locally from the JSON plan. With PLAN_SUMMARY_MODE=llm,
+    it is then rephrased by GPT-3.5-turbo, which falls back to the raw plan output
+    when the JSON plan is not available.
 
     Args:
         plan_output: The raw output from terraform plan
+        plan_json: The plan as output by `terraform show -json`
 
     Returns:
         A concise summary of the plan changes, or None if summarization fails
-
-    Raises:
-        Exception: If there's an error communicating with the OpenAI API
     """
+    local_summary = summarize_plan_json(plan_json) if plan_json else None
+    if get_plan_summary_mode() != "llm":
+        return local_summary
+
+    if local_summary:
+        content = (
+            f"Please rephrase this summary of a Terraform plan:\n\n{local_summary}"
+        )
+    else:
+        content = f"Please summarize this Terraform plan:\n\n{plan_output}"
+    return _llm_summary(content) or local_summary
+
+
+def _llm_summary(content: str) -> Optional[str]:
     try:
-        client = get_openai_client()
         config = MODEL_CONFIG["summary"]
 
-        response = client.chat.completions.create(
+        response = completion(
             model=config["model"],
             messages=[
                 {
@@ -33,13 +58,11 @@ def summarize_terraform_plan(plan_output: str) -> Optional[str]:
                     "Use bullet points and keep it brief. "
                     "Describe the infrastructure as it is, without explicitly mentioning terraform.",
                 },
-                {
-                    "role": "user",
-                    "content": f"Please summarize this Terraform plan:\n\n{plan_output}",
-                },
+                {"role": "user", "content": content},
             ],
             temperature=config["temperature"],
             max_tokens=config["max_tokens"],
+            traced=True,
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
@@ -0,0 +1,240 @@
+"""Instant generation of common components from parametric templates.
+
+Requests are matched locally against the templates of TERRAFORM_TEMPLATES:
+a template is used only if the request names its resource, and every other
+word of the request is one the template covers, e.g. "an S3 bucket named
+logs with versioning in eu-west-1". Names, regions, sizes and flags of the
+request fill the slots of the template. Anything the templates do not cover
+("a public S3 bucket with a CloudFront distribution") falls back to the
+model. Labels and outputs are prefixed with the name of the component, so
+that components sharing a root module never declare them twice.
+"""
+
+import logging
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from infrabot.ai.config import TERRAFORM_TEMPLATES
+from infrabot.ai.semantic_cache import QUOTED, STOPWORDS, TOKEN, stem
+
+logger = logging.getLogger("infrabot.templates")
+
+# Words that do not change the component being asked for, for all templates
+COMMON_WORDS = frozenset(
+    """
+    aws amazon resource simple basic default standard single one terraform
+    """.split()
+)
+NAMED = re.compile(
+    r"\b(?:named|called)\s+[\"'`]?([A-Za-z0-9](?:[A-Za-z0-9._-]*[A-Za-z0-9])?)[\"'`]?",
+    re.I,
+)
+REGION = re.compile(
+    r"\b(?:us|eu|ap|sa|ca|me|af|il|mx)(?:-gov)?-"
+    r"(?:north|south|east|west|central|northeast|northwest|southeast|southwest)"
+    r"-\d\b",
+    re.I,
+)
+SECTION = re.compile(
+    r"^[ \t]*\{\{([#^])(\w+)\}\}\n(.*?)^[ \t]*\{\{/\2\}\}\n"
+    r"|\{\{([#^])(\w+)\}\}(.*?)\{\{/\5\}\}",
+    re.S | re.M,
+)
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+# Name of resources the request does not name, unique to the component and
+# the project, since not all resources accept a name prefix
+DEFAULT_NAME = "infrabot-{component}-${{substr(sha1(abspath(path.root)), 0, 8)}}"
+
+
+@dataclass
+class TemplateMatch:
+    """A template matching a request, with the values of its slots."""
+
+    template: str
+    params: Dict[str, Any] = field(default_factory=dict)
+
+
+def templates_enabled() -> bool:
+    """Check if templates are used, disabled by TERRAFORM_TEMPLATES=false."""
+    return os.getenv("TERRAFORM_TEMPLATES", "true").lower() == "true"
+
+
+def match_template(request: str) -> Optional[TemplateMatch]:
+    """
+    Find the template covering a request, if any.
+
+    Args:
+        request: Natural language description of the desired infrastructure
+
+    Returns:
+        Optional[TemplateMatch]: The matching template with its parameters, or
+            None if no template, or more than one, covers the request
+    """
+    matches = [
+        match
+        for match in (
+            _match(name, template, request)
+            for name, template in TERRAFORM_TEMPLATES.items()
+        )
+        if match is not None
+    ]
+    if len(matches) != 1:
+        return None
+    return matches[0]
+
+
+def render_template(match: TemplateMatch, component_name: str = "main") -> str:
+    """
+    Render a matched template as a response in the format of the model's.
+
+    Args:
+        match: The template and the values of its slots
+        component_name: Name of the component, prefixing labels and outputs
+
+    Returns:
+        str: Response with a terraform block, and a module.tfvars block if the
+            request specifies a region
+    """
+    template = TERRAFORM_TEMPLATES[match.template]
+    component = component_identifier(component_name)
+    params = {
+        **match.params,
+        "component": component,
+        "default_name": DEFAULT_NAME.format(component=component),
+    }
+    code = _render(template["code"], params)
+    response = f"```terraform\n{code.strip()}\n```\n"
+    if match.params.get("region"):
+        response += f'```module.tfvars\naws_region = "{match.params["region"]}"\n```\n'
+    response += (
+        f"```remarks\nThis is {template['description']}, generated from the "
+        f"pre-validated {match.template} template.\n```\n"
+    )
+    return response
+
+
+def generate_from_template(request: str, component_name: str = "main") -> Optional[str]:
+    """
+    Generate the response to a request from a template, without the model.
+
+    Args:
+        request: Natural language description of the desired infrastructure
+        component_name: Name of the component the code is generated for
+
+    Returns:
+        Optional[str]: The rendered response, or None if templates are disabled
+            or none covers the request
+    """
+    if not templates_enabled():
+        return None
+    match = match_template(request)
+    if match is None:
+        return None
+    logger.info(f"Using the {match.template} template: {match.params}")
+    return render_template(match, component_name)
+
+
+def component_identifier(component_name: str) -> str:
+    """Terraform identifier of a component name, which may start with a digit."""
+    return f"_{component_name}" if component_name[:1].isdigit() else component_name
+
+
+def _match(
+    name: str, template: Dict[str, Any], request: str
+) -> Optional[TemplateMatch]:
+    """Match a request against one template, returning None if it does not cover it."""
+    params: Dict[str, Any] = {}
+    text = request
+
+    values, text = _extract(REGION, text)
+    if len(values) > 1:
+        return None
+    params["region"] = values[0].lower() if values else None
+
+    for slot, spec in template.get("values", {}).items():
+        values, text = _extract(re.compile(spec["pattern"], re.I), text)
+        if len(values) > 1:
+            return None
+        value = values[0] if values else spec.get("default")
+        if values and "min" in spec:
+            value = int(value)
+            if not spec["min"] <= value <= spec["max"]:
+                return None
+        params[slot] = value
+
+    named, text = _extract(NAMED, text)
+    quoted, text = _extract(QUOTED, text)
+    names = named + quoted
+    if len(names) > 1:
+        return None
+    if names and (
+        names[0].lower() in STOPWORDS or not re.fullmatch(template["name"], names[0])
+    ):
+        return None
+    params["name"] = names[0] if names else None
+
+    words = {
+        stem(token) for token in TOKEN.findall(text.lower()) if token not in STOPWORDS
+    }
+    if not any(_stems(intent) <= words for intent in template["intents"]):
+        return None
+
+    known = set(COMMON_WORDS) | _stems(template["words"])
+    for intent in template["intents"]:
+        known |= _stems(intent)
+    for slot, triggers in template.get("flags", {}).items():
+        params[slot] = bool(_stems(triggers) & words)
+        known |= _stems(triggers)
+    for slot, spec in template.get("choices", {}).items():
+        chosen = [
+            option
+            for option, choice in spec["options"].items()
+            if _stems(choice["words"]) & words
+        ]
+        if len(chosen) > 1:
+            return None
+        option = chosen[0] if chosen else spec["default"]
+        params.update(spec["options"][option]["params"])
+        for other in spec["options"]:
+            params[other] = other == option
+        for choice in spec["options"].values():
+            known |= _stems(choice["words"])
+
+    if words - known:
+        return None
+    return TemplateMatch(name, params)
+
+
+def _extract(pattern: re.Pattern, text: str) -> Tuple[List[str], str]:
+    """Find the values of a pattern in a text, and remove them from it."""
+    values = [
+        next(group for group in m.groups() if group is not None) if m.groups() else m[0]
+        for m in pattern.finditer(text)
+    ]
+    return values, pattern.sub(" ", text)
+
+
+def _stems(words: List[str]) -> Set[str]:
+    """Stems of a list of words."""
+    return {stem(word) for word in words}
+
+
+def _render(code: str, params: Dict[str, Any]) -> str:
+    """Render the sections and placeholders of a template."""
+
+    def section(m: re.Match) -> str:
+        kind, slot, body = m[1] or m[4], m[2] or m[5], m[3] if m[1] else m[6]
+        keep = bool(params.get(slot)) == (kind == "#")
+        return _render(body, params) if keep else ""
+
+    code = SECTION.sub(section, code)
+    return PLACEHOLDER.sub(lambda m: _format(params[m[1]]), code)
+
+
+def _format(value: Any) -> str:
+    """Format a slot value in terraform code."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
@@ -1,17 +1,40 @@
 """Module for generating Terraform configurations using AI."""
 
+import hashlib
 import logging
-from typing import Optional
+import os
+import re
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from infrabot.ai.completion import completion
 from infrabot.ai.config import (
     MODEL_CONFIG,
     TERRAFORM_SYSTEM_PROMPT,
     TERRAFORM_FIX_SYSTEM_PROMPT,
+    TERRAFORM_PATCH_SYSTEM_PROMPT,
     LANGFUSE_ENABLED,
 )
+from infrabot.ai.error_context import distill_error
+from infrabot.ai.semantic_cache import (
+    DEFAULT_MAX_ENTRIES,
+    SemanticCache,
+    get_semantic_cache_threshold,
+)
+from infrabot.ai.templates import generate_from_template
+from infrabot.infra_utils.hcl_index import replace_blocks
+from infrabot.infra_utils.terraform_events import Diagnostic
+from infrabot.utils.file_cache import FileCache, get_cache_dir, hash_key
 
 logger = logging.getLogger(__name__)
 
+# How fixes are requested: only the changed blocks, or a rewrite of the whole code
+FIX_MODES = ("patch", "full")
+
+# Generated responses are cached for a day, up to 64 MiB, by default
+DEFAULT_RESPONSE_CACHE_TTL = 24 * 60 * 60
+DEFAULT_RESPONSE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+QUOTED_TEXT = re.compile(r"""("[^"]*"|'[^']*'|`[^`]*`)""")
+
 if LANGFUSE_ENABLED:
     from langfuse.decorators import observe, langfuse_context
     from langfuse import Langfuse
@@ -21,7 +44,12 @@ if LANGFUSE_ENABLED:
 
 @observe(as_type="generation") if LANGFUSE_ENABLED else lambda x: x
 def gen_terraform(
-    request: str, model: str = "gpt-4o", session_id: Optional[str] = None
+    request: str,
+    model: str = "gpt-4o",
+    session_id: Optional[str] = None,
+    use_cache: bool = True,
+    component_name: str = "main",
+    isolated: bool = False,
 ) -> str:
     """
     Generate Terraform configuration based on a natural language request.
@@ -30,22 +58,18 @@ def gen_terraform(
         request: Natural language description of the desired infrastructure
         model: The LLM model to use (default: "gpt-4o")
         session_id: Optional session ID for Langfuse tracing
+        use_cache: Return the cached response of the same request, if any
+        component_name: Name of the component the code is generated for
+        isolated: Whether the component has its own root module
 
     Returns:
         Generated Terraform configuration as a string
     """
     config = MODEL_CONFIG["terraform"]
-
-    messages = [
-        {
-            "role": "system",
-            "content": TERRAFORM_SYSTEM_PROMPT,
-        },
-        {
-            "role": "user",
-            "content": request,
-        },
-    ]
+    local = get_local_generation(request, model, use_cache, component_name, isolated)
+    if local is not None:
+        return local
+    messages = _generation_messages(request)
 
     response = completion(
         model=model,
@@ -64,6 +88,59 @@ def gen_terraform(
     return response.choices[0].message.content
 
 
+@observe(as_type="generation") if LANGFUSE_ENABLED else lambda x: x
+def gen_terraform_stream(
+    request: str,
+    model: str = "gpt-4o",
+    session_id: Optional[str] = None,
+    use_cache: bool = True,
+    component_name: str = "main",
+    isolated: bool = False,
+) -> Iterator[str]:
+    """
+    Stream a Terraform configuration generated from a natural language request.
+
+    Args:
+        request: Natural language description of the desired infrastructure
+        model: The LLM model to use (default: "gpt-4o")
+        session_id: Optional session ID for Langfuse tracing
+        use_cache: Yield the cached response of the same request, if any, as
+            a single chunk
+        component_name: Name of the component the code is generated for
+        isolated: Whether the component has its own root module
+
+    Yields:
+        Chunks of the generated response as they arrive. Responses generated
+        from a template or the cache are yielded as a single chunk
+    """
+    config = MODEL_CONFIG["terraform"]
+    local = get_local_generation(request, model, use_cache, component_name, isolated)
+    if local is not None:
+        yield local
+        return
+    messages = _generation_messages(request)
+
+    response = completion(
+        model=model,
+        messages=messages,
+        temperature=config["temperature"],
+        stream=True,
+    )
+
+    chunks = []
+    for chunk in _iter_stream_content(response):
+        chunks.append(chunk)
+        yield chunk
+
+    if LANGFUSE_ENABLED:
+        langfuse_context.update_current_trace(
+            input=messages,
+            metadata={"temperature": config["temperature"], "stream": True},
+            session_id=session_id,
+            output="".join(chunks),
+        )
+
+
 @observe(as_type="generation") if LANGFUSE_ENABLED else lambda x: x
 def fix_terraform(
     request: str,
@@ -72,9 +149,14 @@ def fix_terraform(
     error_output: str,
     model: str = "gpt-4o",
     session_id: Optional[str] = None,
+    mode: Optional[str] = None,
+    diagnostics: Optional[List[Diagnostic]] = None,
 ) -> str:
     """
-    Fix Terraform configuration based on error output using predicted outputs for faster response.
+    Fix Terraform configuration based on error output.
+
+    In patch mode, only the blocks to change are generated. In full mode, the
+    whole configuration is rewritten, using predicted outputs for faster response.
 
     Args:
         request: Original natural language request
@@ -83,17 +165,350 @@ def fix_terraform(
         error_output: Error output from terraform plan/apply
         model: The LLM model to use (default: "gpt-4o")
         session_id: Optional session ID for Langfuse tracing
+        mode: "patch" or "full", defaults to get_fix_mode()
+        diagnostics: Structured diagnostics of the error, if known
 
     Returns:
-        Fixed Terraform configuration as a string
+        The fix response, to be resolved with apply_fix
     """
     config = MODEL_CONFIG["terraform_fix"]
+    kwargs = _fix_completion_kwargs(
+        request, current_code, tfvars_code, error_output, model, mode, diagnostics
+    )
+
+    response = completion(**kwargs)
+
+    if LANGFUSE_ENABLED and hasattr(response, "usage"):
+        langfuse_context.update_current_trace(
+            input=kwargs["messages"],
+            metadata={
+                "temperature": config["temperature"],
+                "error_output": error_output,
+            },
+            session_id=session_id,
+            output=response.choices[0].message.content,
+        )
+
+    return response.choices[0].message.content
+
+
+@observe(as_type="generation") if LANGFUSE_ENABLED else lambda x: x
+def fix_terraform_stream(
+    request: str,
+    current_code: str,
+    tfvars_code: str,
+    error_output: str,
+    model: str = "gpt-4o",
+    session_id: Optional[str] = None,
+    mode: Optional[str] = None,
+    diagnostics: Optional[List[Diagnostic]] = None,
+) -> Iterator[str]:
+    """
+    Stream a fixed Terraform configuration based on error output.
+
+    Args:
+        request: Original natural language request
+        current_code: Current terraform code that produced the error
+        tfvars_code: Current tfvars code that produced the error
+        error_output: Error output from terraform plan/apply
+        model: The LLM model to use (default: "gpt-4o")
+        session_id: Optional session ID for Langfuse tracing
+        mode: "patch" or "full", defaults to get_fix_mode()
+        diagnostics: Structured diagnostics of the error, if known
+
+    Yields:
+        Chunks of the fixed response as they arrive
+    """
+    config = MODEL_CONFIG["terraform_fix"]
+    kwargs = _fix_completion_kwargs(
+        request, current_code, tfvars_code, error_output, model, mode, diagnostics
+    )
+
+    response = completion(**kwargs, stream=True)
+
+    chunks = []
+    for chunk in _iter_stream_content(response):
+        chunks.append(chunk)
+        yield chunk
+
+    if LANGFUSE_ENABLED:
+        langfuse_context.update_current_trace(
+            input=kwargs["messages"],
+            metadata={
+                "temperature": config["temperature"],
+                "error_output": error_output,
+                "stream": True,
+            },
+            session_id=session_id,
+            output="".join(chunks),
+        )
+
+
+def _generation_messages(request: str) -> List[Dict[str, str]]:
+    """Build the chat messages for generating terraform code."""
+    return [
+        {
+            "role": "system",
+            "content": TERRAFORM_SYSTEM_PROMPT,
+        },
+        {
+            "role": "user",
+            "content": request,
+        },
+    ]
+
+
+def response_cache_enabled() -> bool:
+    """Check if generated responses are cached, disabled by RESPONSE_CACHE=false."""
+    return os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+
+
+_response_caches: Dict[str, FileCache] = {}
+_response_caches_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[FileCache]:
+    """Get the cache of generated responses, or None if it is disabled.
+
+    Entries expire after RESPONSE_CACHE_TTL seconds (a day by default) and the
+    oldest are evicted beyond RESPONSE_CACHE_MAX_BYTES (64 MiB by default).
+    """
+    if not response_cache_enabled():
+        return None
+    directory = os.path.join(get_cache_dir(), "terraform_responses")
+    with _response_caches_lock:
+        if directory not in _response_caches:
+            ttl = float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL))
+            max_bytes = int(
+                os.getenv("RESPONSE_CACHE_MAX_BYTES", DEFAULT_RESPONSE_CACHE_MAX_BYTES)
+            )
+            _response_caches[directory] = FileCache(
+                directory, ttl=ttl or None, max_bytes=max_bytes or None
+            )
+        return _response_caches[directory]
+
+
+def normalize_prompt(request: str) -> str:
+    """Normalize a request so that trivially different phrasings share a cache entry.
+
+    Whitespace is collapsed, trailing punctuation dropped and the text
+    lowercased, except for quoted names and values.
+    """
+    parts = QUOTED_TEXT.split(" ".join(request.split()).rstrip(".!"))
+    return "".join(
+        part if index % 2 else part.lower() for index, part in enumerate(parts)
+    )
+
+
+def semantic_cache_enabled() -> bool:
+    """Check if code of similar requests is reused, disabled by SEMANTIC_CACHE=false."""
+    return os.getenv("SEMANTIC_CACHE", "true").lower() == "true"
+
+
+_semantic_caches: Dict[str, SemanticCache] = {}
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Get the index of the requests whose code applied, or None if disabled.
+
+    It shares the TTL of the response cache, and keeps up to
+    SEMANTIC_CACHE_MAX_ENTRIES entries (100,000 by default).
+    """
+    if not response_cache_enabled() or not semantic_cache_enabled():
+        return None
+    path = os.path.join(get_cache_dir(), "terraform_requests.jsonl")
+    with _response_caches_lock:
+        if path not in _semantic_caches:
+            ttl = float(os.getenv("RESPONSE_CACHE_TTL", DEFAULT_RESPONSE_CACHE_TTL))
+            max_entries = int(
+                os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)
+            )
+            _semantic_caches[path] = SemanticCache(
+                path, ttl=ttl or None, max_entries=max_entries
+            )
+        return _semantic_caches[path]
+
+
+def generation_scope(component_name: str = "main", isolated: bool = False) -> str:
+    """Scope in which generated code can be reused by other components.
+
+    Isolated components have their own root module, so any of them can reuse
+    the code of another. Components sharing a root module would declare the
+    same resources and outputs twice, so only the same component reuses its
+    code, e.g. when it is created again after being destroyed.
+    """
+    return "isolated" if isolated else f"component:{component_name}"
+
+
+def generation_namespace(model: str, scope: str = generation_scope()) -> str:
+    """Key of the settings of a generation: model, system prompt and temperature.
+
+    The temperature is rounded to a tenth. Generations of different scopes
+    (see generation_scope) have different namespaces.
+    """
+    temperature = MODEL_CONFIG["terraform"]["temperature"]
+    system_prompt_hash = hashlib.blake2b(
+        TERRAFORM_SYSTEM_PROMPT.encode(), digest_size=16
+    ).hexdigest()
+    return hash_key(model, system_prompt_hash, round(float(temperature), 1), scope)
+
+
+def response_cache_key(
+    request: str, model: str, scope: str = generation_scope()
+) -> str:
+    """Key of the cached response of a request.
+
+    Keyed by the normalized request and the settings of the generation.
+    """
+    return hash_key(normalize_prompt(request), generation_namespace(model, scope))
+
+
+def get_local_generation(
+    request: str,
+    model: str,
+    use_cache: bool = True,
+    component_name: str = "main",
+    isolated: bool = False,
+) -> Optional[str]:
+    """Get the response to a generation request without calling the model.
+
+    Common components are generated from a template, others are looked up in
+    the cache if use_cache is set.
+    """
+    response = generate_from_template(request, component_name)
+    if response is None and use_cache:
+        response = get_cached_generation(
+            request, model, generation_scope(component_name, isolated)
+        )
+    return response
+
+
+def get_cached_generation(
+    request: str, model: str, scope: str = generation_scope()
+) -> Optional[str]:
+    """Get the cached response of a generation request, if any.
+
+    Falls back to the code of the most similar request, if similar enough.
+    Only code cached in the same scope (see generation_scope) is reused.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    found, response = cache.get(response_cache_key(request, model, scope))
+    if found:
+        logger.info("Using the cached response of the same request")
+        return response
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is None:
+        return None
+    match = semantic_cache.lookup(
+        request, generation_namespace(model, scope), get_semantic_cache_threshold()
+    )
+    if match is None:
+        return None
+    entry, similarity = match
+    logger.info(
+        f"Using the code of a similar request ({similarity:.2f}): {entry.prompt}"
+    )
+    return entry.response
+
+
+def cache_generation(
+    request: str,
+    model: str,
+    terraform_code: str,
+    tfvars_code: str = "",
+    scope: str = generation_scope(),
+) -> None:
+    """Cache code generated for a request, once it was successfully applied.
+
+    The code is cached as a response in the format of the model's, so that
+    it is parsed the same way when reused, within `scope` (see generation_scope).
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return
+    response = f"```terraform\n{terraform_code.strip()}\n```\n"
+    if tfvars_code.strip():
+        response += f"\n```module.tfvars\n{tfvars_code.strip()}\n```\n"
+    cache.set(response_cache_key(request, model, scope), response)
+
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        semantic_cache.add(request, generation_namespace(model, scope), response)
+
+
+def get_fix_mode() -> str:
+    """Get how fixes are requested: "patch" (default) or "full".
+
+    Overridden by the TERRAFORM_FIX_MODE environment variable.
+    """
+    mode = os.getenv("TERRAFORM_FIX_MODE", "patch").lower()
+    if mode not in FIX_MODES:
+        logger.warning(f"Unknown TERRAFORM_FIX_MODE '{mode}', using patch mode")
+        return "patch"
+    return mode
+
+
+def apply_fix(
+    blocks: Dict[str, str], current_code: str, tfvars_code: str
+) -> Optional[Tuple[str, str]]:
+    """Get the fixed code from the code blocks of a fix response.
+
+    Full rewrites are used as they are, patches are applied to the current code.
+
+    Args:
+        blocks: Code blocks of the fix response, keyed by title
+        current_code: Terraform code the fix was requested for
+        tfvars_code: Tfvars code the fix was requested for
+
+    Returns:
+        The fixed terraform and tfvars code, or None if the response has no code
+        or its patch does not apply
+    """
+    if "terraform" in blocks:
+        return blocks["terraform"], blocks.get("module.tfvars", "")
+    if "terraform-patch" not in blocks and "remove" not in blocks:
+        return None
+
+    remove = [key.strip() for key in blocks.get("remove", "").splitlines()]
+    try:
+        fixed_code = replace_blocks(
+            current_code,
+            blocks.get("terraform-patch", ""),
+            remove=[key for key in remove if key],
+        )
+    except ValueError as e:
+        logger.warning(f"Failed to apply the fix patch: {str(e)}")
+        return None
+    return fixed_code, blocks.get("module.tfvars", tfvars_code)
+
+
+def _fix_completion_kwargs(
+    request: str,
+    current_code: str,
+    tfvars_code: str,
+    error_output: str,
+    model: str,
+    mode: Optional[str] = None,
+    diagnostics: Optional[List[Diagnostic]] = None,
+) -> Dict[str, Any]:
+    """Build the completion arguments for fixing terraform code.
+
+    The error is distilled to its deduplicated diagnostics. Patches only need
+    the blocks the diagnostics reference, so only those are sent in patch mode.
+    """
+    config = MODEL_CONFIG["terraform_fix"]
+    mode = mode or get_fix_mode()
+    context = distill_error(error_output, current_code, diagnostics)
+    code = current_code if mode == "full" else context.code_excerpt(current_code)
 
     prompt = f"""Original request: {request}
 
 Current terraform code:
 ```terraform
-{current_code}
+{code}
 ```
 
 Current tfvars code:
@@ -103,7 +518,7 @@ Current tfvars code:
 
 Error output:
 ```
-{error_output}
+{context.error_text()}
 ```
 
 Please fix the terraform code to resolve these errors."""
@@ -111,7 +526,11 @@ Please fix the terraform code to resolve these errors."""
     messages = [
         {
             "role": "system",
-            "content": TERRAFORM_FIX_SYSTEM_PROMPT,
+            "content": (
+                TERRAFORM_PATCH_SYSTEM_PROMPT
+                if mode == "patch"
+                else TERRAFORM_FIX_SYSTEM_PROMPT
+            ),
         },
         {
             "role": "user",
@@ -119,30 +538,27 @@ Please fix the terraform code to resolve these errors."""
         },
     ]
 
-    # Only use prediction for gpt-4o and gpt-4o-mini models
     kwargs = {
         "model": model,
         "messages": messages,
         "temperature": config["temperature"],
     }
 
-    if model in ["gpt-4o", "gpt-4o-mini"]:
+    # Predictions only help when the whole code is rewritten
+    if mode == "full" and model in ["gpt-4o", "gpt-4o-mini"]:
         kwargs["prediction"] = {"type": "content", "content": current_code}
 
-    response = completion(**kwargs)
+    return kwargs
 
-    if LANGFUSE_ENABLED and hasattr(response, "usage"):
-        langfuse_context.update_current_trace(
-            input=messages,
-            metadata={
-                "temperature": config["temperature"],
-                "error_output": error_output,
-            },
-            session_id=session_id,
-            output=response.choices[0].message.content,
-        )
 
-    return response.choices[0].message.content
+def _iter_stream_content(response) -> Iterator[str]:
+    """Yield the text deltas of a streamed completion response."""
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        content = chunk.choices[0].delta.content
+        if content:
+            yield content
 
 
 def log_terraform_error(error: str, session_id: Optional[str] = None) -> None:
@@ -14,14 +14,19 @@ __all__ = ["init_project", "start_chat_session", "create_component"]
 
 
 def init_project(
-    workdir: str = ".infrabot/default", verbose: bool = False, local: bool = False
+    workdir: str = ".infrabot/default",
+    verbose: bool = False,
+    local: bool = False,
+    isolated: bool = False,
 ) -> InitProjectResponse:
     """Initialize a new project.
 
     This function now delegates to the service function but maintains the original CLI output.
     """
     # Call the service function
-    result = service_init_project(workdir=workdir, verbose=verbose, local=local)
+    result = service_init_project(
+        workdir=workdir, verbose=verbose, local=local, isolated=isolated
+    )
 
     # Still provide the CLI output for backward compatibility
     if result.success:
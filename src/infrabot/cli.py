@@ -1,30 +1,41 @@
 """Console script for infrabot."""
 
 import os
-from typing import Optional
+from typing import Iterable, List, Optional
 import re
 import logging
+import time
 import warnings
 import uuid
 
+from rich.console import Group
 from rich.live import Live
+from rich.markup import escape
 from rich.spinner import Spinner
+from rich.text import Text
 from rich import print as rprint
 
 import typer
 from rich.console import Console
 
 from infrabot.ai.terraform_generator import (
-    gen_terraform,
-    fix_terraform,
+    gen_terraform_stream,
+    fix_terraform_stream,
+    apply_fix,
+    cache_generation,
+    generation_scope,
+    get_fix_mode,
     log_terraform_error,
 )
-from infrabot.infra_utils.terraform import TerraformWrapper
+from infrabot.ai.fix_memory import AppliedFix, FixTracker, get_fix_memory
+from infrabot.infra_utils.terraform import TerraformWrapper, validation_enabled
+from infrabot.infra_utils.provider_cache import build_provider_mirror
+from infrabot.infra_utils.terraform_events import ResourceEvent, TerraformEvent
 from infrabot.infra_utils.component_manager import (
     TerraformComponentManager,
     TerraformComponent,
 )
-from infrabot.utils.parsing import extract_code_blocks
+from infrabot.utils.parsing import parse_code_blocks
 from infrabot import api
 from infrabot import __version__
 from infrabot.utils.logging_config import setup_logging
@@ -35,12 +46,16 @@ from infrabot.utils.output_formatter import display_terraform_outputs
 warnings.filterwarnings("ignore", message="Valid config keys have changed in V2:*")
 
 WORKDIR = ".infrabot/default"
+# Number of trailing lines of a streamed LLM response shown while it is generated
+PREVIEW_LINES = 20
 
 app = typer.Typer()
 component_app = typer.Typer(help="Manage components in InfraBot")
+providers_app = typer.Typer(help="Manage the Terraform providers cache")
 logger = logging.getLogger("infrabot.cli")
 
 app.add_typer(component_app, name="component")
+app.add_typer(providers_app, name="providers")
 console = Console()
 
 
@@ -52,10 +67,16 @@ def init_project(
     local: bool = typer.Option(
         False, "--local", "-l", help="Use localstack for infrastructure"
     ),
+    isolated: bool = typer.Option(
+        False,
+        "--isolated",
+        "-i",
+        help="Give each component its own root module and state",
+    ),
 ):
     """Initialize a new project."""
     logger.debug("Initializing new project")
-    api.init_project(verbose=verbose, local=local)
+    api.init_project(verbose=verbose, local=local, isolated=isolated)
 
 
 @component_app.command("create")
@@ -102,6 +123,11 @@ def create_component(
         "--langfuse-session-id",
         help="Session ID for Langfuse tracking. Auto-generated if not provided",
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Do not reuse the cached code of the same or similar prompts",
+    ),
 ):
     """Create a new component."""
     # Validate the component name
@@ -126,33 +152,37 @@ def create_component(
     terraform_wrapper = TerraformWrapper(WORKDIR)
     session_id = langfuse_session_id or str(uuid.uuid4())
 
-    # Create a spinner for generation
-    spinner = Spinner("dots", text="Generating Terraform resources...")
-
-    # Generate terraform code
-    with Live(spinner, refresh_per_second=10) as live:
-        logger.debug(
-            f"Generating terraform code for prompt: {prompt} using model: {model}"
-        )
-        response = gen_terraform(prompt, model=model, session_id=session_id)
-
-        # in case the response is coming from a reasoning model
-        # Remove content between <think></think> tags
-        response = re.sub(r"<think>.*?</think>", "", response, flags=re.DOTALL)
-
-        terraform_code = extract_code_blocks(response, title="terraform")[0]
-        tfvars_code = next(
-            iter(extract_code_blocks(response, title="module.tfvars")), ""
+    # Generate terraform code, showing it as it is generated
+    logger.debug(f"Generating terraform code for prompt: {prompt} using model: {model}")
+    response = _stream_with_preview(
+        gen_terraform_stream(
+            prompt,
+            model=model,
+            session_id=session_id,
+            use_cache=not no_cache,
+            component_name=name,
+            isolated=component.isolated,
+        ),
+        "Generating Terraform resources...",
+        "Generation complete!",
+    )
+
+    # Extract code blocks, dropping <think> sections of reasoning models
+    blocks = parse_code_blocks(response)
+    if "terraform" not in blocks:
+        rprint(
+            "[bold red]No terraform code found in the generated response.[/bold red]"
         )
-        _ = next(iter(extract_code_blocks(response, title="remarks")), "")
+        return
 
-        # Update spinner text before stopping
-        spinner.text = "Generation complete!"
+    terraform_code = blocks["terraform"]
+    tfvars_code = blocks.get("module.tfvars", "")
 
     # Update component with generated code
     component.terraform_code = terraform_code
     component.tfvars_code = tfvars_code
 
+    fix_tracker = FixTracker(get_fix_memory())
     attempt = 1
     while attempt <= max_attempts:
         try:
@@ -160,19 +190,42 @@ def create_component(
             if not TerraformComponentManager.save_component(component, overwrite=True):
                 return
 
+            # Isolated components are their own root module
+            if component.isolated:
+                terraform_wrapper.init(component=component)
+
+            # Save the plan so that exactly the reviewed changes get applied
+            plan_file = terraform_wrapper.new_plan_file(component)
             try:
+                # Catch syntax and schema errors locally before planning
+                if validation_enabled():
+                    with Live(
+                        Spinner("dots", text="Validating..."), refresh_per_second=10
+                    ):
+                        terraform_wrapper.check_schema(component)
+                        if terraform_wrapper.fmt(component):
+                            terraform_code = component.terraform_code
+                            tfvars_code = component.tfvars_code
+                        terraform_wrapper.validate(component)
+
                 # Run Terraform plan
                 logger.debug("Running terraform plan")
                 with Live(
                     Spinner("dots", text="Generating a plan..."), refresh_per_second=10
                 ):
-                    plan_output = terraform_wrapper.plan(component)
+                    plan_output = terraform_wrapper.plan(component, plan_file=plan_file)
 
                 # Generate and display the plan summary regardless of verbose mode
-                summary = summarize_terraform_plan(plan_output)
+                try:
+                    plan_json = terraform_wrapper.show_plan_json(plan_file, component)
+                except Exception as e:
+                    # Still summarize the plan, from its text alone
+                    logger.warning(f"Failed to convert the plan to JSON: {str(e)}")
+                    plan_json = None
+                summary = summarize_terraform_plan(plan_output, plan_json)
                 if summary:
                     rprint("\n[bold]Plan Summary:[/bold]")
-                    rprint(summary)
+                    rprint(escape(summary))
 
                 if verbose:
                     rprint("\nDetailed Terraform Plan:")
@@ -191,19 +244,43 @@ def create_component(
                 logger.debug("Applying terraform changes")
                 with Live(Spinner("dots"), refresh_per_second=10) as live:
                     live.update("[yellow]Applying Terraform changes...[/yellow]")
-                    terraform_wrapper.apply(component)
-                    outputs = terraform_wrapper.get_outputs()
+
+                    def show_progress(event: TerraformEvent) -> None:
+                        # Show the resource being applied, e.g. "...: Creating..."
+                        if isinstance(event, ResourceEvent) and event.message:
+                            live.update(
+                                "[yellow]Applying Terraform changes... "
+                                f"{escape(event.message)}[/yellow]"
+                            )
+
+                    terraform_wrapper.apply(
+                        component, plan_file=plan_file, on_event=show_progress
+                    )
+                    outputs = terraform_wrapper.get_outputs(component)
 
                 rprint("[bold green]Changes applied successfully![/bold green]")
 
                 # Display outputs if any exist
                 display_terraform_outputs(outputs)
 
+                _show_fix_outcome(fix_tracker.resolve())
+                if not no_cache:
+                    cache_generation(
+                        prompt,
+                        model,
+                        terraform_code,
+                        tfvars_code,
+                        generation_scope(name, component.isolated),
+                    )
                 break  # Success, exit the loop
 
             except Exception as e:
                 error_output = str(e)
+                diagnostics = getattr(e, "diagnostics", None)
                 log_terraform_error(error_output, session_id)
+                _show_fix_outcome(
+                    fix_tracker.resolve(error_output, terraform_code, diagnostics)
+                )
 
                 if not self_healing or attempt >= max_attempts:
                     if not keep_on_failure:
@@ -221,30 +298,71 @@ def create_component(
                     f"\n[yellow]Attempting to fix Terraform errors (attempt {attempt}/{max_attempts})...[/yellow]"
                 )
 
-                with Live(
-                    Spinner("dots", text="Fixing Terraform code..."),
-                    refresh_per_second=10,
-                ):
-                    response = fix_terraform(
-                        prompt,
-                        terraform_code,
-                        tfvars_code,
-                        error_output,
-                        model=model,
-                        session_id=session_id,
+                # Replay a remembered fix of the same error, or ask the model
+                fix_started = time.monotonic()
+                fixed_code = fix_tracker.recall(
+                    error_output, terraform_code, diagnostics
+                )
+                if fixed_code is not None:
+                    rprint("[green]Applied a remembered fix for this error.[/green]")
+                    fixed = (fixed_code, tfvars_code)
+                else:
+                    fix_mode = get_fix_mode()
+                    response = _stream_with_preview(
+                        fix_terraform_stream(
+                            prompt,
+                            terraform_code,
+                            tfvars_code,
+                            error_output,
+                            model=model,
+                            session_id=session_id,
+                            mode=fix_mode,
+                            diagnostics=diagnostics,
+                        ),
+                        "Fixing Terraform code...",
+                        "Fix complete!",
                     )
-                    if not response:
-                        raise Exception("Failed to fix Terraform code")
-
-                    terraform_code = extract_code_blocks(response, title="terraform")[0]
-                    tfvars_code = next(
-                        iter(extract_code_blocks(response, title="module.tfvars")), ""
+                    fixed = apply_fix(
+                        parse_code_blocks(response), terraform_code, tfvars_code
                     )
-                    _ = next(iter(extract_code_blocks(response, title="remarks")), "")
-
-                    # Update component with fixed code
-                    component.terraform_code = terraform_code
-                    component.tfvars_code = tfvars_code
+                    if fixed is None and fix_mode == "patch":
+                        # Fall back to rewriting the whole code
+                        response = _stream_with_preview(
+                            fix_terraform_stream(
+                                prompt,
+                                terraform_code,
+                                tfvars_code,
+                                error_output,
+                                model=model,
+                                session_id=session_id,
+                                mode="full",
+                                diagnostics=diagnostics,
+                            ),
+                            "Patch did not apply, rewriting Terraform code...",
+                            "Fix complete!",
+                        )
+                        fixed = apply_fix(
+                            parse_code_blocks(response), terraform_code, tfvars_code
+                        )
+                    if fixed is not None:
+                        fix_tracker.learn(
+                            error_output,
+                            terraform_code,
+                            fixed[0],
+                            time.monotonic() - fix_started,
+                            diagnostics,
+                        )
+                if fixed is None:
+                    raise Exception("Failed to fix Terraform code")
+
+                terraform_code, tfvars_code = fixed
+
+                # Update component with fixed code
+                component.terraform_code = terraform_code
+                component.tfvars_code = tfvars_code
+
+            finally:
+                terraform_wrapper.remove_plan_file(plan_file)
 
         except Exception:
             if not keep_on_failure:
@@ -259,6 +377,38 @@ def create_component(
         )
 
 
+def _show_fix_outcome(fix: Optional[AppliedFix]) -> None:
+    """Show the time saved by a remembered fix once it resolved its error."""
+    if fix is not None and fix.source == "memory" and fix.time_saved:
+        rprint(
+            f"[green]Remembered fix saved about {fix.time_saved:.1f}s "
+            f"({fix.hit_rate:.0%} of recurring errors fixed from memory).[/green]"
+        )
+
+
+def _stream_with_preview(chunks: Iterable[str], text: str, done_text: str) -> str:
+    """Assemble a streamed LLM response, showing its latest lines under a spinner.
+
+    Args:
+        chunks: Text chunks of the streamed response
+        text: Spinner text while the response is generated
+        done_text: Spinner text once the response is complete
+
+    Returns:
+        str: The complete response
+    """
+    spinner = Spinner("dots", text=text)
+    response = ""
+    with Live(spinner, refresh_per_second=10) as live:
+        for chunk in chunks:
+            response += chunk
+            preview = "\n".join(response.splitlines()[-PREVIEW_LINES:])
+            live.update(Group(spinner, Text(preview, style="dim")))
+        spinner.text = done_text
+        live.update(spinner)
+    return response
+
+
 def _validate_component_and_project(
     component_name: Optional[str] = None,
 ) -> tuple[list[str], Optional[str]]:
@@ -307,17 +457,17 @@ def _confirm_action(
 
 @component_app.command("destroy")
 def destroy_component(
-    # component_name: Optional[str] = typer.Option(
-    #     None,
-    #     "--name",
-    #     "-n",
-    #     help="Name of the component to destroy infrastructure for",
-    # ),
+    component_name: Optional[str] = typer.Option(
+        None,
+        "--name",
+        "-n",
+        help="Name of the component to destroy infrastructure for",
+    ),
     force: bool = typer.Option(
         False, "--force", "-f", help="Force destruction without confirmation"
     ),
 ):
-    """Destroy all cloud infrastructure while keeping configurations."""
+    """Destroy cloud infrastructure while keeping configurations."""
     logger.debug("Destroying component infrastructure")
 
     components = TerraformComponentManager.list_components(WORKDIR)
@@ -327,20 +477,19 @@ def destroy_component(
         return
 
     # Create component object if name is specified
-    # component = None
-    # if component_name:
-    #     component = TerraformComponent(
-    #         name=component_name, terraform_code="", workdir=WORKDIR
-    #     )
-    # if not TerraformComponentManager.component_exists(component):
-    #     rprint(f"[bold red]Component '{component_name}' not found![/bold red]")
-    #     return
+    component = None
+    if component_name:
+        component = TerraformComponent(
+            name=component_name, terraform_code="", workdir=WORKDIR
+        )
+        if not TerraformComponentManager.component_exists(component):
+            rprint(f"[bold red]Component '{component_name}' not found![/bold red]")
+            return
 
     # Confirm destruction unless force flag is used
     if not _confirm_action(
         "destroy",
-        # component_name,
-        None,
+        component_name,
         components,
         force,
         "This action will remove resources while keeping their corresponding configuration.",
@@ -352,17 +501,16 @@ def destroy_component(
         with Live(
             Spinner("dots", text="Destroying infrastructure..."), refresh_per_second=10
         ):
-            # result = terraform_wrapper.destroy(component)
-            result = terraform_wrapper.destroy(None)
-        logger.debug("result from terraform:", result)
-        # if component_name:
-        #     rprint(
-        #         f"[bold green]Infrastructure for component '{component_name}' has been successfully destroyed![/bold green]"
-        #     )
-        # else:
-        rprint(
-            "[bold green]All infrastructure has been successfully destroyed![/bold green]"
-        )
+            result = terraform_wrapper.destroy(component)
+        logger.debug(f"result from terraform: {result}")
+        if component_name:
+            rprint(
+                f"[bold green]Infrastructure for component '{component_name}' has been successfully destroyed![/bold green]"
+            )
+        else:
+            rprint(
+                "[bold green]All infrastructure has been successfully destroyed![/bold green]"
+            )
 
     except Exception as e:
         logger.error(f"Error destroying component infrastructure: {str(e)}")
@@ -373,17 +521,17 @@ def destroy_component(
 
 @component_app.command("delete")
 def delete_component(
-    # component_name: Optional[str] = typer.Option(
-    #     None,
-    #     "--name",
-    #     "-n",
-    #     help="Name of the component configuration to delete",
-    # ),
+    component_name: Optional[str] = typer.Option(
+        None,
+        "--name",
+        "-n",
+        help="Name of the component configuration to delete",
+    ),
     force: bool = typer.Option(
         False, "--force", "-f", help="Force deletion without confirmation"
     ),
 ):
-    """Delete all component configurations."""
+    """Delete component configurations and their infrastructure."""
     logger.debug("Deleting component configuration")
 
     components = TerraformComponentManager.list_components(WORKDIR)
@@ -393,20 +541,20 @@ def delete_component(
         return
 
     # Create component object if name is specified
-    # component = None
-    # if component_name:
-    #     component = TerraformComponent(
-    #         name=component_name, terraform_code="", workdir=WORKDIR
-    #     )
-    #     if not TerraformComponentManager.component_exists(component):
-    #         rprint(f"[bold red]Component '{component_name}' not found![/bold red]")
-    #         return
+    component = None
+    if component_name:
+        component = TerraformComponent(
+            name=component_name, terraform_code="", workdir=WORKDIR
+        )
+        if not TerraformComponentManager.component_exists(component):
+            rprint(f"[bold red]Component '{component_name}' not found![/bold red]")
+            return
 
     # Confirm deletion unless force flag is used
     if not _confirm_action(
         "delete",
-        # component_name,
-        None,
+        component_name,
+        components,
         force,
         "This action will remove resources and their corresponding configuration.",
     ):
@@ -418,25 +566,24 @@ def delete_component(
         with Live(
             Spinner("dots", text="Destroying infrastructure..."), refresh_per_second=10
         ):
-            # terraform_wrapper.destroy(component)
-            terraform_wrapper.destroy(None)
+            terraform_wrapper.destroy(component)
 
         # Delete the component files
-        # if component_name:
-        #     TerraformComponentManager.cleanup_component(component)
-        #     rprint(
-        #         f"[bold green]Component '{component_name}' and its infrastructure have been successfully deleted![/bold green]"
-        #     )
-        # else:
-        # Delete all components
-        for comp_name in components:
-            comp = TerraformComponent(
-                name=comp_name, terraform_code="", workdir=WORKDIR
+        if component_name:
+            TerraformComponentManager.cleanup_component(component)
+            rprint(
+                f"[bold green]Component '{component_name}' and its infrastructure have been successfully deleted![/bold green]"
+            )
+        else:
+            # Delete all components
+            for comp_name in components:
+                comp = TerraformComponent(
+                    name=comp_name, terraform_code="", workdir=WORKDIR
+                )
+                TerraformComponentManager.cleanup_component(comp)
+            rprint(
+                "[bold green]All component configurations have been deleted![/bold green]"
             )
-            TerraformComponentManager.cleanup_component(comp)
-        rprint(
-            "[bold green]All component configurations have been deleted![/bold green]"
-        )
 
     except Exception as e:
         logger.error(f"Error deleting component configuration: {str(e)}")
@@ -467,6 +614,34 @@ def delete_component(
 #     )
 
 
+@providers_app.command("mirror")
+def mirror_providers(
+    platform: Optional[List[str]] = typer.Option(
+        None,
+        "--platform",
+        "-p",
+        help="Target platform to mirror (e.g. linux_amd64), can be repeated",
+    ),
+    mirror_dir: Optional[str] = typer.Option(
+        None, "--dir", "-d", help="Directory of the mirror"
+    ),
+    verbose: bool = typer.Option(
+        False, "--verbose", "-v", help="Show detailed mirroring steps"
+    ),
+):
+    """Download providers into a local mirror used by every project."""
+    with console.status("[bold green]Mirroring providers...") as status:
+        try:
+            cli_config = build_provider_mirror(
+                mirror_dir=mirror_dir, platforms=platform, verbose=verbose
+            )
+        except Exception as e:
+            status.stop()
+            rprint(f"[bold red]Failed to mirror providers: {str(e)}[/bold red]")
+            raise typer.Exit(code=1)
+    rprint(f"[bold green]Providers mirrored, CLI config written to {cli_config}")
+
+
 @app.command("version")
 def version():
     """Display the version of InfraBot."""
@@ -1,12 +1,33 @@
 """Module for managing Terraform component files."""
 
 import os
+import json
+import shutil
 import logging
 from dataclasses import dataclass
 from typing import Optional
 
 logger = logging.getLogger(__name__)
 
+# Marker file of projects where each component is its own root module
+LAYOUT_FILE = ".infrabot-layout"
+ISOLATED_LAYOUT = "isolated"
+
+# Directory, relative to the working directory, holding isolated components
+COMPONENTS_DIR = "components"
+
+# Project files linked into the root module of each isolated component
+SHARED_FILES = ["provider.tf", "provider_local.tf", "backend.tf"]
+
+
+def is_isolated_layout(workdir: str) -> bool:
+    """Check whether each component of the project has its own root module and state."""
+    layout_file = os.path.join(workdir, LAYOUT_FILE)
+    if not os.path.exists(layout_file):
+        return False
+    with open(layout_file, "r") as f:
+        return f.read().strip() == ISOLATED_LAYOUT
+
 
 @dataclass
 class TerraformComponent:
@@ -16,6 +37,12 @@ class TerraformComponent:
     terraform_code: str
     tfvars_code: Optional[str] = None
     workdir: str = ".infrabot/default"
+    # Whether the component is its own root module, detected from the project
+    isolated: Optional[bool] = None
+
+    def __post_init__(self):
+        if self.isolated is None:
+            self.isolated = is_isolated_layout(self.workdir)
 
     @classmethod
     def from_workdir(
@@ -33,29 +60,29 @@ class TerraformComponent:
         Raises:
             FileNotFoundError: If the component's .tf file doesn't exist
         """
-        tf_file_path = os.path.join(workdir, f"{component_name}.tf")
-        tfvars_file_path = os.path.join(workdir, f"{component_name}.auto.tfvars")
+        component = cls(name=component_name, terraform_code="", workdir=workdir)
 
         # Read terraform code (required)
-        with open(tf_file_path, "r") as f:
-            terraform_code = f.read()
+        with open(component.tf_file_path, "r") as f:
+            component.terraform_code = f.read()
 
         # Read tfvars code (optional)
-        tfvars_code = None
-        if os.path.exists(tfvars_file_path):
-            with open(tfvars_file_path, "r") as f:
-                tfvars_code = f.read()
-
-        return cls(
-            name=component_name,
-            terraform_code=terraform_code,
-            tfvars_code=tfvars_code,
-            workdir=workdir,
-        )
+        if os.path.exists(component.tfvars_file_path):
+            with open(component.tfvars_file_path, "r") as f:
+                component.tfvars_code = f.read()
+
+        return component
+
+    @property
+    def module_dir(self) -> str:
+        """Directory terraform runs in for this component."""
+        if self.isolated:
+            return os.path.join(self.workdir, COMPONENTS_DIR, self.name)
+        return self.workdir
 
     @property
     def tf_file_path(self) -> str:
-        return os.path.join(self.workdir, self.tf_file_name)
+        return os.path.join(self.module_dir, self.tf_file_name)
 
     @property
     def tf_file_name(self) -> str:
@@ -67,7 +94,7 @@ class TerraformComponent:
 
     @property
     def tfvars_file_path(self) -> str:
-        return os.path.join(self.workdir, self.tfvars_file_name)
+        return os.path.join(self.module_dir, self.tfvars_file_name)
 
 
 class TerraformComponentManager:
@@ -97,6 +124,9 @@ class TerraformComponentManager:
             return False
 
         try:
+            if component.isolated:
+                TerraformComponentManager._prepare_module_dir(component)
+
             # Save terraform file
             with open(component.tf_file_path, "w") as f:
                 f.write(component.terraform_code)
@@ -114,7 +144,11 @@ class TerraformComponentManager:
 
     @staticmethod
     def cleanup_component(component: TerraformComponent) -> None:
-        """Remove component files."""
+        """Remove component files.
+
+        The root module of an isolated component is removed as well, unless its
+        state still tracks resources.
+        """
         for file_path in [component.tf_file_path, component.tfvars_file_path]:
             if os.path.exists(file_path):
                 try:
@@ -123,12 +157,57 @@ class TerraformComponentManager:
                 except Exception as e:
                     logger.error(f"Error removing file {file_path}: {str(e)}")
 
+        if not component.isolated or not os.path.isdir(component.module_dir):
+            return
+        if TerraformComponentManager.has_resources(component):
+            logger.warning(
+                f"Keeping {component.module_dir}: its state still tracks resources"
+            )
+            return
+        shutil.rmtree(component.module_dir, ignore_errors=True)
+        logger.debug(f"Removed module directory: {component.module_dir}")
+
+    @staticmethod
+    def has_resources(component: TerraformComponent) -> bool:
+        """Check if the state of an isolated component still tracks resources."""
+        state_path = os.path.join(component.module_dir, "terraform.tfstate")
+        if not os.path.exists(state_path):
+            return False
+        try:
+            with open(state_path, "r") as f:
+                return bool(json.load(f).get("resources"))
+        except (OSError, ValueError):
+            # Unreadable state: assume it tracks resources rather than losing it
+            return True
+
+    @staticmethod
+    def set_isolated_layout(workdir: str) -> None:
+        """Make each component of the project its own root module with its own state."""
+        if is_isolated_layout(workdir):
+            return
+        if TerraformComponentManager.list_components(workdir):
+            raise Exception(
+                "Error: cannot isolate components of a project that already has some"
+            )
+        with open(os.path.join(workdir, LAYOUT_FILE), "w") as f:
+            f.write(ISOLATED_LAYOUT)
+
     @staticmethod
     def list_components(workdir: str = ".infrabot/default") -> list[str]:
         """List all components in the project."""
         if not TerraformComponentManager.ensure_project_initialized(workdir):
             return []
 
+        if is_isolated_layout(workdir):
+            components_dir = os.path.join(workdir, COMPONENTS_DIR)
+            if not os.path.isdir(components_dir):
+                return []
+            return [
+                name
+                for name in os.listdir(components_dir)
+                if os.path.exists(os.path.join(components_dir, name, f"{name}.tf"))
+            ]
+
         return [
             file[:-3]
             for file in os.listdir(workdir)
@@ -136,3 +215,13 @@ class TerraformComponentManager:
             and not file.endswith("backend.tf")
             and not file.endswith("provider.tf")
         ]
+
+    @staticmethod
+    def _prepare_module_dir(component: TerraformComponent) -> None:
+        """Create the root module of an isolated component, sharing project files."""
+        os.makedirs(component.module_dir, exist_ok=True)
+        for file_name in SHARED_FILES:
+            source = os.path.join(component.workdir, file_name)
+            link = os.path.join(component.module_dir, file_name)
+            if os.path.exists(source) and not os.path.lexists(link):
+                os.symlink(os.path.relpath(source, component.module_dir), link)
@@ -0,0 +1,376 @@
+"""Lightweight index of the blocks of Terraform configurations.
+
+Only the structure needed to address and check resources is parsed: block
+types, labels, attribute names and spans. Expressions are not evaluated;
+strings, interpolations, heredocs and comments are skipped so that braces
+inside them do not confuse the block boundaries.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .component_manager import TerraformComponent, TerraformComponentManager
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+HEREDOC = re.compile(r"<<-?([A-Za-z_][A-Za-z0-9_]*)[ \t]*\r?\n")
+
+# Parsed blocks of the most recently used component files, keyed by path,
+# with the mtime and size of the file they were parsed from
+FILE_CACHE_SIZE = 256
+_file_cache: "OrderedDict[str, Tuple[float, int, List[HclBlock]]]" = OrderedDict()
+_file_cache_lock = threading.Lock()
+
+
+@dataclass
+class HclAttribute:
+    """An attribute assignment (`name = expression`) in a block body."""
+
+    name: str
+    start: int
+    end: int
+
+
+@dataclass
+class HclBlock:
+    """A block of a Terraform configuration."""
+
+    type: str
+    labels: List[str]
+    start: int
+    end: int
+    text: str
+    # Position of the opening brace of the body
+    body_start: int = 0
+
+    @property
+    def address(self) -> Optional[str]:
+        """Address of the block usable with -target, if it can be targeted."""
+        if self.type == "resource" and len(self.labels) == 2:
+            return f"{self.labels[0]}.{self.labels[1]}"
+        if self.type == "module" and len(self.labels) == 1:
+            return f"module.{self.labels[0]}"
+        return None
+
+    @property
+    def key(self) -> str:
+        """Unique key of the block in a configuration, e.g. resource.aws_s3_bucket.b"""
+        return ".".join([self.type] + self.labels)
+
+
+def parse_blocks(code: str) -> List[HclBlock]:
+    """Parse the top-level blocks of a Terraform configuration.
+
+    Args:
+        code: HCL source code
+
+    Returns:
+        list: The top-level blocks in order of appearance
+    """
+    return _parse_body(code, 0, len(code))[1]
+
+
+def parse_body(code: str, block: HclBlock) -> Tuple[List[HclAttribute], List[HclBlock]]:
+    """Parse the attributes and nested blocks of a block.
+
+    Args:
+        code: HCL source code the block was parsed from
+        block: A block of `code`
+
+    Returns:
+        tuple: The attributes and the nested blocks of the body, with positions
+            in `code`
+    """
+    return _parse_body(code, block.body_start + 1, block.end - 1)
+
+
+def line_number(code: str, pos: int) -> int:
+    """Get the 1-based line number of a position in `code`."""
+    return code.count("\n", 0, pos) + 1
+
+
+def replace_blocks(code: str, patch: str, remove: Iterable[str] = ()) -> str:
+    """Apply a patch made of top-level blocks to a configuration.
+
+    Blocks of the patch replace the blocks of `code` with the same key, and are
+    appended if there is none. The rest of `code` is left untouched.
+
+    Args:
+        code: HCL source code to patch
+        patch: Complete top-level blocks to replace or add
+        remove: Keys of the blocks to remove, e.g. resource.aws_s3_bucket.logs
+
+    Returns:
+        str: The patched code
+
+    Raises:
+        ValueError: If the patch is not made of complete blocks, removes a
+            block that does not exist, or touches a key shared by several
+            blocks, e.g. of two locals blocks
+    """
+    patch_blocks = parse_blocks(patch)
+    if not patch_blocks and not remove:
+        raise ValueError("The patch contains no blocks")
+    for block in patch_blocks:
+        if not block.text.endswith("}"):
+            raise ValueError(f"Incomplete block in the patch: {block.key}")
+
+    patch_keys = [block.key for block in patch_blocks]
+    for key in patch_keys:
+        if patch_keys.count(key) > 1:
+            raise ValueError(f"Several blocks in the patch have the key: {key}")
+
+    blocks = {}
+    duplicates = set()
+    for block in parse_blocks(code):
+        if block.key in blocks:
+            duplicates.add(block.key)
+        blocks[block.key] = block
+    # Blocks sharing a key cannot be told apart to be replaced
+    for key in duplicates.intersection([*patch_keys, *remove]):
+        raise ValueError(f"Several blocks have the key: {key}")
+    replacements = {}
+    for key in remove:
+        if key not in blocks:
+            raise ValueError(f"Cannot remove missing block: {key}")
+        replacements[key] = ""
+    appended = []
+    for block in patch_blocks:
+        if block.key in blocks:
+            replacements[block.key] = block.text
+        else:
+            appended.append(block.text)
+
+    # Replace from the end so that earlier positions stay valid
+    for key in sorted(replacements, key=lambda k: blocks[k].start, reverse=True):
+        block = blocks[key]
+        end = block.end
+        if not replacements[key]:
+            # Drop the blank lines following a removed block as well
+            while end < len(code) and code[end].isspace():
+                end += 1
+        code = code[: block.start] + replacements[key] + code[end:]
+    if appended:
+        code = code.rstrip("\n") + "\n\n" + "\n\n".join(appended) + "\n"
+    return code
+
+
+def resource_addresses(code: str) -> List[str]:
+    """Get the addresses of the resources and modules declared in `code`."""
+    return [block.address for block in parse_blocks(code) if block.address]
+
+
+def component_addresses(component: TerraformComponent) -> List[str]:
+    """Get the resource and module addresses of a component.
+
+    The code of the component is used if set, otherwise its saved .tf file.
+    """
+    if component.terraform_code:
+        return resource_addresses(component.terraform_code)
+    return [
+        block.address for block in _parse_file(component.tf_file_path) if block.address
+    ]
+
+
+def index_components(workdir: str) -> Dict[str, List[str]]:
+    """Map each component of a project to its resource and module addresses."""
+    return {
+        name: component_addresses(
+            TerraformComponent(name=name, terraform_code="", workdir=workdir)
+        )
+        for name in TerraformComponentManager.list_components(workdir)
+    }
+
+
+def _parse_body(
+    code: str, pos: int, end: int
+) -> Tuple[List[HclAttribute], List[HclBlock]]:
+    """Parse the attributes and blocks between `pos` and `end`."""
+    attributes = []
+    blocks = []
+    while pos < end:
+        pos = _skip_trivia(code, pos)
+        if pos >= end:
+            break
+        match = IDENTIFIER.match(code, pos)
+        if not match:
+            # Not a block nor an attribute: skip the rest of the line
+            pos = _skip_line(code, pos)
+            continue
+
+        start = pos
+        name = match.group(0)
+        pos = _skip_inline_space(code, match.end())
+        if pos < end and code[pos] == "=" and not code.startswith("==", pos):
+            pos = _skip_expression(code, pos + 1, end)
+            attributes.append(HclAttribute(name, start, pos))
+            continue
+
+        labels = []
+        while True:
+            pos = _skip_inline_space(code, pos)
+            if pos < end and code[pos] == '"':
+                label_end = _skip_string(code, pos)
+                labels.append(code[pos + 1 : label_end - 1])
+                pos = label_end
+                continue
+            label = IDENTIFIER.match(code, pos)
+            if label:
+                labels.append(label.group(0))
+                pos = label.end()
+                continue
+            break
+
+        if pos < end and code[pos] == "{":
+            block_end = _skip_braces(code, pos)
+            blocks.append(
+                HclBlock(name, labels, start, block_end, code[start:block_end], pos)
+            )
+            pos = block_end
+        else:
+            pos = _skip_line(code, pos)
+    return attributes, blocks
+
+
+def _parse_file(path: str) -> List[HclBlock]:
+    """Parse the blocks of a file, reusing them until the file changes."""
+    if not os.path.exists(path):
+        return []
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    with _file_cache_lock:
+        cached = _file_cache.get(key)
+        if cached is not None and cached[:2] == (stat.st_mtime, stat.st_size):
+            _file_cache.move_to_end(key)
+            return cached[2]
+
+    with open(path, "r") as f:
+        blocks = parse_blocks(f.read())
+    with _file_cache_lock:
+        # Replaces the blocks parsed from an older version of the file
+        _file_cache[key] = (stat.st_mtime, stat.st_size, blocks)
+        _file_cache.move_to_end(key)
+        while len(_file_cache) > FILE_CACHE_SIZE:
+            _file_cache.popitem(last=False)
+    return blocks
+
+
+def _skip_trivia(code: str, pos: int) -> int:
+    """Skip whitespace and comments."""
+    length = len(code)
+    while pos < length:
+        char = code[pos]
+        if char.isspace():
+            pos += 1
+        elif char == "#" or code.startswith("//", pos):
+            pos = _skip_line(code, pos)
+        elif code.startswith("/*", pos):
+            end = code.find("*/", pos + 2)
+            pos = length if end == -1 else end + 2
+        else:
+            break
+    return pos
+
+
+def _skip_inline_space(code: str, pos: int) -> int:
+    while pos < len(code) and code[pos] in " \t":
+        pos += 1
+    return pos
+
+
+def _skip_line(code: str, pos: int) -> int:
+    end = code.find("\n", pos)
+    return len(code) if end == -1 else end + 1
+
+
+def _skip_expression(code: str, pos: int, end: int) -> int:
+    """Skip an expression up to the end of its line, which brackets may extend."""
+    depth = 0
+    while pos < end:
+        char = code[pos]
+        if char in "([{":
+            depth += 1
+            pos += 1
+        elif char in ")]}":
+            if depth == 0:
+                # Closing brace of a single-line block
+                return pos
+            depth -= 1
+            pos += 1
+        elif char == "\n" and depth == 0:
+            return pos + 1
+        elif char == '"':
+            pos = _skip_string(code, pos)
+        elif char == "#" or code.startswith("//", pos):
+            pos = _skip_line(code, pos)
+            if depth == 0:
+                return pos
+        elif code.startswith("/*", pos):
+            comment_end = code.find("*/", pos + 2)
+            pos = end if comment_end == -1 else comment_end + 2
+        elif code.startswith("<<", pos) and HEREDOC.match(code, pos):
+            pos = _skip_heredoc(code, HEREDOC.match(code, pos))
+        else:
+            pos += 1
+    return min(pos, end)
+
+
+def _skip_string(code: str, pos: int) -> int:
+    """Skip a quoted string starting at `pos`, including interpolations."""
+    pos += 1
+    length = len(code)
+    while pos < length:
+        char = code[pos]
+        if char == "\\":
+            pos += 2
+        elif char == '"':
+            return pos + 1
+        elif code.startswith(("${", "%{"), pos) and not code.startswith(
+            ("$${", "%%{"), pos - 1
+        ):
+            pos = _skip_braces(code, pos + 1)
+        elif char == "\n":
+            # Unterminated string
+            return pos
+        else:
+            pos += 1
+    return pos
+
+
+def _skip_heredoc(code: str, match: "re.Match") -> int:
+    """Skip a heredoc whose opening marker was matched by HEREDOC."""
+    marker = match.group(1)
+    closing = re.compile(rf"^[ \t]*{re.escape(marker)}[ \t]*$", re.MULTILINE)
+    end = closing.search(code, match.end())
+    return len(code) if end is None else end.end()
+
+
+def _skip_braces(code: str, pos: int) -> int:
+    """Skip a brace-delimited body starting at the `{` at `pos`."""
+    depth = 0
+    length = len(code)
+    while pos < length:
+        char = code[pos]
+        if char == "{":
+            depth += 1
+            pos += 1
+        elif char == "}":
+            depth -= 1
+            pos += 1
+            if depth == 0:
+                return pos
+        elif char == '"':
+            pos = _skip_string(code, pos)
+        elif char == "#" or code.startswith("//", pos):
+            pos = _skip_line(code, pos)
+        elif code.startswith("/*", pos):
+            end = code.find("*/", pos + 2)
+            pos = length if end == -1 else end + 2
+        elif code.startswith("<<", pos) and HEREDOC.match(code, pos):
+            pos = _skip_heredoc(code, HEREDOC.match(code, pos))
+        else:
+            pos += 1
+    return pos
@@ -0,0 +1,254 @@
+"""Asynchronous subprocess runner with live output, deadlines and cancellation.
+
+Both pipes are read line by line as the process writes them, so output can be
+shown or parsed while a long terraform operation is still running. Commands
+run in their own process group: on timeout or cancellation the whole group
+(terraform and its provider plugins) is interrupted, then killed if it does not
+exit within a grace period.
+"""
+
+import asyncio
+import codecs
+import logging
+import os
+import shlex
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+logger = logging.getLogger("infrabot.process")
+
+# Callback receiving each line of output, without its trailing newline
+LineCallback = Callable[[str], None]
+
+# Seconds a process gets to exit after being interrupted, before it is killed
+KILL_GRACE_PERIOD = 10.0
+
+# How often the cancellation event is checked (seconds)
+CANCEL_POLL_INTERVAL = 0.1
+
+READ_CHUNK_SIZE = 64 * 1024
+
+T = TypeVar("T")
+
+
+class ProcessCancelledError(Exception):
+    """Raised when a command is cancelled before it completes."""
+
+
+@dataclass
+class ProcessResult:
+    """Outcome of a command run by run_process."""
+
+    command: str
+    returncode: Optional[int]
+    stdout: str
+    stderr: str
+    started_at: float
+    duration: float
+    timed_out: bool = False
+    cancelled: bool = False
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0 and not self.timed_out and not self.cancelled
+
+
+async def run_process(
+    command: str,
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    on_stdout: Optional[LineCallback] = None,
+    on_stderr: Optional[LineCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> ProcessResult:
+    """Run a command, streaming its output lines to callbacks.
+
+    Args:
+        command: Command line to run, split with shell-like syntax
+        cwd: Working directory of the command
+        env: Environment of the command, defaults to the current one
+        timeout: Deadline in seconds, after which the command is stopped
+        on_stdout: Called with each line written to stdout
+        on_stderr: Called with each line written to stderr
+        cancel_event: Event stopping the command once set, e.g. from another thread
+
+    Returns:
+        ProcessResult: Exit status, captured output and timing of the command
+    """
+    started_at = time.time()
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *shlex.split(command),
+        cwd=cwd,
+        env=env,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        start_new_session=True,
+    )
+    stdout: List[str] = []
+    stderr: List[str] = []
+    readers = asyncio.gather(
+        _read_lines(process.stdout, stdout, on_stdout),
+        _read_lines(process.stderr, stderr, on_stderr),
+    )
+    waiter = asyncio.ensure_future(process.wait())
+    watchers = [waiter]
+    if cancel_event is not None:
+        watchers.append(asyncio.ensure_future(_wait_for_event(cancel_event)))
+
+    timed_out = cancelled = False
+    try:
+        await asyncio.wait(
+            watchers, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not waiter.done():
+            cancelled = cancel_event is not None and cancel_event.is_set()
+            timed_out = not cancelled
+            logger.warning(
+                f"Stopping command after {time.monotonic() - start:.1f}s "
+                f"({'cancelled' if cancelled else 'timed out'}): {command}"
+            )
+            await _stop(process, waiter)
+    except BaseException:
+        # The caller itself was cancelled: never leave the process behind
+        if not waiter.done():
+            await asyncio.shield(_stop(process, waiter))
+        readers.cancel()
+        raise
+    finally:
+        for watcher in watchers[1:]:
+            watcher.cancel()
+
+    await readers
+    return ProcessResult(
+        command=command,
+        returncode=process.returncode,
+        stdout="".join(stdout),
+        stderr="".join(stderr),
+        started_at=started_at,
+        duration=time.monotonic() - start,
+        timed_out=timed_out,
+        cancelled=cancelled,
+    )
+
+
+def run_sync(coroutine: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine to completion from synchronous code.
+
+    asyncio.run cannot be called from a thread already running an event loop,
+    such as an async API endpoint calling a blocking helper. The coroutine then
+    runs on its own loop in a worker thread, while the caller waits for it.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="infrabot-process"
+    ) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+async def stream_process(
+    command: str,
+    cwd: Optional[str] = None,
+    env: Optional[Dict[str, str]] = None,
+    timeout: Optional[float] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> AsyncIterator[Tuple[str, str]]:
+    """Run a command and iterate over its output lines as they are written.
+
+    Yields:
+        tuple: The stream name ("stdout" or "stderr") and the line. Once the
+            command completes, ("exit", str(returncode)) is yielded last.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(
+        run_process(
+            command,
+            cwd=cwd,
+            env=env,
+            timeout=timeout,
+            on_stdout=lambda line: queue.put_nowait(("stdout", line)),
+            on_stderr=lambda line: queue.put_nowait(("stderr", line)),
+            cancel_event=cancel_event,
+        )
+    )
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+        result = task.result()
+        yield "exit", str(result.returncode)
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _read_lines(
+    stream: asyncio.StreamReader, lines: List[str], callback: Optional[LineCallback]
+) -> None:
+    # Lines are split by hand: StreamReader.readline fails on lines longer than
+    # its buffer, such as the single-line output of `terraform show -json`
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        chunk = await stream.read(READ_CHUNK_SIZE)
+        pending += decoder.decode(chunk, final=not chunk)
+        *complete, pending = pending.split("\n")
+        complete = [line + "\n" for line in complete]
+        if not chunk and pending:
+            # Last line, without a trailing newline
+            complete.append(pending)
+        for line in complete:
+            lines.append(line)
+            if callback:
+                try:
+                    callback(line.rstrip("\r\n"))
+                except Exception as e:
+                    logger.error(f"Error in output callback: {str(e)}")
+        if not chunk:
+            break
+
+
+async def _wait_for_event(event: threading.Event) -> None:
+    while not event.is_set():
+        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+
+
+async def _stop(process: asyncio.subprocess.Process, waiter: asyncio.Future) -> None:
+    """Interrupt the process group, then kill what is left of it."""
+    # Terraform handles an interrupt by stopping gracefully and saving state
+    _signal_group(process, signal.SIGINT)
+    try:
+        await asyncio.wait_for(asyncio.shield(waiter), KILL_GRACE_PERIOD)
+    except asyncio.TimeoutError:
+        pass
+    # Children ignoring the interrupt would otherwise keep the pipes open
+    _signal_group(process, signal.SIGKILL)
+    await waiter
+
+
+def _signal_group(process: asyncio.subprocess.Process, sig: int) -> None:
+    try:
+        os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
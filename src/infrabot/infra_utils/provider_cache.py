@@ -0,0 +1,140 @@
+"""Shared Terraform provider plugin cache and local filesystem mirror.
+
+Every InfraBot project needs the same providers. Instead of downloading them
+again for each project, all terraform subprocesses share a plugin cache
+directory, and a local filesystem mirror can be built once so that
+`terraform init` mostly links already-downloaded providers.
+"""
+
+import logging
+import os
+import subprocess
+import tempfile
+from typing import Dict, List, Optional
+
+from infrabot.utils.os import copy_assets, get_terraform_assets_dir
+
+logger = logging.getLogger("infrabot.provider_cache")
+
+INFRABOT_HOME = os.path.join(os.path.expanduser("~"), ".infrabot")
+
+# Terraform CLI configuration pointing provider installation to the mirror
+CLI_CONFIG_TEMPLATE = """provider_installation {{
+  filesystem_mirror {{
+    path = "{mirror_dir}"
+  }}
+  direct {{}}
+}}
+"""
+
+
+def get_plugin_cache_dir() -> Optional[str]:
+    """Get the shared plugin cache directory, or None if caching is disabled.
+
+    Defaults to ~/.infrabot/plugin-cache, overridden by the
+    INFRABOT_PLUGIN_CACHE_DIR environment variable (empty to disable).
+    """
+    cache_dir = os.getenv("INFRABOT_PLUGIN_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(INFRABOT_HOME, "plugin-cache")
+    return cache_dir or None
+
+
+def get_provider_mirror_dir() -> str:
+    """Get the local provider mirror directory.
+
+    Defaults to ~/.infrabot/provider-mirror, overridden by the
+    INFRABOT_PROVIDER_MIRROR_DIR environment variable.
+    """
+    return os.getenv("INFRABOT_PROVIDER_MIRROR_DIR") or os.path.join(
+        INFRABOT_HOME, "provider-mirror"
+    )
+
+
+def get_cli_config_path() -> str:
+    """Get the path of the Terraform CLI configuration written for the mirror."""
+    return _cli_config_path(get_provider_mirror_dir())
+
+
+def terraform_env() -> Dict[str, str]:
+    """Build the environment of terraform subprocesses.
+
+    Enables the shared plugin cache and, once a mirror was built, the mirror CLI
+    configuration. Values explicitly set in the environment take precedence.
+    """
+    env = dict(os.environ)
+
+    cache_dir = get_plugin_cache_dir()
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        env.setdefault("TF_PLUGIN_CACHE_DIR", os.path.abspath(cache_dir))
+        # New projects have no lock file yet: without this, terraform >= 1.4
+        # downloads providers again instead of using the cache
+        env.setdefault("TF_PLUGIN_CACHE_MAY_BREAK_DEPENDENCY_LOCK_FILE", "true")
+
+    cli_config = get_cli_config_path()
+    if os.path.exists(cli_config):
+        env.setdefault("TF_CLI_CONFIG_FILE", os.path.abspath(cli_config))
+
+    return env
+
+
+def build_provider_mirror(
+    mirror_dir: Optional[str] = None,
+    platforms: Optional[List[str]] = None,
+    verbose: bool = False,
+) -> str:
+    """Download the providers of InfraBot projects into a local filesystem mirror.
+
+    Both provider configurations (cloud and localstack) are mirrored, then a
+    Terraform CLI configuration preferring the mirror is written next to it and
+    picked up by every terraform subprocess.
+
+    Args:
+        mirror_dir: Directory of the mirror, defaults to get_provider_mirror_dir()
+        platforms: Target platforms (e.g. linux_amd64), defaults to the current one
+        verbose: Show terraform output
+
+    Returns:
+        str: Path of the written Terraform CLI configuration
+    """
+    mirror_dir = os.path.abspath(mirror_dir or get_provider_mirror_dir())
+    os.makedirs(mirror_dir, exist_ok=True)
+
+    command = ["terraform", "providers", "mirror"]
+    for platform in platforms or []:
+        command.append(f"-platform={platform}")
+    command.append(mirror_dir)
+
+    env = dict(os.environ)
+    # Mirror from the upstream registry, not from a previous mirror
+    env.pop("TF_CLI_CONFIG_FILE", None)
+
+    for provider_file in ["provider.tf", "provider_local.tf"]:
+        with tempfile.TemporaryDirectory() as config_dir:
+            copy_assets(
+                get_terraform_assets_dir(), config_dir, whitelist=[provider_file]
+            )
+            logger.debug(f"Mirroring providers of {provider_file} to {mirror_dir}")
+            process = subprocess.run(
+                command,
+                cwd=config_dir,
+                env=env,
+                stdout=None if verbose else subprocess.PIPE,
+                stderr=None if verbose else subprocess.PIPE,
+                text=True,
+            )
+            if process.returncode != 0:
+                raise Exception(f"Error: {process.stderr}")
+
+    cli_config = _cli_config_path(mirror_dir)
+    with open(cli_config, "w") as f:
+        f.write(CLI_CONFIG_TEMPLATE.format(mirror_dir=mirror_dir))
+    if mirror_dir != os.path.abspath(get_provider_mirror_dir()):
+        logger.info(f"Set INFRABOT_PROVIDER_MIRROR_DIR={mirror_dir} to use this mirror")
+    return cli_config
+
+
+def _cli_config_path(mirror_dir: str) -> str:
+    # Kept outside of the mirror, which must only contain providers
+    return f"{os.path.abspath(mirror_dir).rstrip(os.sep)}.tfrc"
@@ -0,0 +1,465 @@
+"""Index of provider schemas to check generated resource blocks in-process.
+
+`terraform providers schema -json` describes every argument and nested block
+of every resource type, but takes seconds and hundreds of megabytes for large
+providers. It is dumped once per provider version into a compact index on
+disk, which is then used to catch unknown, missing and unconfigurable
+arguments without running terraform at all.
+"""
+
+import json
+import logging
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from .hcl_index import HclBlock, line_number, parse_blocks, parse_body
+from .provider_cache import INFRABOT_HOME
+from .terraform_events import Diagnostic
+
+logger = logging.getLogger("infrabot.provider_schema")
+
+LOCK_FILE = ".terraform.lock.hcl"
+LOCK_VERSION = re.compile(r'^\s*version\s*=\s*"([^"]+)"', re.MULTILINE)
+
+# Arguments and blocks of resources and data sources handled by terraform itself
+META_ARGUMENTS = {"count", "for_each", "provider", "depends_on"}
+META_BLOCKS = {"lifecycle", "provisioner", "connection"}
+
+# Provider schemas already loaded, keyed by provider source and version
+_schemas: Dict[Tuple[str, str], "ProviderSchema"] = {}
+
+
+def get_schema_cache_dir() -> Optional[str]:
+    """Get the directory of the provider schema index, or None if disabled.
+
+    Defaults to ~/.infrabot/schemas, overridden by the
+    INFRABOT_SCHEMA_CACHE_DIR environment variable (empty to disable).
+    """
+    cache_dir = os.getenv("INFRABOT_SCHEMA_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(INFRABOT_HOME, "schemas")
+    return cache_dir or None
+
+
+def locked_providers(workdir: str) -> Dict[str, str]:
+    """Map the providers pinned in the lock file of a workdir to their version."""
+    lock_file = os.path.join(workdir, LOCK_FILE)
+    if not os.path.exists(lock_file):
+        return {}
+    with open(lock_file, "r") as f:
+        code = f.read()
+    providers = {}
+    for block in parse_blocks(code):
+        version = LOCK_VERSION.search(block.text)
+        if block.type == "provider" and len(block.labels) == 1 and version:
+            providers[block.labels[0]] = version.group(1)
+    return providers
+
+
+@dataclass
+class BlockSchema:
+    """Arguments and nested blocks accepted by a block."""
+
+    required: Set[str] = field(default_factory=set)
+    optional: Set[str] = field(default_factory=set)
+    # Attributes set by the provider only
+    computed: Set[str] = field(default_factory=set)
+    # Deprecated attributes and nested blocks
+    deprecated: Set[str] = field(default_factory=set)
+    blocks: Dict[str, "BlockSchema"] = field(default_factory=dict)
+    min_items: int = 0
+    # Maximum number of blocks of this type, 0 if unlimited
+    max_items: int = 0
+
+    @property
+    def attributes(self) -> Set[str]:
+        return self.required | self.optional | self.computed
+
+    @classmethod
+    def from_terraform(
+        cls, block: Dict[str, Any], min_items: int = 0, max_items: int = 0
+    ) -> "BlockSchema":
+        """Build the schema from a block of `terraform providers schema -json`."""
+        schema = cls(min_items=min_items, max_items=max_items)
+        for name, attribute in (block.get("attributes") or {}).items():
+            if attribute.get("required"):
+                schema.required.add(name)
+            elif attribute.get("optional"):
+                schema.optional.add(name)
+            else:
+                schema.computed.add(name)
+            if attribute.get("deprecated"):
+                schema.deprecated.add(name)
+        for name, block_type in (block.get("block_types") or {}).items():
+            nested = block_type.get("block") or {}
+            single = block_type.get("nesting_mode") in ("single", "group")
+            schema.blocks[name] = cls.from_terraform(
+                nested,
+                min_items=block_type.get("min_items", 0),
+                max_items=1 if single else block_type.get("max_items", 0),
+            )
+            if nested.get("deprecated"):
+                schema.deprecated.add(name)
+        return schema
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "BlockSchema":
+        return cls(
+            required=set(data.get("required", [])),
+            optional=set(data.get("optional", [])),
+            computed=set(data.get("computed", [])),
+            deprecated=set(data.get("deprecated", [])),
+            blocks={
+                name: cls.from_json(block)
+                for name, block in data.get("blocks", {}).items()
+            },
+            min_items=data.get("min_items", 0),
+            max_items=data.get("max_items", 0),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        """Compact representation, omitting empty fields."""
+        data: Dict[str, Any] = {
+            "required": sorted(self.required),
+            "optional": sorted(self.optional),
+            "computed": sorted(self.computed),
+            "deprecated": sorted(self.deprecated),
+            "blocks": {name: block.to_json() for name, block in self.blocks.items()},
+            "min_items": self.min_items,
+            "max_items": self.max_items,
+        }
+        return {key: value for key, value in data.items() if value}
+
+
+@dataclass
+class ProviderSchema:
+    """Resource and data source schemas of a provider version."""
+
+    source: str
+    version: str
+    resources: Dict[str, BlockSchema] = field(default_factory=dict)
+    data_sources: Dict[str, BlockSchema] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        """Local name of the provider, prefixing its resource types."""
+        return self.source.rsplit("/", 1)[-1]
+
+    @classmethod
+    def from_terraform(
+        cls, source: str, version: str, schema: Dict[str, Any]
+    ) -> "ProviderSchema":
+        def blocks(key: str) -> Dict[str, BlockSchema]:
+            return {
+                name: BlockSchema.from_terraform(resource.get("block") or {})
+                for name, resource in (schema.get(key) or {}).items()
+            }
+
+        return cls(
+            source=source,
+            version=version,
+            resources=blocks("resource_schemas"),
+            data_sources=blocks("data_source_schemas"),
+        )
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "ProviderSchema":
+        return cls(
+            source=data["source"],
+            version=data["version"],
+            resources={
+                name: BlockSchema.from_json(block)
+                for name, block in data.get("resources", {}).items()
+            },
+            data_sources={
+                name: BlockSchema.from_json(block)
+                for name, block in data.get("data_sources", {}).items()
+            },
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "version": self.version,
+            "resources": {
+                name: block.to_json() for name, block in self.resources.items()
+            },
+            "data_sources": {
+                name: block.to_json() for name, block in self.data_sources.items()
+            },
+        }
+
+
+class SchemaIndex:
+    """Check resource and data blocks against the schemas of their provider."""
+
+    def __init__(self, providers: List[ProviderSchema]):
+        self.providers = providers
+
+    def check(self, code: str, filename: Optional[str] = None) -> List[Diagnostic]:
+        """Check the resource and data blocks of a configuration.
+
+        Only blocks of providers in the index are checked, so that resources of
+        unknown providers are left to terraform.
+
+        Args:
+            code: HCL source code
+            filename: Name of the file the code is saved to, for diagnostics
+
+        Returns:
+            list: Errors and warnings, in the format terraform reports them
+        """
+        diagnostics: List[Diagnostic] = []
+        for block in parse_blocks(code):
+            if block.type not in ("resource", "data") or len(block.labels) != 2:
+                continue
+            resource_type, name = block.labels
+            schema, provider = self._lookup(block.type, resource_type)
+            checker = _BlockChecker(code, block, filename, diagnostics)
+            if schema is not None:
+                checker.check(block, schema, top_level=True)
+            elif provider is not None:
+                kind = "resource" if block.type == "resource" else "data source"
+                checker.add(
+                    "error",
+                    f"Invalid {kind} type",
+                    f"The provider {provider.source} does not support {kind} "
+                    f'type "{resource_type}".',
+                    block.start,
+                )
+        return diagnostics
+
+    def _lookup(
+        self, block_type: str, resource_type: str
+    ) -> Tuple[Optional[BlockSchema], Optional[ProviderSchema]]:
+        """Find the schema of a resource type and the provider it belongs to."""
+        prefix = resource_type.split("_", 1)[0]
+        for provider in self.providers:
+            if provider.name != prefix:
+                continue
+            schemas = (
+                provider.resources
+                if block_type == "resource"
+                else provider.data_sources
+            )
+            return schemas.get(resource_type), provider
+        return None, None
+
+
+class _BlockChecker:
+    """Check the body of a top-level block, reporting diagnostics against it."""
+
+    def __init__(
+        self,
+        code: str,
+        block: HclBlock,
+        filename: Optional[str],
+        diagnostics: List[Diagnostic],
+    ):
+        self.code = code
+        self.filename = filename
+        self.diagnostics = diagnostics
+        self.address = ".".join(block.labels)
+        if block.type == "data":
+            self.address = f"data.{self.address}"
+        self.context = " ".join([block.type] + [f'"{label}"' for label in block.labels])
+
+    def add(self, severity: str, summary: str, detail: str, pos: int) -> None:
+        line = line_number(self.code, pos)
+        self.diagnostics.append(
+            Diagnostic(
+                severity=severity,
+                summary=summary,
+                detail=detail,
+                address=self.address,
+                filename=self.filename,
+                line=line,
+                code=self.code.splitlines()[line - 1],
+                context=self.context,
+            )
+        )
+
+    def check(self, block: HclBlock, schema: BlockSchema, top_level: bool) -> None:
+        attributes, blocks = parse_body(self.code, block)
+        defined = set()
+        for attribute in attributes:
+            name = attribute.name
+            if top_level and name in META_ARGUMENTS:
+                continue
+            defined.add(name)
+            if name in schema.computed:
+                self.add(
+                    "error",
+                    "Value for unconfigurable attribute",
+                    f'Can\'t configure a value for "{name}": its value will be '
+                    "decided automatically based on the result of applying this "
+                    "configuration.",
+                    attribute.start,
+                )
+            elif name in schema.blocks:
+                self.add(
+                    "error",
+                    "Unsupported argument",
+                    f'An argument named "{name}" is not expected here. Did you '
+                    f'mean to define a block of type "{name}"?',
+                    attribute.start,
+                )
+            elif name not in schema.attributes:
+                self.add(
+                    "error",
+                    "Unsupported argument",
+                    f'An argument named "{name}" is not expected here.',
+                    attribute.start,
+                )
+            elif name in schema.deprecated:
+                self._deprecated(name, attribute.start)
+
+        counts: Counter = Counter()
+        dynamic = set()
+        for nested in blocks:
+            if top_level and nested.type in META_BLOCKS:
+                continue
+            if nested.type == "dynamic" and nested.labels:
+                block_type = nested.labels[0]
+                dynamic.add(block_type)
+                if block_type not in schema.blocks:
+                    self._unsupported_block(block_type, nested.start)
+                    continue
+                for content in parse_body(self.code, nested)[1]:
+                    if content.type == "content":
+                        self.check(content, schema.blocks[block_type], False)
+                continue
+            if nested.type in schema.blocks:
+                counts[nested.type] += 1
+                if nested.type in schema.deprecated:
+                    self._deprecated(nested.type, nested.start)
+                self.check(nested, schema.blocks[nested.type], False)
+            elif nested.type in schema.attributes:
+                # Attributes of list of objects may be written as blocks
+                defined.add(nested.type)
+            else:
+                self._unsupported_block(nested.type, nested.start)
+
+        for name in sorted(schema.required - defined):
+            self.add(
+                "error",
+                "Missing required argument",
+                f'The argument "{name}" is required, but no definition was found.',
+                block.start,
+            )
+        for name, nested_schema in sorted(schema.blocks.items()):
+            if name in dynamic:
+                continue
+            if counts[name] < nested_schema.min_items:
+                self.add(
+                    "error",
+                    f"Insufficient {name} blocks",
+                    f'At least {nested_schema.min_items} "{name}" blocks are '
+                    "required.",
+                    block.start,
+                )
+            if nested_schema.max_items and counts[name] > nested_schema.max_items:
+                self.add(
+                    "error",
+                    f"Too many {name} blocks",
+                    f'No more than {nested_schema.max_items} "{name}" blocks are '
+                    "allowed.",
+                    block.start,
+                )
+
+    def _unsupported_block(self, name: str, pos: int) -> None:
+        self.add(
+            "error",
+            "Unsupported block type",
+            f'Blocks of type "{name}" are not expected here.',
+            pos,
+        )
+
+    def _deprecated(self, name: str, pos: int) -> None:
+        self.add(
+            "warning",
+            "Deprecated argument",
+            f'The argument "{name}" is deprecated. Refer to the provider '
+            "documentation for details.",
+            pos,
+        )
+
+
+def load_schema_index(
+    workdir: str, dump_schema: Callable[[], Dict[str, Any]]
+) -> SchemaIndex:
+    """Load the schemas of the providers locked in a workdir.
+
+    Schemas are read from memory, then from the on-disk index. Missing ones
+    are dumped with `dump_schema` once and added to the index.
+
+    Args:
+        workdir: Initialized Terraform working directory
+        dump_schema: Returns the output of `terraform providers schema -json`
+            for the workdir
+
+    Returns:
+        SchemaIndex: Index of the schemas that could be loaded
+    """
+    providers = []
+    missing = {}
+    for source, version in locked_providers(workdir).items():
+        schema = _schemas.get((source, version)) or _read_schema(source, version)
+        if schema is None:
+            missing[source] = version
+            continue
+        _schemas[(source, version)] = schema
+        providers.append(schema)
+
+    if missing:
+        logger.info(f"Indexing provider schemas: {', '.join(sorted(missing))}")
+        try:
+            dump = dump_schema()
+        except Exception as e:
+            logger.warning(f"Failed to dump provider schemas: {str(e)}")
+            return SchemaIndex(providers)
+        for source, schema_json in (dump.get("provider_schemas") or {}).items():
+            if source not in missing:
+                continue
+            schema = ProviderSchema.from_terraform(source, missing[source], schema_json)
+            _schemas[(source, schema.version)] = schema
+            _write_schema(schema)
+            providers.append(schema)
+    return SchemaIndex(providers)
+
+
+def _schema_path(source: str, version: str) -> Optional[str]:
+    cache_dir = get_schema_cache_dir()
+    if not cache_dir:
+        return None
+    return os.path.join(cache_dir, *source.split("/"), f"{version}.json")
+
+
+def _read_schema(source: str, version: str) -> Optional[ProviderSchema]:
+    path = _schema_path(source, version)
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return ProviderSchema.from_json(json.load(f))
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable provider schema {path}: {str(e)}")
+        return None
+
+
+def _write_schema(schema: ProviderSchema) -> None:
+    path = _schema_path(schema.source, schema.version)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename, so that concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(schema.to_json(), f, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Failed to save provider schema {path}: {str(e)}")
@@ -1,83 +1,491 @@
-import subprocess
+import os
+import sys
 import logging
-from typing import Optional
-from .component_manager import TerraformComponent
+import shlex
+import threading
+import uuid
+from typing import Callable, List, Optional
+from .component_manager import (
+    TerraformComponent,
+    TerraformComponentManager,
+    is_isolated_layout,
+)
+from .hcl_index import component_addresses
+from .process import (
+    LineCallback,
+    ProcessCancelledError,
+    ProcessResult,
+    run_process,
+    run_sync,
+)
+from .terraform_events import (
+    Diagnostic,
+    TerraformError,
+    TerraformEvent,
+    TerraformEventLog,
+)
+from .provider_cache import terraform_env
+from .provider_schema import load_schema_index
 import json
+import shutil
 
 logger = logging.getLogger("infrabot.terraform")
 
+# Directory, relative to the working directory, holding saved plan files
+PLANS_DIR = ".infrabot-plans"
+
+
+def get_terraform_timeout() -> Optional[float]:
+    """Get the deadline of terraform commands in seconds, None if disabled.
+
+    Defaults to one hour, overridden by the INFRABOT_TERRAFORM_TIMEOUT
+    environment variable (0 to disable).
+    """
+    timeout = float(os.getenv("INFRABOT_TERRAFORM_TIMEOUT", "3600"))
+    return timeout if timeout > 0 else None
+
+
+def validation_enabled() -> bool:
+    """Check whether generated code is validated locally before it is planned.
+
+    Enabled by default, disabled with TERRAFORM_VALIDATE=false.
+    """
+    return os.getenv("TERRAFORM_VALIDATE", "true").lower() == "true"
+
+
+def _join(arguments: List[str]) -> str:
+    """Join arguments into a command line, quoting paths and addresses."""
+    return " ".join(shlex.quote(argument) for argument in arguments)
+
 
 class TerraformWrapper:
-    def __init__(self, working_directory):
+    def __init__(
+        self, working_directory, cancel_event: Optional[threading.Event] = None
+    ):
         self.working_directory = working_directory
         self.main_tf_file_path = f"{working_directory}/main.tf"
+        # Once set, running and future commands are stopped
+        self.cancel_event = cancel_event
+
+    def execute(
+        self,
+        command: str,
+        verbose: bool = False,
+        cwd: Optional[str] = None,
+        on_output: Optional[LineCallback] = None,
+    ) -> ProcessResult:
+        """Run a command, streaming its output, and return its exit status and timing.
+
+        The command is stopped after INFRABOT_TERRAFORM_TIMEOUT seconds, or once
+        the cancel event of the wrapper is set. It can also be run from a thread
+        running an event loop, in which case the loop is blocked until it exits.
+
+        Args:
+            command: Command to run
+            verbose: Print the output of the command as it is written
+            cwd: Directory to run the command in, defaults to the working directory
+            on_output: Called with each line of stdout as it is written
 
-    def run_command(self, command, verbose=False):
-        """Run a command in the subprocess and return the output and error message."""
+        Returns:
+            ProcessResult: Exit status, output and timing of the command
+        """
+        cwd = cwd or self.working_directory
+        logger.debug(f"Running terraform command: {command} in directory: {cwd}")
+
+        def on_stdout(line: str) -> None:
+            if verbose:
+                print(line)
+            if on_output:
+                on_output(line)
+
+        def on_stderr(line: str) -> None:
+            if verbose:
+                print(line, file=sys.stderr)
+
+        result = run_sync(
+            run_process(
+                command,
+                cwd=cwd,
+                env=terraform_env(),
+                timeout=get_terraform_timeout(),
+                on_stdout=on_stdout,
+                on_stderr=on_stderr,
+                cancel_event=self.cancel_event,
+            )
+        )
         logger.debug(
-            f"Running terraform command: {command} in directory: {self.working_directory}"
+            f"Terraform command exited with {result.returncode} "
+            f"in {result.duration:.2f}s: {command}"
         )
-        if verbose:
-            pipe = None
-        else:
-            pipe = subprocess.PIPE
-        process = subprocess.Popen(
-            command,
-            cwd=self.working_directory,
-            stdout=pipe,
-            stderr=pipe,
-            shell=True,
-            text=True,
+        return result
+
+    def run_command(self, command, verbose=False, cwd=None, on_output=None):
+        """Run a command in the subprocess and return the output and error message.
+
+        Commands run in the working directory, or in `cwd` if given.
+        """
+        result = self.execute(command, verbose=verbose, cwd=cwd, on_output=on_output)
+        self._check_stopped(result)
+        if result.returncode != 0:
+            logger.error(f"Terraform command failed: {result.stderr}")
+            raise Exception(f"Error: {result.stderr}")
+        logger.debug(
+            f"Terraform command completed successfully. Output: {result.stdout}"
         )
-        stdout, stderr = process.communicate()
-        if process.returncode != 0:
-            logger.error(f"Terraform command failed: {stderr}")
-            raise Exception(f"Error: {stderr}")
-        logger.debug(f"Terraform command completed successfully. Output: {stdout}")
-        return stdout
-
-    def init(self, verbose=False):
-        """Initialize a Terraform working directory."""
+        return result.stdout
+
+    def run_json(
+        self,
+        command: str,
+        verbose: bool = False,
+        cwd: Optional[str] = None,
+        on_event: Optional[Callable[[TerraformEvent], None]] = None,
+    ) -> TerraformEventLog:
+        """Run a command in machine-readable mode and parse its events as they come.
+
+        The -json flag is added right after the subcommand: terraform stops
+        parsing flags at the first positional argument, such as a saved plan.
+
+        Args:
+            command: Terraform command supporting -json (plan, apply, destroy)
+            verbose: Print the message of each event
+            cwd: Directory to run the command in, defaults to the working directory
+            on_event: Called with each event as soon as terraform reports it
+
+        Returns:
+            TerraformEventLog: The events, diagnostics and change summary
+
+        Raises:
+            TerraformError: If the command fails, with the diagnostics it reported
+        """
+        log = TerraformEventLog()
+
+        def on_output(line: str) -> None:
+            event = log.feed(line)
+            if event is None:
+                return
+            if verbose and event.message:
+                print(event.message)
+            if on_event:
+                on_event(event)
+
+        program, subcommand, *arguments = command.split(" ", 2)
+        result = self.execute(
+            " ".join([program, subcommand, "-json", *arguments]),
+            cwd=cwd,
+            on_output=on_output,
+        )
+        self._check_stopped(result)
+        if result.returncode != 0:
+            error = TerraformError(log.errors, stderr=result.stderr)
+            logger.error(f"Terraform command failed: {str(error)}")
+            raise error
+        return log
+
+    def _check_stopped(self, result: ProcessResult) -> None:
+        """Raise if a command was cancelled or timed out."""
+        if result.cancelled:
+            raise ProcessCancelledError(
+                f"Error: terraform command cancelled: {result.command}"
+            )
+        if result.timed_out:
+            logger.error(f"Terraform command timed out: {result.command}")
+            raise Exception(
+                f"Error: terraform command timed out after {result.duration:.0f}s: "
+                f"{result.command}\n{result.stderr}"
+            )
+
+    def init(self, verbose=False, component: Optional[TerraformComponent] = None):
+        """Initialize a Terraform working directory.
+
+        Args:
+            verbose: Show terraform output.
+            component: Optional isolated TerraformComponent whose root module to
+                initialize, pinned to the provider versions of the project.
+        """
+        if component and component.isolated:
+            lock_file = os.path.join(self.working_directory, ".terraform.lock.hcl")
+            module_lock_file = os.path.join(component.module_dir, ".terraform.lock.hcl")
+            if os.path.exists(lock_file) and not os.path.exists(module_lock_file):
+                shutil.copy(lock_file, module_lock_file)
+            return self.run_command(
+                "terraform init -input=false",
+                verbose=verbose,
+                cwd=component.module_dir,
+            )
         return self.run_command("terraform init", verbose=verbose)
 
-    def plan(self, component: Optional[TerraformComponent] = None):
+    def _cwd(self, component: Optional[TerraformComponent] = None) -> str:
+        """Directory to run terraform in for `component`."""
+        if component and component.isolated:
+            return component.module_dir
+        return self.working_directory
+
+    def _targets(self, component: Optional[TerraformComponent] = None) -> List[str]:
+        """Resource and module addresses restricting an operation to `component`.
+
+        Isolated components are their own root module and need no targets.
+        """
+        if not component or component.isolated:
+            return []
+        return component_addresses(component)
+
+    def _target_flags(self, component: Optional[TerraformComponent] = None) -> str:
+        return "".join(
+            f" -target={shlex.quote(address)}" for address in self._targets(component)
+        )
+
+    def providers_schema(self) -> dict:
+        """Get the schemas of the providers of the project.
+
+        Returns:
+            dict: The output of `terraform providers schema -json`
+        """
+        return json.loads(self.run_command("terraform providers schema -json"))
+
+    def check_schema(self, component: TerraformComponent) -> List[Diagnostic]:
+        """Check the resource blocks of a component against the provider schemas.
+
+        The check runs in-process against the schema index of the providers of
+        the project, which is only built the first time a provider version is
+        used.
+
+        Args:
+            component: TerraformComponent whose code to check.
+
+        Returns:
+            list: The warnings found, e.g. deprecated arguments
+
+        Raises:
+            TerraformError: If blocks use unknown or unconfigurable arguments
+        """
+        index = load_schema_index(self.working_directory, self.providers_schema)
+        diagnostics = index.check(
+            component.terraform_code, filename=component.tf_file_name
+        )
+        errors = [d for d in diagnostics if d.severity == "error"]
+        if errors:
+            error = TerraformError(errors)
+            logger.error(f"Terraform schema check failed: {str(error)}")
+            raise error
+        for warning in diagnostics:
+            logger.warning(warning.render())
+        return diagnostics
+
+    def fmt(self, component: TerraformComponent) -> bool:
+        """Check the formatting of a component's files, formatting them if needed.
+
+        `terraform fmt` parses the files without loading providers, so syntax
+        errors are reported in milliseconds.
+
+        Args:
+            component: TerraformComponent whose saved files to check.
+
+        Returns:
+            bool: Whether the files were reformatted
+
+        Raises:
+            Exception: If the files cannot be parsed
+        """
+        files = [component.tf_file_name]
+        if os.path.exists(component.tfvars_file_path):
+            files.append(component.tfvars_file_name)
+        cwd = self._cwd(component)
+
+        result = self.execute(
+            f"terraform fmt -check -list=false {_join(files)}", cwd=cwd
+        )
+        self._check_stopped(result)
+        if result.returncode == 0:
+            return False
+        # fmt -check exits with 3 when the files are valid but not formatted
+        if result.returncode != 3:
+            logger.error(f"Terraform fmt failed: {result.stderr}")
+            raise Exception(f"Error: {result.stderr}")
+
+        self.run_command(f"terraform fmt -list=false {_join(files)}", cwd=cwd)
+        with open(component.tf_file_path, "r") as f:
+            component.terraform_code = f.read()
+        if component.tfvars_code and os.path.exists(component.tfvars_file_path):
+            with open(component.tfvars_file_path, "r") as f:
+                component.tfvars_code = f.read()
+        return True
+
+    def validate(
+        self, component: Optional[TerraformComponent] = None
+    ) -> List[Diagnostic]:
+        """Validate the configuration locally, without contacting providers' APIs.
+
+        Args:
+            component: Optional TerraformComponent to validate. The configuration
+                it belongs to is validated as a whole.
+
+        Returns:
+            list: The warnings reported by terraform
+
+        Raises:
+            TerraformError: If the configuration is invalid, with its diagnostics
+        """
+        # validate -json writes a single JSON document, not a stream of events
+        result = self.execute("terraform validate -json", cwd=self._cwd(component))
+        self._check_stopped(result)
+        try:
+            report = json.loads(result.stdout)
+        except ValueError:
+            report = {}
+        diagnostics = [
+            Diagnostic.from_json(data) for data in report.get("diagnostics") or []
+        ]
+        if result.returncode != 0 or not report.get("valid", False):
+            error = TerraformError(
+                [d for d in diagnostics if d.severity == "error"],
+                stderr=result.stderr or (result.stdout if not report else ""),
+            )
+            logger.error(f"Terraform validate failed: {str(error)}")
+            raise error
+        return diagnostics
+
+    def plan(
+        self,
+        component: Optional[TerraformComponent] = None,
+        plan_file: Optional[str] = None,
+        on_event: Optional[Callable[[TerraformEvent], None]] = None,
+    ):
         """Generate and show an execution plan.
 
         Args:
             component: Optional TerraformComponent to plan for. If None, plans for all components.
+            plan_file: Optional path to save the plan to, as returned by new_plan_file.
+            on_event: Optional callable receiving each event of the plan as it comes.
+
+        Returns:
+            str: The human-readable plan, with the changes of each attribute
         """
-        command = "terraform plan"
-        # if component:
-        #     command += f" -target={component.tf_file_name}"
-        #     if component.tfvars_code:
-        #         command += f" -var-file={component.tfvars_file_name}"
-        return self.run_command(command)
+        saved_plan_file = plan_file or self.new_plan_file(component)
+        command = f"terraform plan -input=false -out={shlex.quote(saved_plan_file)}"
+        command += self._target_flags(component)
+        try:
+            log = self.run_json(command, cwd=self._cwd(component), on_event=on_event)
+            return self.show_plan(saved_plan_file, component, fallback=log.text())
+        finally:
+            if plan_file is None:
+                self.remove_plan_file(saved_plan_file)
 
-    def apply(self, component: Optional[TerraformComponent] = None, auto_approve=True):
+    def apply(
+        self,
+        component: Optional[TerraformComponent] = None,
+        auto_approve=True,
+        plan_file: Optional[str] = None,
+        on_event: Optional[Callable[[TerraformEvent], None]] = None,
+    ):
         """Apply the changes required to reach the desired state.
 
         Args:
             component: Optional TerraformComponent to apply. If None, applies all components.
             auto_approve: Whether to skip interactive approval.
+            plan_file: Optional saved plan to apply. Exactly the planned changes are
+                applied, without refreshing the state again.
+            on_event: Optional callable receiving each event of the apply as it comes,
+                e.g. the start and completion of each resource.
         """
         command = "terraform apply"
-        # if component:
-        #     command += f" -target={component.tf_file_name}"
-        #     if component.tfvars_code:
-        #         command += f" -var-file={component.tfvars_file_name}"
-        if auto_approve:
-            command += " -auto-approve"
-        return self.run_command(command)
-
-    def get_outputs(self) -> dict:
+        if plan_file:
+            # A saved plan already pins its targets and variables
+            return self.run_json(
+                f"{command} {shlex.quote(plan_file)}",
+                cwd=self._cwd(component),
+                on_event=on_event,
+            ).text()
+        command += self._target_flags(component)
+        if not auto_approve:
+            # Interactive approval is not available in machine-readable mode
+            return self.run_command(command, cwd=self._cwd(component))
+        command += " -auto-approve"
+        return self.run_json(
+            command, cwd=self._cwd(component), on_event=on_event
+        ).text()
+
+    def new_plan_file(self, component: Optional[TerraformComponent] = None) -> str:
+        """Reserve a unique plan file path for a plan/apply operation.
+
+        Args:
+            component: Optional TerraformComponent the plan is for, used in the file name.
+
+        Returns:
+            str: Absolute path of the plan file, usable from any component directory
+        """
+        plans_dir = os.path.abspath(os.path.join(self.working_directory, PLANS_DIR))
+        os.makedirs(plans_dir, exist_ok=True)
+        prefix = component.name if component else "all"
+        return os.path.join(plans_dir, f"{prefix}-{uuid.uuid4().hex}.tfplan")
+
+    def show_plan(
+        self,
+        plan_file: str,
+        component: Optional[TerraformComponent] = None,
+        fallback: str = "",
+    ) -> str:
+        """Render a saved plan as the human-readable output of `terraform plan`.
+
+        Machine-readable plans only report one line per resource, without the
+        changes of their attributes.
+
+        Args:
+            plan_file: Path of the saved plan, as returned by new_plan_file.
+            component: Optional TerraformComponent the plan was made for.
+            fallback: Returned if the plan cannot be rendered.
+
+        Returns:
+            str: The rendered plan
+        """
+        try:
+            return self.run_command(
+                f"terraform show -no-color {shlex.quote(plan_file)}",
+                cwd=self._cwd(component),
+            )
+        except ProcessCancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Failed to render the plan: {str(e)}")
+            return fallback
+
+    def show_plan_json(
+        self, plan_file: str, component: Optional[TerraformComponent] = None
+    ) -> dict:
+        """Convert a saved plan to Terraform's JSON plan representation.
+
+        Args:
+            plan_file: Path of the saved plan, as returned by new_plan_file.
+            component: Optional TerraformComponent the plan was made for.
+
+        Returns:
+            dict: The plan as output by `terraform show -json`
+        """
+        return json.loads(
+            self.run_command(
+                f"terraform show -json {shlex.quote(plan_file)}",
+                cwd=self._cwd(component),
+            )
+        )
+
+    def remove_plan_file(self, plan_file: str) -> None:
+        """Delete a saved plan once it was applied or discarded."""
+        path = os.path.join(self.working_directory, plan_file)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def get_outputs(self, component: Optional[TerraformComponent] = None) -> dict:
         """Get the outputs after a successful Terraform apply.
 
+        Args:
+            component: Optional isolated TerraformComponent to get the outputs of.
+
         Returns:
             dict: A dictionary containing the Terraform outputs, or empty dict if no outputs exist.
         """
         try:
             command = "terraform output -json"
-            output_result = self.run_command(command)
+            output_result = self.run_command(command, cwd=self._cwd(component))
             return json.loads(output_result)
         except Exception:
             return {}
@@ -91,14 +499,31 @@ class TerraformWrapper:
             component: Optional TerraformComponent to destroy. If None, destroys all components.
             auto_approve: Whether to skip interactive approval.
         """
+        if component is None and is_isolated_layout(self.working_directory):
+            # Each component has its own state: destroy them one by one
+            return "".join(
+                self.destroy(
+                    TerraformComponent(
+                        name=name, terraform_code="", workdir=self.working_directory
+                    ),
+                    auto_approve=auto_approve,
+                )
+                for name in TerraformComponentManager.list_components(
+                    self.working_directory
+                )
+            )
+
         command = "terraform destroy"
-        # if component:
-        #     command += f" -target={component.tf_file_name}"
-        #     if component.tfvars_code:
-        #         command += f" -var-file={component.tfvars_file_name}"
-        if auto_approve:
-            command += " -auto-approve"
-        return self.run_command(command)
+        if component and not component.isolated and not self._targets(component):
+            # Without targets, destroy would remove every component
+            logger.warning(f"Component {component.name} has no resources to destroy")
+            return ""
+        command += self._target_flags(component)
+        if not auto_approve:
+            # Interactive approval is not available in machine-readable mode
+            return self.run_command(command, cwd=self._cwd(component))
+        command += " -auto-approve"
+        return self.run_json(command, cwd=self._cwd(component)).text()
 
     def _ensure_working_directory_exists(self):
         """Ensure the working directory exists before proceeding"""
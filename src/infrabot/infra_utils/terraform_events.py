@@ -0,0 +1,234 @@
+"""Typed events of Terraform's machine-readable UI (`-json`).
+
+With `-json`, plan, apply and destroy write one JSON object per line to stdout:
+resource progress, diagnostics, change summaries and outputs. The parser below
+turns each line into a typed event as soon as it is written, and keeps the
+compact data the rest of InfraBot needs: planned changes, errors and totals.
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("infrabot.terraform_events")
+
+# Event types carrying a resource change hook
+HOOK_EVENTS = {
+    "apply_start",
+    "apply_progress",
+    "apply_complete",
+    "apply_errored",
+    "refresh_start",
+    "refresh_complete",
+    "provision_start",
+    "provision_progress",
+    "provision_complete",
+    "provision_errored",
+}
+
+# Event types carrying a planned or drifted resource change
+CHANGE_EVENTS = {"planned_change", "resource_drift"}
+
+
+@dataclass
+class TerraformEvent:
+    """A line of Terraform's machine-readable output."""
+
+    type: str
+    message: str = ""
+    level: str = "info"
+    timestamp: str = ""
+    raw: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+
+@dataclass
+class ResourceEvent(TerraformEvent):
+    """Progress of a resource: planned change, refresh or apply step."""
+
+    address: str = ""
+    resource_type: str = ""
+    action: str = ""
+    elapsed_seconds: Optional[float] = None
+
+
+@dataclass
+class Diagnostic:
+    """An error or warning reported by Terraform."""
+
+    severity: str
+    summary: str
+    detail: str = ""
+    address: Optional[str] = None
+    filename: Optional[str] = None
+    line: Optional[int] = None
+    code: Optional[str] = None
+    context: Optional[str] = None
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "Diagnostic":
+        range_ = data.get("range") or {}
+        snippet = data.get("snippet") or {}
+        return cls(
+            severity=data.get("severity", "error"),
+            summary=data.get("summary", ""),
+            detail=data.get("detail", ""),
+            address=data.get("address"),
+            filename=range_.get("filename"),
+            line=(range_.get("start") or {}).get("line"),
+            code=snippet.get("code"),
+            context=snippet.get("context"),
+        )
+
+    def render(self) -> str:
+        """Render the diagnostic the way Terraform prints it to humans."""
+        lines = [f"{self.severity.capitalize()}: {self.summary}", ""]
+        if self.address:
+            lines.append(f"  with {self.address},")
+        if self.filename:
+            location = f"  on {self.filename} line {self.line}"
+            if self.context:
+                location += f", in {self.context}"
+            lines.append(f"{location}:")
+            if self.code:
+                lines.append(f"  {self.line}: {self.code.strip()}")
+        if self.detail:
+            if len(lines) > 2:
+                lines.append("")
+            lines.append(self.detail)
+        return "\n".join(lines).rstrip()
+
+
+@dataclass
+class DiagnosticEvent(TerraformEvent):
+    diagnostic: Optional[Diagnostic] = None
+
+
+@dataclass
+class ChangeSummary:
+    """Totals of a plan, apply or destroy."""
+
+    add: int = 0
+    change: int = 0
+    remove: int = 0
+    import_: int = 0
+    operation: str = "plan"
+
+
+@dataclass
+class ChangeSummaryEvent(TerraformEvent):
+    summary: Optional[ChangeSummary] = None
+
+
+@dataclass
+class OutputsEvent(TerraformEvent):
+    outputs: Dict[str, Any] = field(default_factory=dict)
+
+
+def parse_event(line: str) -> Optional[TerraformEvent]:
+    """Parse a line of `-json` output, or None if it is not a Terraform event."""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "type" not in data:
+        return None
+
+    event_type = data["type"]
+    common = dict(
+        type=event_type,
+        message=data.get("@message", ""),
+        level=data.get("@level", "info"),
+        timestamp=data.get("@timestamp", ""),
+        raw=data,
+    )
+
+    if event_type in HOOK_EVENTS or event_type in CHANGE_EVENTS:
+        payload = data.get("hook") or data.get("change") or {}
+        resource = payload.get("resource") or {}
+        return ResourceEvent(
+            **common,
+            address=resource.get("addr", ""),
+            resource_type=resource.get("resource_type", ""),
+            action=payload.get("action", ""),
+            elapsed_seconds=payload.get("elapsed_seconds"),
+        )
+    if event_type == "diagnostic":
+        return DiagnosticEvent(
+            **common, diagnostic=Diagnostic.from_json(data.get("diagnostic") or {})
+        )
+    if event_type == "change_summary":
+        changes = data.get("changes") or {}
+        return ChangeSummaryEvent(
+            **common,
+            summary=ChangeSummary(
+                add=changes.get("add", 0),
+                change=changes.get("change", 0),
+                remove=changes.get("remove", 0),
+                import_=changes.get("import", 0),
+                operation=changes.get("operation", "plan"),
+            ),
+        )
+    if event_type == "outputs":
+        return OutputsEvent(**common, outputs=data.get("outputs") or {})
+    return TerraformEvent(**common)
+
+
+class TerraformEventLog:
+    """Accumulate the events of a terraform command as its lines are written."""
+
+    def __init__(self):
+        self.events: List[TerraformEvent] = []
+        self.diagnostics: List[Diagnostic] = []
+        self.planned_changes: List[ResourceEvent] = []
+        self.change_summary: Optional[ChangeSummary] = None
+        self.outputs: Dict[str, Any] = {}
+
+    def feed(self, line: str) -> Optional[TerraformEvent]:
+        """Parse a line of output and record the event it carries, if any."""
+        event = parse_event(line)
+        if event is None:
+            if line.strip():
+                logger.debug(f"Ignoring non-JSON terraform output: {line}")
+            return None
+
+        self.events.append(event)
+        if isinstance(event, DiagnosticEvent) and event.diagnostic:
+            self.diagnostics.append(event.diagnostic)
+        elif isinstance(event, ChangeSummaryEvent):
+            self.change_summary = event.summary
+        elif isinstance(event, OutputsEvent):
+            self.outputs = event.outputs
+        elif isinstance(event, ResourceEvent) and event.type == "planned_change":
+            self.planned_changes.append(event)
+        return event
+
+    @property
+    def errors(self) -> List[Diagnostic]:
+        return [d for d in self.diagnostics if d.severity == "error"]
+
+    def text(self) -> str:
+        """Render the events as compact, human-readable text."""
+        lines = []
+        for event in self.events:
+            if event.type == "version":
+                continue
+            if isinstance(event, DiagnosticEvent) and event.diagnostic:
+                lines.append(event.diagnostic.render())
+            elif event.message:
+                lines.append(event.message)
+        return "\n".join(lines)
+
+
+class TerraformError(Exception):
+    """A terraform command failed, with the diagnostics it reported."""
+
+    def __init__(self, diagnostics: List[Diagnostic], stderr: str = ""):
+        self.diagnostics = diagnostics
+        self.stderr = stderr
+        rendered = "\n\n".join(d.render() for d in diagnostics)
+        if stderr.strip():
+            rendered = f"{rendered}\n\n{stderr.strip()}" if rendered else stderr
+        if not rendered.startswith("Error"):
+            rendered = f"Error: {rendered}"
+        super().__init__(rendered)
@@ -0,0 +1,185 @@
+"""Pool of pre-initialized project working directories.
+
+`terraform init` dominates the latency of project initialization. The pool
+keeps a few template workdirs already initialized in the background, one set
+per provider configuration, and a new project claims one of them with a
+single atomic rename.
+"""
+
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from infrabot.infra_utils.provider_cache import INFRABOT_HOME
+from infrabot.infra_utils.terraform import TerraformWrapper
+from infrabot.utils.os import copy_assets, get_terraform_assets_dir
+
+logger = logging.getLogger("infrabot.workdir_pool")
+
+# Pool flavours and the provider configuration they are initialized with
+FLAVOURS = {"cloud": "provider.tf", "local": "provider_local.tf"}
+
+# Prefix of workdirs that are still being initialized
+BUILDING_PREFIX = ".building-"
+
+# Workdirs left in the building state for longer than this were abandoned
+STALE_BUILD_SECONDS = 3600
+
+
+class WorkdirPool:
+    """Keep `size` initialized workdirs ready for each provider configuration."""
+
+    def __init__(self, pool_dir: str, size: int):
+        self.pool_dir = pool_dir
+        self.size = size
+        self._refill_needed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def start(self) -> None:
+        """Start refilling the pool in a background thread."""
+        if not self.enabled or self._thread is not None:
+            return
+        self._remove_stale_builds()
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._refill_loop, name="infrabot-workdir-pool", daemon=True
+        )
+        self._thread.start()
+        self._refill_needed.set()
+
+    def stop(self) -> None:
+        """Stop the refill thread once the workdir being built is ready."""
+        self._stopped.set()
+        self._refill_needed.set()
+        self._thread = None
+
+    def claim(self, workdir: str, local: bool = False) -> bool:
+        """Move a ready workdir of the pool to `workdir`.
+
+        Only new projects can be claimed: `workdir` must not exist or be empty.
+
+        Args:
+            workdir: Working directory of the new project
+            local: Whether the project uses localstack
+
+        Returns:
+            bool: Whether a workdir was claimed, otherwise it must be initialized
+        """
+        if not self.enabled:
+            return False
+        if os.path.isdir(workdir) and os.listdir(workdir):
+            return False
+
+        parent_dir = os.path.dirname(os.path.abspath(workdir))
+        os.makedirs(parent_dir, exist_ok=True)
+        claimed = False
+        for ready_dir in self._ready_dirs(self._flavour(local)):
+            try:
+                # Renaming onto an empty directory replaces it atomically
+                os.rename(ready_dir, workdir)
+                claimed = True
+                break
+            except FileNotFoundError:
+                # Claimed by another process in the meantime
+                continue
+            except OSError as e:
+                if e.errno == errno.EXDEV:
+                    logger.warning(
+                        f"Workdir pool {self.pool_dir} is on another filesystem "
+                        f"than {workdir}, set INFRABOT_WORKDIR_POOL_DIR next to it"
+                    )
+                else:
+                    logger.warning(f"Failed to claim {ready_dir}: {str(e)}")
+                break
+
+        self._refill_needed.set()
+        if claimed:
+            logger.debug(f"Claimed pre-initialized workdir for {workdir}")
+        return claimed
+
+    def refill(self) -> None:
+        """Initialize workdirs until every flavour has `size` ready ones."""
+        for flavour in FLAVOURS:
+            while (
+                not self._stopped.is_set()
+                and len(self._ready_dirs(flavour)) < self.size
+            ):
+                self._build(flavour)
+
+    def _refill_loop(self) -> None:
+        while not self._stopped.is_set():
+            self._refill_needed.wait()
+            self._refill_needed.clear()
+            try:
+                self.refill()
+            except Exception as e:
+                # Retried on the next claim instead of spinning on a broken setup
+                logger.error(f"Error refilling workdir pool: {str(e)}")
+
+    def _build(self, flavour: str) -> str:
+        flavour_dir = os.path.join(self.pool_dir, flavour)
+        build_dir = os.path.join(flavour_dir, f"{BUILDING_PREFIX}{uuid.uuid4()}")
+        try:
+            copy_assets(
+                get_terraform_assets_dir(),
+                build_dir,
+                whitelist=[FLAVOURS[flavour], "backend.tf"],
+            )
+            TerraformWrapper(build_dir).init()
+            ready_dir = os.path.join(flavour_dir, str(uuid.uuid4()))
+            os.rename(build_dir, ready_dir)
+        except Exception:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            raise
+        logger.debug(f"Added pre-initialized workdir {ready_dir} to the pool")
+        return ready_dir
+
+    def _ready_dirs(self, flavour: str) -> List[str]:
+        flavour_dir = os.path.join(self.pool_dir, flavour)
+        if not os.path.isdir(flavour_dir):
+            return []
+        return [
+            os.path.join(flavour_dir, name)
+            for name in sorted(os.listdir(flavour_dir))
+            if not name.startswith(BUILDING_PREFIX)
+        ]
+
+    def _remove_stale_builds(self) -> None:
+        for flavour in FLAVOURS:
+            flavour_dir = os.path.join(self.pool_dir, flavour)
+            if not os.path.isdir(flavour_dir):
+                continue
+            for name in os.listdir(flavour_dir):
+                path = os.path.join(flavour_dir, name)
+                if (
+                    name.startswith(BUILDING_PREFIX)
+                    and time.time() - os.path.getmtime(path) > STALE_BUILD_SECONDS
+                ):
+                    shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def _flavour(local: bool) -> str:
+        return "local" if local else "cloud"
+
+
+def get_workdir_pool() -> WorkdirPool:
+    """Create the workdir pool configured by the environment.
+
+    The pool holds INFRABOT_WORKDIR_POOL_SIZE workdirs per provider configuration
+    (default: 0, disabled) in INFRABOT_WORKDIR_POOL_DIR (default:
+    ~/.infrabot/workdir-pool), which must be on the same filesystem as projects.
+    """
+    pool_dir = os.getenv("INFRABOT_WORKDIR_POOL_DIR") or os.path.join(
+        INFRABOT_HOME, "workdir-pool"
+    )
+    return WorkdirPool(pool_dir, size=int(os.getenv("INFRABOT_WORKDIR_POOL_SIZE", "0")))
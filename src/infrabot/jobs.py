@@ -0,0 +1,141 @@
+"""Background job management for long-running InfraBot operations.
+
+Jobs run on a bounded thread pool so that slow pipelines (LLM calls, terraform
+subprocesses) never block the API event loop. Each job records its status, the
+stage it is currently in, a timestamped log of stage events carrying partial
+results, and its final result so that clients can poll or stream it.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("infrabot.jobs")
+
+
+class JobStatus(str, Enum):
+    """Lifecycle states of a background job."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """State of a single background job."""
+
+    id: str
+    status: JobStatus = JobStatus.PENDING
+    stage: str = "queued"
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: str = ""
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    # Set to ask the job to stop, e.g. to interrupt its terraform commands
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+    def add_event(self, stage: str, data: Optional[Dict[str, Any]] = None) -> None:
+        """Record that the job reached `stage`, with optional partial results."""
+        logger.debug(f"Job {self.id} reached stage: {stage}")
+        self.stage = stage
+        self.events.append(
+            {"stage": stage, "timestamp": time.time(), "data": data or {}}
+        )
+
+    @property
+    def done(self) -> bool:
+        return self.status in (JobStatus.COMPLETED, JobStatus.FAILED)
+
+
+class JobManager:
+    """Run jobs on a bounded worker pool and keep track of their results."""
+
+    def __init__(self, max_workers: int = 4, max_finished_jobs: int = 1000):
+        self.max_workers = max_workers
+        self.max_finished_jobs = max_finished_jobs
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="infrabot-job"
+        )
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable[[Job], Any]) -> Job:
+        """Schedule `fn` on the worker pool.
+
+        Args:
+            fn: Callable receiving the job, so that it can report its stage
+
+        Returns:
+            Job: The newly created job, in pending state
+        """
+        job = Job(id=str(uuid.uuid4()))
+        with self._lock:
+            self._jobs[job.id] = job
+            self._evict_finished_jobs()
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Get a job by id, or None if it is unknown or was evicted."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop, or None if it is unknown or was evicted.
+
+        Pending jobs stop before they start, running ones at their next
+        cancellation point: between two stages, while streaming a model
+        response, or in a running terraform command.
+        """
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            logger.info(f"Cancelling job {job_id}")
+            job.cancel_event.set()
+        return job
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and optionally wait for running ones."""
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        if job.cancel_event.is_set():
+            logger.info(f"Job {job.id} was cancelled before it started")
+            job.error = "Job was cancelled before it started"
+            job.add_event("cancelled")
+            # Clients of the event stream wait for a terminal event
+            job.add_event("failed", {"error": job.error})
+            job.status = JobStatus.FAILED
+            job.finished_at = time.time()
+            return
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        try:
+            job.result = fn(job)
+            job.status = JobStatus.COMPLETED
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}", exc_info=True)
+            job.error = str(e)
+            job.add_event("failed", {"error": str(e)})
+            job.status = JobStatus.FAILED
+        finally:
+            job.finished_at = time.time()
+
+    def _evict_finished_jobs(self) -> None:
+        """Drop the oldest finished jobs once the store grows past its bound."""
+        overflow = len(self._jobs) - self.max_finished_jobs
+        if overflow <= 0:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.done][
+            :overflow
+        ]:
+            del self._jobs[job_id]
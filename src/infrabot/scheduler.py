@@ -0,0 +1,139 @@
+"""Scheduling of terraform operations across project working directories.
+
+Operations touching the same workdir (saving component files, init, plan,
+apply, destroy) are serialized, while operations on different workdirs run in
+parallel, up to a global concurrency cap.
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger("infrabot.scheduler")
+
+
+@dataclass
+class _WorkdirState:
+    """Lock and bookkeeping for a single workdir."""
+
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    waiting: int = 0
+    running: Optional[str] = None
+    acquired: int = 0
+    completed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class WorkdirScheduler:
+    """Serialize operations per workdir and cap the global concurrency."""
+
+    def __init__(self, max_concurrent_operations: int = 4):
+        self.max_concurrent_operations = max_concurrent_operations
+        self._slots = threading.BoundedSemaphore(max_concurrent_operations)
+        self._states: Dict[str, _WorkdirState] = {}
+        self._states_lock = threading.Lock()
+        self._held = threading.local()
+        self._global_waiting = 0
+
+    @contextmanager
+    def operation(self, workdir: str, operation: str) -> Iterator[None]:
+        """Hold the lock of `workdir` and a global slot for the duration of the block.
+
+        Nested operations on a workdir already held by the current thread run
+        directly, so helpers can safely lock on their own.
+
+        Args:
+            workdir: Working directory the operation touches
+            operation: Name of the operation (init, plan, apply, destroy...)
+        """
+        key = os.path.abspath(workdir)
+        held = self._held_workdirs()
+        if key in held:
+            yield
+            return
+
+        state = self._get_state(key)
+        start = time.monotonic()
+        with self._states_lock:
+            state.waiting += 1
+        locked = False
+        try:
+            state.lock.acquire()
+            locked = True
+            with self._states_lock:
+                self._global_waiting += 1
+            try:
+                self._slots.acquire()
+            finally:
+                with self._states_lock:
+                    self._global_waiting -= 1
+        except BaseException:
+            if locked:
+                state.lock.release()
+            with self._states_lock:
+                state.waiting -= 1
+            raise
+
+        wait = time.monotonic() - start
+        with self._states_lock:
+            state.waiting -= 1
+            state.running = operation
+            state.acquired += 1
+            state.total_wait += wait
+            state.max_wait = max(state.max_wait, wait)
+        logger.debug(f"Acquired {key} for {operation} after waiting {wait:.3f}s")
+
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            with self._states_lock:
+                state.running = None
+                state.completed += 1
+            self._slots.release()
+            state.lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth and lock wait statistics.
+
+        Returns:
+            dict: Global counters and, for each workdir, the running operation,
+                its queue depth and its lock wait times in seconds
+        """
+        with self._states_lock:
+            workdirs = {
+                workdir: {
+                    "running": state.running,
+                    "queue_depth": state.waiting,
+                    "completed": state.completed,
+                    "avg_wait": (
+                        state.total_wait / state.acquired if state.acquired else 0.0
+                    ),
+                    "max_wait": state.max_wait,
+                }
+                for workdir, state in self._states.items()
+            }
+            return {
+                "max_concurrent_operations": self.max_concurrent_operations,
+                "running": sum(1 for s in self._states.values() if s.running),
+                "queue_depth": sum(s.waiting for s in self._states.values()),
+                "waiting_for_slot": self._global_waiting,
+                "workdirs": workdirs,
+            }
+
+    def _get_state(self, key: str) -> _WorkdirState:
+        with self._states_lock:
+            if key not in self._states:
+                self._states[key] = _WorkdirState()
+            return self._states[key]
+
+    def _held_workdirs(self) -> set:
+        if not hasattr(self._held, "workdirs"):
+            self._held.workdirs = set()
+        return self._held.workdirs
@@ -5,39 +5,95 @@ This module provides both programmatic functions and FastAPI endpoints for Infra
 
 import os
 import re
+import json
+import time
+import asyncio
+import threading
 import logging
 import uuid
 import base64
-from typing import Optional, Dict, Any, List
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, List, Callable, Union, Iterable, Tuple
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
 from infrabot.ai.terraform_generator import (
-    gen_terraform,
-    fix_terraform,
+    gen_terraform_stream,
+    fix_terraform_stream,
+    apply_fix,
+    cache_generation,
+    generation_scope,
+    get_fix_mode,
     log_terraform_error,
 )
-from infrabot.infra_utils.terraform import TerraformWrapper
+from infrabot.ai.fix_memory import AppliedFix, FixTracker, get_fix_memory
+from infrabot.infra_utils.terraform import TerraformWrapper, validation_enabled
+from infrabot.infra_utils.process import ProcessCancelledError
+from infrabot.infra_utils.terraform_events import (
+    ChangeSummaryEvent,
+    Diagnostic,
+    ResourceEvent,
+    TerraformEvent,
+)
+from infrabot.infra_utils.workdir_pool import get_workdir_pool
 from infrabot.infra_utils.component_manager import (
     TerraformComponentManager,
     TerraformComponent,
 )
-from infrabot.utils.parsing import extract_code_blocks
+from infrabot.utils.parsing import CodeBlockStreamParser
+from infrabot.utils.task_graph import TaskGraph
 from infrabot.ai.summary import summarize_terraform_plan
-from infrabot.utils.os import get_package_directory, copy_assets
+from infrabot.utils.os import get_terraform_assets_dir, copy_assets
 from infrabot.ai.output_format import ai_format_output
 from infrabot.ai.diagram_generator import generate_diagram
+from infrabot.jobs import Job, JobManager
+from infrabot.scheduler import WorkdirScheduler
 
 logger = logging.getLogger("infrabot.service")
 WORKDIR = ".infrabot/default"
 
+# Called with a stage name and the partial results available at that stage
+ProgressCallback = Callable[[str, Dict[str, Any]], None]
+
+# Server-sent events stream settings (seconds)
+SSE_POLL_INTERVAL = 0.25
+SSE_KEEPALIVE_INTERVAL = 15.0
+# Minimum delay between two progress reports of a streamed LLM response (seconds)
+STREAM_REPORT_INTERVAL = 0.2
+
+# Worker pool running component creation jobs off the event loop
+job_manager = JobManager(
+    max_workers=int(os.getenv("INFRABOT_MAX_JOB_WORKERS", "4")),
+)
+
+# Serializes terraform operations per workdir, with a global concurrency cap
+scheduler = WorkdirScheduler(
+    max_concurrent_operations=int(os.getenv("INFRABOT_MAX_CONCURRENT_OPERATIONS", "4")),
+)
+
+# Pre-initialized workdirs claimed by new projects, refilled while the API runs
+workdir_pool = get_workdir_pool()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Manage resources that live as long as the API server."""
+    workdir_pool.start()
+    yield
+    workdir_pool.stop()
+    job_manager.shutdown(wait=False)
+
+
 # Create FastAPI app
 app = FastAPI(
     title="InfraBot API",
     description="API for creating and managing infrastructure components with natural language",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 
@@ -52,6 +108,10 @@ class InitProjectRequest(BaseModel):
         default=False, description="Show detailed initialization steps"
     )
     local: bool = Field(default=False, description="Use localstack for infrastructure")
+    isolated: bool = Field(
+        default=False,
+        description="Give each component its own root module and state",
+    )
 
 
 class InitProjectResponse(BaseModel):
@@ -67,6 +127,19 @@ class ErrorInfo(BaseModel):
 
     attempt: int = Field(..., description="The attempt number")
     error: str = Field(..., description="The error message")
+    fix_source: str = Field(
+        default="llm",
+        description="Where the fix came from: 'llm' or 'memory' for a remembered fix",
+    )
+    duration: float = Field(default=0.0, description="Seconds spent fixing the error")
+    time_saved: float = Field(
+        default=0.0,
+        description="Seconds saved by reusing a remembered fix instead of the model",
+    )
+    hit_rate: float = Field(
+        default=0.0,
+        description="Share of the looked up errors that a remembered fix resolved",
+    )
 
 
 class ComponentCreationRequest(BaseModel):
@@ -94,6 +167,14 @@ class ComponentCreationRequest(BaseModel):
     workdir: str = Field(
         default=".infrabot/default", description="Working directory for the project"
     )
+    background: bool = Field(
+        default=False,
+        description="Run the creation as a background job and return a job id immediately",
+    )
+    no_cache: bool = Field(
+        default=False,
+        description="Do not reuse the cached code of the same or similar prompts",
+    )
 
 
 class ComponentCreationResponse(BaseModel):
@@ -137,6 +218,7 @@ class ComponentCreationResult:
         self.terraform_code = ""
         self.tfvars_code = ""
         self.plan_output = ""
+        self.plan_json = {}
         self.plan_summary = ""
         self.apply_output = ""
         self.outputs = {}
@@ -158,13 +240,68 @@ class ComponentCreationResult:
             formatted_outputs=self.formatted_outputs,
             self_healing_attempts=self.self_healing_attempts,
             fixed_errors=[
-                ErrorInfo(attempt=e["attempt"], error=e["error"])
-                for e in self.fixed_errors
+                ErrorInfo(**fixed_error) for fixed_error in self.fixed_errors
             ],
             diagram=self.diagram,
         )
 
 
+class JobResponse(BaseModel):
+    """Response model describing a background job."""
+
+    job_id: str = Field(..., description="Identifier of the job")
+    status: str = Field(
+        ..., description="Job status: pending, running, completed or failed"
+    )
+    stage: str = Field(..., description="Pipeline stage the job is currently in")
+    created_at: float = Field(..., description="Submission time (unix timestamp)")
+    started_at: Optional[float] = Field(
+        default=None, description="Start time (unix timestamp)"
+    )
+    finished_at: Optional[float] = Field(
+        default=None, description="Completion time (unix timestamp)"
+    )
+    error_message: str = Field(
+        default="", description="Error message if the job itself crashed"
+    )
+    result: Optional[ComponentCreationResponse] = Field(
+        default=None, description="Result of the component creation once completed"
+    )
+
+    @classmethod
+    def from_job(cls, job: Job) -> "JobResponse":
+        """Build the API representation of a job."""
+        return cls(
+            job_id=job.id,
+            status=job.status.value,
+            stage=job.stage,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at,
+            error_message=job.error,
+            result=job.result,
+        )
+
+
+class SchedulerStatsResponse(BaseModel):
+    """Response model for the terraform operation scheduler statistics."""
+
+    max_concurrent_operations: int = Field(
+        ..., description="Maximum number of operations running at once"
+    )
+    running: int = Field(..., description="Number of operations currently running")
+    queue_depth: int = Field(
+        ..., description="Number of operations waiting for their workdir"
+    )
+    waiting_for_slot: int = Field(
+        ..., description="Number of operations waiting for a global slot"
+    )
+    workdirs: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description="Running operation, queue depth and lock wait times per workdir",
+    )
+
+
 class ListProjectsRequest(BaseModel):
     """Request model for listing projects."""
 
@@ -187,12 +324,18 @@ class ListProjectsResponse(BaseModel):
 # API endpoints
 @app.post("/init", response_model=InitProjectResponse)
 async def api_init_project(request: InitProjectRequest) -> InitProjectResponse:
-    """Initialize a new project."""
+    """Initialize a new project.
+
+    Initialization runs off the event loop: it waits for the workdir lock,
+    which a running component creation may hold, and runs terraform init.
+    """
     try:
-        return init_project(
+        return await run_in_threadpool(
+            init_project,
             workdir=os.path.join(request.workdir, ".infrabot/default"),
             verbose=request.verbose,
             local=request.local,
+            isolated=request.isolated,
         )
     except Exception as e:
         logger.error(f"Error initializing project: {str(e)}")
@@ -201,25 +344,118 @@ async def api_init_project(request: InitProjectRequest) -> InitProjectResponse:
         )
 
 
-@app.post("/component/create", response_model=ComponentCreationResponse)
+@app.post(
+    "/component/create",
+    response_model=Union[ComponentCreationResponse, JobResponse],
+)
 async def api_create_component(
-    request: ComponentCreationRequest, background_tasks: BackgroundTasks
-) -> ComponentCreationResponse:
-    """Create a new infrastructure component."""
-    # Call the service function
-    result = create_component(
-        prompt=request.prompt,
-        name=request.name,
-        model=request.model,
-        self_healing=request.self_healing,
-        max_attempts=request.max_attempts,
-        keep_on_failure=request.keep_on_failure,
-        langfuse_session_id=request.langfuse_session_id,
-        workdir=os.path.join(request.workdir, ".infrabot/default"),
+    request: ComponentCreationRequest,
+    background_tasks: BackgroundTasks,
+    http_request: Request,
+) -> Union[ComponentCreationResponse, JobResponse]:
+    """Create a new infrastructure component.
+
+    In background mode a job is submitted and its id returned right away; poll
+    `/jobs/{job_id}` for progress and the final result.
+    """
+    if request.background:
+        job = job_manager.submit(
+            lambda job: _run_create_component(
+                request,
+                progress_callback=job.add_event,
+                cancel_event=job.cancel_event,
+            )
+        )
+        return JobResponse.from_job(job)
+
+    # Run the blocking pipeline off the event loop, stopping it if the client
+    # goes away so that its terraform commands do not hold a worker
+    cancel_event = threading.Event()
+    task = asyncio.ensure_future(
+        run_in_threadpool(_run_create_component, request, cancel_event=cancel_event)
+    )
+    while not task.done():
+        if await http_request.is_disconnected():
+            logger.info("Client disconnected, cancelling component creation")
+            cancel_event.set()
+            break
+        await asyncio.wait({task}, timeout=SSE_POLL_INTERVAL)
+    return await task
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def api_get_job(job_id: str) -> JobResponse:
+    """Get the status, current stage and result of a background job."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JobResponse.from_job(job)
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobResponse)
+async def api_cancel_job(job_id: str) -> JobResponse:
+    """Cancel a background job, interrupting its running terraform command."""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JobResponse.from_job(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def api_stream_job_events(job_id: str, request: Request) -> StreamingResponse:
+    """Stream the stage events of a background job as server-sent events.
+
+    Each event is named after its stage and carries a JSON payload with its
+    timestamp and partial results. The stream ends once the job is done, and can
+    be resumed with the standard `Last-Event-ID` header.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+
+    try:
+        start = int(request.headers.get("last-event-id", "-1")) + 1
+    except ValueError:
+        start = 0
+
+    return StreamingResponse(
+        _job_event_stream(job, request, start),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    # Convert to response model
-    return result.to_response(request.name)
+
+async def _job_event_stream(job: Job, request: Request, start: int = 0):
+    """Yield the events of a job in server-sent events format as they arrive."""
+    sent = start
+    last_write = time.monotonic()
+    while True:
+        events = job.events[sent:]
+        for event in events:
+            yield (
+                f"id: {sent}\n"
+                f"event: {event['stage']}\n"
+                f"data: {json.dumps(event, default=str)}\n\n"
+            )
+            sent += 1
+            last_write = time.monotonic()
+
+        if job.done and sent >= len(job.events):
+            break
+        if await request.is_disconnected():
+            logger.debug(f"Client disconnected from job {job.id} event stream")
+            break
+        if time.monotonic() - last_write > SSE_KEEPALIVE_INTERVAL:
+            yield ": keep-alive\n\n"
+            last_write = time.monotonic()
+
+        await asyncio.sleep(SSE_POLL_INTERVAL)
+
+
+@app.get("/scheduler/stats", response_model=SchedulerStatsResponse)
+async def api_scheduler_stats() -> SchedulerStatsResponse:
+    """Get queue depth and lock wait statistics of terraform operations."""
+    return SchedulerStatsResponse(**scheduler.stats())
 
 
 @app.get("/projects", response_model=ListProjectsResponse)
@@ -234,8 +470,39 @@ async def api_list_projects(parent_dir: str = ".") -> ListProjectsResponse:
         raise HTTPException(status_code=500, detail=f"Project listing failed: {str(e)}")
 
 
+def _run_create_component(
+    request: ComponentCreationRequest,
+    progress_callback: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> ComponentCreationResponse:
+    """Run component creation for an API request and build its response."""
+    result = create_component(
+        prompt=request.prompt,
+        name=request.name,
+        model=request.model,
+        self_healing=request.self_healing,
+        max_attempts=request.max_attempts,
+        keep_on_failure=request.keep_on_failure,
+        langfuse_session_id=request.langfuse_session_id,
+        no_cache=request.no_cache,
+        workdir=os.path.join(request.workdir, ".infrabot/default"),
+        progress_callback=progress_callback,
+        cancel_event=cancel_event,
+    )
+    response = result.to_response(request.name)
+    if progress_callback:
+        progress_callback(
+            "completed" if result.success else "failed",
+            {"result": response.model_dump()},
+        )
+    return response
+
+
 def init_project(
-    workdir: str = ".infrabot/default", verbose: bool = False, local: bool = False
+    workdir: str = ".infrabot/default",
+    verbose: bool = False,
+    local: bool = False,
+    isolated: bool = False,
 ) -> InitProjectResponse:
     """
     Initialize a new project programmatically.
@@ -244,29 +511,36 @@ def init_project(
         workdir: Working directory for the project
         verbose: Show detailed initialization steps
         local: Use localstack for infrastructure
+        isolated: Give each component its own root module and state, so that
+            components are planned and applied independently
 
     Returns:
         InitProjectResponse: Object containing the result of initialization
     """
     try:
         workdir = workdir or WORKDIR
-        os.makedirs(workdir, exist_ok=True)
-
-        # Copy boilerplate assets from assets/ to workdir
-        package_dir = get_package_directory("infrabot")
-        assets_dir = os.path.join(package_dir, "../../assets/terraform/")
-        copy_assets(
-            assets_dir,
-            workdir,
-            whitelist=[
-                "provider.tf" if not local else "provider_local.tf",
-                "backend.tf",
-            ],
-        )
 
-        # Initialize Terraform in the directory
-        terraform_wrapper = TerraformWrapper(workdir)
-        terraform_wrapper.init(verbose=verbose)
+        with scheduler.operation(workdir, "init"):
+            # Reuse a workdir initialized ahead of time when the pool has one
+            if not workdir_pool.claim(workdir, local=local):
+                os.makedirs(workdir, exist_ok=True)
+
+                # Copy boilerplate assets from assets/ to workdir
+                copy_assets(
+                    get_terraform_assets_dir(),
+                    workdir,
+                    whitelist=[
+                        "provider.tf" if not local else "provider_local.tf",
+                        "backend.tf",
+                    ],
+                )
+
+                # Initialize Terraform in the directory
+                terraform_wrapper = TerraformWrapper(workdir)
+                terraform_wrapper.init(verbose=verbose)
+
+            if isolated:
+                TerraformComponentManager.set_isolated_layout(workdir)
 
         return InitProjectResponse(
             success=True, message="Project initialized successfully", workdir=workdir
@@ -285,6 +559,9 @@ def create_component(
     keep_on_failure: bool = False,
     langfuse_session_id: Optional[str] = None,
     workdir: str = ".infrabot/default",
+    progress_callback: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+    no_cache: bool = False,
 ) -> ComponentCreationResult:
     """
     Create a new infrastructure component programmatically.
@@ -298,12 +575,22 @@ def create_component(
         keep_on_failure: Keep generated Terraform files even if an error occurs
         langfuse_session_id: Session ID for Langfuse tracking
         workdir: Working directory for the project
+        progress_callback: Optional callable notified with the name of each
+            pipeline stage and a dict of the partial results produced so far
+        cancel_event: Optional event stopping the creation once set, including
+            its running terraform command
+        no_cache: Do not reuse the cached code generated for the same or
+            similar prompts
 
     Returns:
         ComponentCreationResult: Object containing the results of the operation
     """
     result = ComponentCreationResult()
 
+    def report(stage: str, **data: Any) -> None:
+        if progress_callback:
+            progress_callback(stage, data)
+
     # Validate the component name
     logger.debug(f"Creating component with name: {name}")
 
@@ -327,115 +614,205 @@ def create_component(
         )
         return result
 
-    terraform_wrapper = TerraformWrapper(workdir)
+    terraform_wrapper = TerraformWrapper(workdir, cancel_event=cancel_event)
     session_id = langfuse_session_id or str(uuid.uuid4())
 
-    # Generate terraform code
-    logger.debug(f"Generating terraform code for prompt: {prompt} using model: {model}")
-    response = gen_terraform(prompt, model=model, session_id=session_id)
+    # Generate terraform code, unless the creation was cancelled while queued
+    try:
+        _raise_if_cancelled(cancel_event)
+        report("generating")
+        logger.debug(
+            f"Generating terraform code for prompt: {prompt} using model: {model}"
+        )
+        blocks = _consume_stream(
+            gen_terraform_stream(
+                prompt,
+                model=model,
+                session_id=session_id,
+                use_cache=not no_cache,
+                component_name=name,
+                isolated=component.isolated,
+            ),
+            report,
+            "generation_progress",
+            cancel_event=cancel_event,
+        )
+    except ProcessCancelledError:
+        report("cancelled")
+        result.error_message = "Component creation was cancelled"
+        return result
 
-    # In case the response is coming from a reasoning model
-    # Remove content between <think></think> tags
-    response = re.sub(r"<think>.*?</think>", "", response, flags=re.DOTALL)
+    if "terraform" not in blocks:
+        result.error_message = "No terraform code found in the generated response"
+        return result
 
-    terraform_code = extract_code_blocks(response, title="terraform")[0]
-    tfvars_code = next(iter(extract_code_blocks(response, title="module.tfvars")), "")
-    _ = next(iter(extract_code_blocks(response, title="remarks")), "")
+    terraform_code = blocks["terraform"]
+    tfvars_code = blocks.get("module.tfvars", "")
 
     # Store generated code in result
     result.terraform_code = terraform_code
     result.tfvars_code = tfvars_code
+    report("generated", terraform_code=terraform_code, tfvars_code=tfvars_code)
 
     # Update component with generated code
     component.terraform_code = terraform_code
     component.tfvars_code = tfvars_code
 
+    fix_tracker = FixTracker(get_fix_memory())
     attempt = 1
     while attempt <= max_attempts:
         try:
-            # Save the component files
-            if not TerraformComponentManager.save_component(component, overwrite=True):
-                result.error_message = f"Failed to save component {name}"
-                return result
-
+            _raise_if_cancelled(cancel_event)
             try:
-                # Run Terraform plan
-                logger.debug("Running terraform plan")
-                plan_output = terraform_wrapper.plan(component)
-                result.plan_output = plan_output
-
-                # Generate plan summary
-                summary = summarize_terraform_plan(plan_output)
-                if summary:
-                    result.plan_summary = summary
-
-                # Apply the changes - skipping confirmation since we're in a service
-                logger.debug("Applying terraform changes")
-                apply_output = terraform_wrapper.apply(component)
-                result.apply_output = apply_output
-
-                # Get outputs
-                outputs = terraform_wrapper.get_outputs()
-                result.outputs = outputs
-
-                result.formatted_outputs = ai_format_output(outputs)
-
-                # Generate diagram if enabled
-                if os.getenv("GENERATE_DIAGRAM", "false").lower() == "true":
+                # Catch unknown arguments in-process, before running terraform
+                if validation_enabled():
+                    report("validating")
+                    terraform_wrapper.check_schema(component)
+
+                # Isolated components have their own state and can be applied
+                # in parallel with the other components of the project
+                with scheduler.operation(component.module_dir, "apply"):
+                    # Save the component files
+                    report("saving")
+                    if not TerraformComponentManager.save_component(
+                        component, overwrite=True
+                    ):
+                        result.error_message = f"Failed to save component {name}"
+                        return result
+
+                    if component.isolated:
+                        report("initializing")
+                        terraform_wrapper.init(component=component)
+
+                    # Catch syntax and schema errors locally before planning
+                    if validation_enabled():
+                        if terraform_wrapper.fmt(component):
+                            terraform_code = component.terraform_code
+                            tfvars_code = component.tfvars_code
+                        terraform_wrapper.validate(component)
+
+                    # Run Terraform plan, saving it so that apply executes
+                    # exactly what was planned and summarized
+                    _raise_if_cancelled(cancel_event)
+                    report("planning")
+                    logger.debug("Running terraform plan")
+                    plan_file = terraform_wrapper.new_plan_file(component)
+                    graph = None
                     try:
-                        # Generate diagram in a temporary file
-                        temp_diagram_path = os.path.join(workdir, f"{name}_diagram.jpg")
-                        generate_diagram(
-                            terraform_code, temp_diagram_path, session_id=session_id
+                        plan_output = terraform_wrapper.plan(
+                            component,
+                            plan_file=plan_file,
+                            on_event=lambda event: _report_terraform_event(
+                                report, event
+                            ),
                         )
-
-                        # Convert diagram to base64
-                        with open(temp_diagram_path, "rb") as f:
-                            result.diagram = base64.b64encode(f.read()).decode()
-
-                        # Clean up temporary file
-                        os.remove(temp_diagram_path)
-                    except Exception as e:
-                        logger.warning(f"Failed to generate diagram: {str(e)}")
+                        result.plan_output = plan_output
+                        _raise_if_cancelled(cancel_event)
+
+                        # Apply while the summary and diagram are generated;
+                        # only applying and fetching outputs need the workdir lock
+                        graph = _post_plan_graph(
+                            terraform_wrapper,
+                            component,
+                            plan_output,
+                            plan_file,
+                            result,
+                            report,
+                            session_id=session_id,
+                        )
+                        graph.start()
+                        try:
+                            graph.wait("outputs")
+                        except Exception:
+                            # Let the stages already running finish before the
+                            # next attempt, then drop what this one stored
+                            graph.shutdown()
+                            graph.join()
+                            result.plan_json = {}
+                            result.plan_summary = ""
+                            result.diagram = None
+                            raise
+                    finally:
+                        # terraform show may still be reading the saved plan
+                        if graph is not None:
+                            graph.join("plan_json")
+                        terraform_wrapper.remove_plan_file(plan_file)
+
+                # Wait for the remaining stages
+                graph.wait_all()
 
                 # Mark as successful
                 result.success = True
+                _record_fix_outcome(result, fix_tracker.resolve())
+                if not no_cache:
+                    cache_generation(
+                        prompt,
+                        model,
+                        terraform_code,
+                        tfvars_code,
+                        generation_scope(name, component.isolated),
+                    )
                 break  # Success, exit the loop
 
+            except ProcessCancelledError:
+                # Not an error of the generated code: nothing to fix
+                raise
             except Exception as e:
                 error_output = str(e)
+                diagnostics = getattr(e, "diagnostics", None)
                 log_terraform_error(error_output, session_id)
+                _record_fix_outcome(
+                    result,
+                    fix_tracker.resolve(error_output, terraform_code, diagnostics),
+                )
 
                 if not self_healing or attempt >= max_attempts:
                     if not keep_on_failure:
-                        TerraformComponentManager.cleanup_component(component)
+                        with scheduler.operation(component.module_dir, "cleanup"):
+                            TerraformComponentManager.cleanup_component(component)
                     result.error_message = f"An error occurred: {error_output}"
                     return result
 
                 # Try to fix the error with self-healing
+                _raise_if_cancelled(cancel_event)
+                report("self_healing", attempt=attempt, error=error_output)
                 logger.info(
                     f"Attempting self-healing (attempt {attempt}/{max_attempts})"
                 )
                 result.self_healing_attempts += 1
 
-                response = fix_terraform(
-                    prompt,
-                    terraform_code,
-                    tfvars_code,
-                    error_output,
-                    model=model,
-                    session_id=session_id,
-                )
-
-                if not response:
-                    result.error_message = "Failed to fix Terraform code"
-                    return result
-
-                terraform_code = extract_code_blocks(response, title="terraform")[0]
-                tfvars_code = next(
-                    iter(extract_code_blocks(response, title="module.tfvars")), ""
+                # Replay a remembered fix of the same error, or ask the model
+                fix_started = time.monotonic()
+                fixed_code = fix_tracker.recall(
+                    error_output, terraform_code, diagnostics
                 )
-                _ = next(iter(extract_code_blocks(response, title="remarks")), "")
+                if fixed_code is not None:
+                    fixed = (fixed_code, tfvars_code)
+                    fix = fix_tracker.pending
+                else:
+                    fixed = _llm_fix(
+                        prompt,
+                        terraform_code,
+                        tfvars_code,
+                        error_output,
+                        diagnostics,
+                        report,
+                        model=model,
+                        session_id=session_id,
+                        cancel_event=cancel_event,
+                    )
+                    if fixed is None:
+                        result.error_message = "Failed to fix Terraform code"
+                        return result
+                    fix = fix_tracker.learn(
+                        error_output,
+                        terraform_code,
+                        fixed[0],
+                        time.monotonic() - fix_started,
+                        diagnostics,
+                    )
+
+                terraform_code, tfvars_code = fixed
 
                 # Update component with fixed code
                 component.terraform_code = terraform_code
@@ -444,11 +821,29 @@ def create_component(
                 # Store the fixed code in result
                 result.terraform_code = terraform_code
                 result.tfvars_code = tfvars_code
-                result.fixed_errors.append({"attempt": attempt, "error": error_output})
+                result.fixed_errors.append(
+                    {
+                        "attempt": attempt,
+                        "error": error_output,
+                        "fix_source": fix.source,
+                        "duration": fix.duration,
+                        "time_saved": 0.0,
+                        "hit_rate": 0.0,
+                    }
+                )
+                report("fixed", terraform_code=terraform_code, tfvars_code=tfvars_code)
 
+        except ProcessCancelledError:
+            report("cancelled")
+            if not keep_on_failure:
+                with scheduler.operation(component.module_dir, "cleanup"):
+                    TerraformComponentManager.cleanup_component(component)
+            result.error_message = "Component creation was cancelled"
+            return result
         except Exception as e:
             if not keep_on_failure:
-                TerraformComponentManager.cleanup_component(component)
+                with scheduler.operation(component.module_dir, "cleanup"):
+                    TerraformComponentManager.cleanup_component(component)
             result.error_message = f"An unexpected error occurred: {str(e)}"
             return result
 
@@ -462,6 +857,213 @@ def create_component(
     return result
 
 
+def _llm_fix(
+    prompt: str,
+    terraform_code: str,
+    tfvars_code: str,
+    error_output: str,
+    diagnostics: Optional[List[Diagnostic]],
+    report: Callable[..., None],
+    model: str,
+    session_id: Optional[str] = None,
+    cancel_event: Optional[threading.Event] = None,
+) -> Optional[Tuple[str, str]]:
+    """Ask the model to fix the code, streaming its response as `fix_progress`.
+
+    Patches that do not apply fall back to a full rewrite of the code.
+
+    Returns:
+        The fixed terraform and tfvars code, or None if the model gave no code
+    """
+    fix_mode = get_fix_mode()
+    for mode in [fix_mode, "full"] if fix_mode == "patch" else [fix_mode]:
+        if mode != fix_mode:
+            logger.info("Fix patch did not apply, requesting a full rewrite")
+        blocks = _consume_stream(
+            fix_terraform_stream(
+                prompt,
+                terraform_code,
+                tfvars_code,
+                error_output,
+                model=model,
+                session_id=session_id,
+                mode=mode,
+                diagnostics=diagnostics,
+            ),
+            report,
+            "fix_progress",
+            cancel_event=cancel_event,
+        )
+        fixed = apply_fix(blocks, terraform_code, tfvars_code)
+        if fixed is not None:
+            return fixed
+    return None
+
+
+def _raise_if_cancelled(cancel_event: Optional[threading.Event]) -> None:
+    """Stop the creation between two of its stages once it was cancelled."""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ProcessCancelledError("Error: component creation cancelled")
+
+
+def _record_fix_outcome(
+    result: ComponentCreationResult, fix: Optional[AppliedFix]
+) -> None:
+    """Store the time saved by the last fix once it is known to have worked."""
+    if fix is not None and result.fixed_errors:
+        result.fixed_errors[-1]["time_saved"] = fix.time_saved
+        result.fixed_errors[-1]["hit_rate"] = fix.hit_rate
+
+
+def _post_plan_graph(
+    terraform_wrapper: TerraformWrapper,
+    component: TerraformComponent,
+    plan_output: str,
+    plan_file: str,
+    result: ComponentCreationResult,
+    report: Callable[..., None],
+    session_id: Optional[str] = None,
+) -> TaskGraph:
+    """Build the graph of the pipeline stages that follow a successful plan.
+
+    The plan summary only depends on the JSON plan and the diagram only on the
+    terraform code, so both run while the saved plan is applied. Outputs are
+    fetched once apply completes, then formatted. Each stage stores its result
+    in `result`; only applying and fetching outputs are required to succeed.
+    """
+
+    def summarize(plan_json: Optional[Dict[str, Any]]) -> None:
+        report("summarizing")
+        summary = summarize_terraform_plan(plan_output, plan_json)
+        if summary:
+            result.plan_summary = summary
+        report("planned", plan_summary=result.plan_summary)
+
+    def apply() -> None:
+        # Apply the changes - skipping confirmation since we're in a service
+        report("applying")
+        logger.debug("Applying terraform changes")
+        result.apply_output = terraform_wrapper.apply(
+            component,
+            plan_file=plan_file,
+            on_event=lambda event: _report_terraform_event(report, event),
+        )
+        report("applied")
+
+    def show_plan() -> Optional[Dict[str, Any]]:
+        try:
+            result.plan_json = terraform_wrapper.show_plan_json(plan_file, component)
+        except Exception as e:
+            # Still report the plan, without its summary
+            logger.warning(f"Failed to convert the plan to JSON: {str(e)}")
+            return None
+        return result.plan_json
+
+    def fetch_outputs(apply: None) -> Dict[str, Any]:
+        report("fetching_outputs")
+        result.outputs = terraform_wrapper.get_outputs(component)
+        report("outputs", outputs=result.outputs)
+        return result.outputs
+
+    def format_outputs(outputs: Dict[str, Any]) -> None:
+        report("formatting_outputs")
+        result.formatted_outputs = ai_format_output(outputs)
+        report("formatted_outputs", formatted_outputs=result.formatted_outputs)
+
+    def diagram() -> None:
+        report("generating_diagram")
+        # Generate diagram in a temporary file of this attempt
+        temp_diagram_path = os.path.join(
+            component.workdir, f"{component.name}_diagram_{uuid.uuid4().hex}.jpg"
+        )
+        generate_diagram(
+            component.terraform_code, temp_diagram_path, session_id=session_id
+        )
+
+        # Convert diagram to base64
+        with open(temp_diagram_path, "rb") as f:
+            result.diagram = base64.b64encode(f.read()).decode()
+
+        # Clean up temporary file
+        os.remove(temp_diagram_path)
+        report("diagram", diagram=result.diagram)
+
+    graph = TaskGraph()
+    graph.add("plan_json", show_plan, required=False)
+    graph.add("summary", summarize, deps=["plan_json"], required=False)
+    graph.add("apply", apply)
+    graph.add("outputs", fetch_outputs, deps=["apply"])
+    graph.add("formatted_outputs", format_outputs, deps=["outputs"], required=False)
+    if os.getenv("GENERATE_DIAGRAM", "false").lower() == "true":
+        graph.add("diagram", diagram, required=False)
+    return graph
+
+
+def _report_terraform_event(report: Callable[..., None], event: TerraformEvent) -> None:
+    """Report the progress carried by a terraform event, if any."""
+    if isinstance(event, ResourceEvent) and event.type in (
+        "apply_start",
+        "apply_complete",
+        "apply_errored",
+    ):
+        report(
+            "resource_progress",
+            address=event.address,
+            action=event.action,
+            status=event.type[len("apply_") :],
+            elapsed_seconds=event.elapsed_seconds,
+        )
+    elif isinstance(event, ChangeSummaryEvent) and event.summary:
+        report(
+            "change_summary",
+            operation=event.summary.operation,
+            add=event.summary.add,
+            change=event.summary.change,
+            remove=event.summary.remove,
+        )
+
+
+def _consume_stream(
+    chunks: Iterable[str],
+    report: Callable[..., None],
+    stage: str,
+    cancel_event: Optional[threading.Event] = None,
+) -> Dict[str, str]:
+    """Parse the code blocks of a streamed LLM response as it arrives.
+
+    The new text is reported at most once every STREAM_REPORT_INTERVAL seconds
+    as `delta`, and each code block is reported as a `code_block` event as soon
+    as its closing fence is received, before the rest of the response.
+
+    Returns:
+        Dict[str, str]: Content of the response code blocks, keyed by title
+
+    Raises:
+        ProcessCancelledError: If `cancel_event` is set while streaming; the
+            rest of the response is not read
+    """
+    parser = CodeBlockStreamParser()
+    pending: List[str] = []
+    last_report = time.monotonic()
+    for chunk in chunks:
+        if cancel_event is not None and cancel_event.is_set():
+            if hasattr(chunks, "close"):
+                chunks.close()
+            raise ProcessCancelledError("Error: component creation cancelled")
+        pending.append(chunk)
+        for title, content in parser.feed(chunk):
+            report("code_block", title=title, content=content)
+        if time.monotonic() - last_report >= STREAM_REPORT_INTERVAL:
+            report(stage, delta="".join(pending))
+            pending = []
+            last_report = time.monotonic()
+    if pending:
+        report(stage, delta="".join(pending))
+    for title, content in parser.close():
+        report("code_block", title=title, content=content)
+    return parser.blocks
+
+
 def list_projects(parent_dir: str = ".") -> ListProjectsResponse:
     """
     List all InfraBot projects in the specified directory.
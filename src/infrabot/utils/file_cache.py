@@ -1,107 +1,446 @@
+"""Cache of function results in memory and on disk.
+
+Results are keyed by a blake2b hash of a canonical encoding of the function's
+arguments and source code. Each decorated function gets its own directory of
+pickles, sharded by the first characters of the key, fronted by an in-process
+LRU of the pickles of the most recent results, so that callers always get
+their own copy of a cached value. Files are written atomically so concurrent
+workers never read partial pickles, and entries are evicted once they are
+older than the TTL or the directory grows beyond its maximum size.
+"""
+
 import functools
 import hashlib
 import inspect
+import logging
 import os
 import pickle
-import logging
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, List, Optional, Tuple
+
+logger = logging.getLogger("infrabot.file_cache")
+
+DEFAULT_CACHE_DIR = ".cache/file_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MEMORY_ENTRIES = 128
+# Number of hex characters of the key naming the shard directory of an entry
+SHARD_CHARS = 2
+CACHE_EXTENSION = ".pickle"
+
+
+def get_cache_dir() -> str:
+    """Get the root directory of the cache, overridden by INFRABOT_FILE_CACHE_DIR."""
+    return os.getenv("INFRABOT_FILE_CACHE_DIR") or DEFAULT_CACHE_DIR
+
+
+def get_cache_ttl() -> Optional[float]:
+    """Get the lifetime of entries in seconds, from INFRABOT_FILE_CACHE_TTL.
+
+    Entries never expire by default, or when it is 0.
+    """
+    ttl = float(os.getenv("INFRABOT_FILE_CACHE_TTL") or 0)
+    return ttl if ttl > 0 else None
+
+
+def get_cache_max_bytes() -> Optional[int]:
+    """Get the maximum size of each function's cache directory.
+
+    Defaults to 256 MiB, overridden by INFRABOT_FILE_CACHE_MAX_BYTES (0 for
+    no limit).
+    """
+    max_bytes = os.getenv("INFRABOT_FILE_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return DEFAULT_MAX_BYTES
+    return int(max_bytes) or None
 
-# Create a logger instance
-logger = logging.getLogger("website-creator")
 
+class UnhashableArgument(TypeError):
+    """Raised when an argument has no canonical encoding to hash."""
 
-MAX_DEPTH = 6
 
+def hash_key(*values: Any, ignore: Collection[str] = ()) -> str:
+    """Hash values into a cache key.
 
-def recursive_hash(value, depth=0, ignore_params=[]):
-    """Hash primitives recursively with maximum depth."""
-    if depth > MAX_DEPTH:
-        return hashlib.md5("max_depth_reached".encode()).hexdigest()
+    Equal values always give the same key: dicts and sets are hashed
+    independently of their order, and objects by their class and attributes.
 
-    if isinstance(value, (int, float, str, bool, bytes)):
-        return hashlib.md5(str(value).encode()).hexdigest()
-    elif isinstance(value, (list, tuple)):
-        return hashlib.md5(
-            "".join(
-                [recursive_hash(item, depth + 1, ignore_params) for item in value]
-            ).encode()
-        ).hexdigest()
+    Args:
+        values: Values to hash
+        ignore: Dict keys and class names skipped at any depth
+
+    Raises:
+        UnhashableArgument: If a value cannot be encoded, instead of letting
+            distinct values share a key
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for value in values:
+        _encode(value, hasher.update, set(), frozenset(ignore))
+    return hasher.hexdigest()
+
+
+def _encode(
+    value: Any, write: Callable[[bytes], None], active: set, ignore: frozenset
+) -> None:
+    """Write a canonical, type-tagged and length-prefixed encoding of `value`."""
+
+    def chunk(tag: bytes, data: bytes) -> None:
+        write(tag + struct.pack(">Q", len(data)) + data)
+
+    if value is None:
+        write(b"N")
+    elif isinstance(value, bool):
+        write(b"T" if value else b"F")
+    elif isinstance(value, int):
+        chunk(b"i", str(value).encode())
+    elif isinstance(value, float):
+        chunk(b"f", repr(value).encode())
+    elif isinstance(value, str):
+        chunk(b"s", value.encode("utf-8", "surrogatepass"))
+    elif isinstance(value, (bytes, bytearray)):
+        chunk(b"b", bytes(value))
+    else:
+        if id(value) in active:
+            raise UnhashableArgument("Cannot hash self-referencing values")
+        active.add(id(value))
+        try:
+            _encode_container(value, write, active, ignore, chunk)
+        finally:
+            active.discard(id(value))
+
+
+def _encode_container(
+    value: Any,
+    write: Callable[[bytes], None],
+    active: set,
+    ignore: frozenset,
+    chunk: Callable[[bytes, bytes], None],
+) -> None:
+    def sub_hash(item: Any) -> bytes:
+        hasher = hashlib.blake2b(digest_size=20)
+        _encode(item, hasher.update, active, ignore)
+        return hasher.digest()
+
+    if isinstance(value, (list, tuple)):
+        chunk(b"l" if isinstance(value, list) else b"t", str(len(value)).encode())
+        for item in value:
+            _encode(item, write, active, ignore)
     elif isinstance(value, dict):
-        return hashlib.md5(
-            "".join(
-                [
-                    recursive_hash(key, depth + 1, ignore_params)
-                    + recursive_hash(val, depth + 1, ignore_params)
-                    for key, val in value.items()
-                    if key not in ignore_params
-                ]
-            ).encode()
-        ).hexdigest()
-    elif hasattr(value, "__dict__") and value.__class__.__name__ not in ignore_params:
-        return recursive_hash(value.__dict__, depth + 1, ignore_params)
+        # Order-independent: entries are sorted by the hash of their key
+        items = sorted(
+            (sub_hash(key), val) for key, val in value.items() if key not in ignore
+        )
+        chunk(b"d", str(len(items)).encode())
+        for key_hash, val in items:
+            write(key_hash)
+            _encode(val, write, active, ignore)
+    elif isinstance(value, (set, frozenset)):
+        chunk(b"S", b"".join(sorted(sub_hash(item) for item in value)))
+    elif type(value).__name__ in ignore:
+        write(b"I")
+    elif hasattr(value, "__dict__") and not callable(value):
+        cls = type(value)
+        chunk(b"o", f"{cls.__module__}.{cls.__qualname__}".encode())
+        _encode(vars(value), write, active, ignore)
     else:
-        return hashlib.md5("unknown".encode()).hexdigest()
+        raise UnhashableArgument(f"Cannot hash value of type {type(value).__name__}")
+
+
+@dataclass
+class CacheStats:
+    """Counters of a cache."""
 
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    evictions: int = 0
 
-def hash_code(code):
-    return hashlib.md5(code.encode()).hexdigest()
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
 
 
-def file_cache(ignore_params=[], verbose=False):
+class FileCache:
+    """Pickled values on disk, sharded by key, with an in-memory LRU in front.
+
+    Args:
+        directory: Directory of the cache
+        ttl: Seconds after which entries expire, None to keep them forever
+        max_bytes: Maximum size of the pickles on disk, None for no limit
+        memory_entries: Number of values kept in memory
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.stats = CacheStats()
+        self._memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Size of the pickles on disk, scanned on the first write
+        self._disk_bytes: Optional[int] = None
+
+    def path(self, key: str) -> str:
+        """Path of the pickle of an entry."""
+        return os.path.join(
+            self.directory, key[:SHARD_CHARS], f"{key}{CACHE_EXTENSION}"
+        )
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Get a cached value.
+
+        Returns:
+            Tuple[bool, Any]: Whether the key was found, and its value
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.stats.memory_hits += 1
+            else:
+                self._memory.pop(key, None)
+                entry = None
+        if entry is not None:
+            return True, pickle.loads(entry[1])
+
+        path = self.path(key)
+        try:
+            created_at = os.path.getmtime(path)
+            if self._expired(created_at, now):
+                self._remove(path)
+                raise FileNotFoundError(path)
+            with open(path, "rb") as f:
+                data = f.read()
+            value = pickle.loads(data)
+        except FileNotFoundError:
+            with self._lock:
+                self.stats.misses += 1
+            return False, None
+        except Exception as e:
+            logger.info(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            with self._lock:
+                self.stats.misses += 1
+            return False, None
+
+        with self._lock:
+            self.stats.disk_hits += 1
+            self._remember(key, created_at, data)
+        return True, value
+
+    def set(self, key: str, value: Any) -> None:
+        """Cache a value, evicting old entries if the cache grew too large."""
+        path = self.path(key)
+        try:
+            data = pickle.dumps(value)
+        except Exception as e:
+            logger.info(f"Pickling failed: {str(e)}")
+            return
+        with self._lock:
+            self._remember(key, time.time(), data)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Size of the entry being overwritten, no longer on disk once replaced
+            try:
+                replaced_bytes = os.path.getsize(path)
+            except OSError:
+                replaced_bytes = 0
+            # Rename a complete file into place so readers never see a partial one
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                self._remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.info(f"Failed to write cache entry {path}: {str(e)}")
+            return
+
+        if self.max_bytes is not None:
+            with self._lock:
+                if self._disk_bytes is not None:
+                    self._disk_bytes += len(data) - replaced_bytes
+                over_limit = (
+                    self._disk_bytes is None or self._disk_bytes > self.max_bytes
+                )
+            if over_limit:
+                self.evict()
+
+    def evict(self) -> int:
+        """Remove expired entries, then the oldest ones beyond the maximum size.
+
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.time()
+        entries: List[Tuple[float, int, str]] = []
+        for shard in _list_dir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            for name in _list_dir(shard_dir):
+                if not name.endswith(CACHE_EXTENSION):
+                    continue
+                path = os.path.join(shard_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for created_at, size, path in entries:
+            over_limit = self.max_bytes is not None and total > self.max_bytes
+            if not over_limit and not self._expired(created_at, now):
+                continue
+            self._remove(path)
+            total -= size
+            removed += 1
+
+        with self._lock:
+            self._disk_bytes = total
+            self.stats.evictions += removed
+        return removed
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        with self._lock:
+            self._memory.clear()
+        for shard in _list_dir(self.directory):
+            shard_dir = os.path.join(self.directory, shard)
+            for name in _list_dir(shard_dir):
+                self._remove(os.path.join(shard_dir, name))
+        with self._lock:
+            self._disk_bytes = 0
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl is not None and now - created_at > self.ttl
+
+    def _remember(self, key: str, created_at: float, data: bytes) -> None:
+        self._memory[key] = (created_at, data)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _list_dir(path: str) -> List[str]:
+    try:
+        return os.listdir(path)
+    except OSError:
+        return []
+
+
+def _source_hash(func: Callable) -> str:
+    """Hash the source of a function, so that changing it invalidates its cache."""
+    try:
+        source = inspect.getsource(func).encode()
+    except (OSError, TypeError):
+        source = getattr(getattr(func, "__code__", None), "co_code", b"")
+    return hashlib.blake2b(source, digest_size=20).hexdigest()
+
+
+def file_cache(
+    ignore_params: List[str] = [],
+    verbose: bool = False,
+    ttl: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+    memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+):
     """Decorator to cache function output based on its inputs, ignoring specified parameters.
     Ignore parameters are used to avoid caching on non-deterministic inputs, such as timestamps.
     We can also ignore parameters that are slow to serialize/constant across runs, such as large objects.
+
+    Each function is cached in its own directory under INFRABOT_FILE_CACHE_DIR.
+    `ttl` and `max_bytes` default to INFRABOT_FILE_CACHE_TTL and
+    INFRABOT_FILE_CACHE_MAX_BYTES. Calls whose arguments cannot be hashed are
+    not cached. The decorated function has `cache_info()` returning its
+    CacheStats and `cache_clear()`.
     """
 
     def decorator(func):
-        func_source_code_hash = hash_code(inspect.getsource(func))
+        func_source_code_hash = _source_hash(func)
+        signature = inspect.signature(func)
+        namespace = f"{func.__module__}.{func.__qualname__}"
+        caches = {}
+        caches_lock = threading.Lock()
+
+        def get_cache() -> FileCache:
+            directory = os.path.join(get_cache_dir(), namespace)
+            with caches_lock:
+                if directory not in caches:
+                    caches[directory] = FileCache(
+                        directory,
+                        ttl=ttl if ttl is not None else get_cache_ttl(),
+                        max_bytes=(
+                            max_bytes
+                            if max_bytes is not None
+                            else get_cache_max_bytes()
+                        ),
+                        memory_entries=memory_entries,
+                    )
+                return caches[directory]
 
         @functools.wraps(func)
         def wrapper(*args, _n_attempt_cache_id: int = 0, **kwargs):
-            cache_dir = ".cache/file_cache"
-            os.makedirs(cache_dir, exist_ok=True)
-
-            # Convert args to a dictionary based on the function's signature
-            _func = getattr(func, "__wrapped__", None) or func
-            args_names = _func.__code__.co_varnames[: _func.__code__.co_argcount]
-            args_dict = dict(zip(args_names, args))
-
-            # Remove ignored params
-            kwargs_clone = kwargs.copy()
-            for param in ignore_params:
-                args_dict.pop(param, None)
-                kwargs_clone.pop(param, None)
-
-            kwargs_clone["_n_attempt_cache_id"] = _n_attempt_cache_id
-
-            # Create hash based on argument names, argument values, and function source code
-            arg_hash = (
-                recursive_hash(args_dict, ignore_params=ignore_params)
-                + recursive_hash(kwargs_clone, ignore_params=ignore_params)
-                + func_source_code_hash
-            )
-            cache_file = os.path.join(
-                cache_dir, f"{func.__module__}_{func.__name__}_{arg_hash}.pickle"
-            )
+            # Name all arguments, so that positional, keyword and default
+            # arguments with the same value share a key
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError:
+                return func(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = {
+                name: value
+                for name, value in bound.arguments.items()
+                if name not in ignore_params
+            }
 
             try:
-                # If cache exists, load and return it
-                if os.path.exists(cache_file):
-                    if verbose:
-                        print("Used cache for function: " + func.__name__)
-                    with open(cache_file, "rb") as f:
-                        return pickle.load(f)
-            except Exception:
-                logger.info("Unpickling failed")
-
-            # Otherwise, call the function and save its result to the cache
+                key = hash_key(
+                    arguments,
+                    _n_attempt_cache_id,
+                    func_source_code_hash,
+                    ignore=ignore_params,
+                )
+            except UnhashableArgument as e:
+                logger.debug(f"Not caching {namespace}: {str(e)}")
+                return func(*args, **kwargs)
+
+            cache = get_cache()
+            found, result = cache.get(key)
+            if found:
+                if verbose:
+                    print("Used cache for function: " + func.__name__)
+                return result
+
             result = func(*args, **kwargs)
-            try:
-                with open(cache_file, "wb") as f:
-                    pickle.dump(result, f)
-            except Exception as e:
-                logger.info(f"Pickling failed: {e}")
+            cache.set(key, result)
             return result
 
+        wrapper.cache_info = lambda: get_cache().stats
+        wrapper.cache_clear = lambda: get_cache().clear()
         return wrapper
 
     return decorator
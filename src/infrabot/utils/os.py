@@ -16,6 +16,12 @@ def get_package_directory(package_name: str) -> str:
         raise ValueError(f"Package '{package_name}' not found")
 
 
+def get_terraform_assets_dir() -> str:
+    """Get the directory holding the terraform boilerplate assets."""
+    package_dir = get_package_directory("infrabot")
+    return os.path.join(package_dir, "../../assets/terraform/")
+
+
 def copy_assets(
     source_dir: str, destination_dir: str, whitelist: Optional[list[str]] = None
 ) -> None:
@@ -1,10 +1,87 @@
 """Utilities for formatting and displaying outputs."""
 
 import json
+from typing import Any, Dict
+
 from rich import print as rprint
 from rich.panel import Panel
 from rich.text import Text
 
+# Shown instead of the value of sensitive outputs
+SENSITIVE_PLACEHOLDER = "(sensitive value)"
+
+
+def format_output_value(output_data: Dict[str, Any]) -> str:
+    """Format the value of a terraform output, masking sensitive values.
+
+    Args:
+        output_data (dict): Output as returned by `terraform output -json`
+
+    Returns:
+        str: The value, pretty-printed as JSON if it is nested
+    """
+    if output_data.get("sensitive"):
+        return SENSITIVE_PLACEHOLDER
+
+    value = output_data.get("value")
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, indent=2)
+    return str(value)
+
+
+def mask_sensitive_outputs(outputs: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace the values of sensitive outputs with a placeholder.
+
+    Args:
+        outputs (dict): Dictionary of terraform outputs
+
+    Returns:
+        dict: A copy of the outputs, safe to display or send to a model
+    """
+    return {
+        name: (
+            {**data, "value": SENSITIVE_PLACEHOLDER}
+            if isinstance(data, dict) and data.get("sensitive")
+            else data
+        )
+        for name, data in outputs.items()
+    }
+
+
+def render_outputs_markdown(outputs: Dict[str, Any]) -> str:
+    """Render terraform outputs as a markdown document.
+
+    Args:
+        outputs (dict): Dictionary of terraform outputs containing value and description
+
+    Returns:
+        str: A section per output with its description and value
+    """
+    if not outputs:
+        return "No outputs available."
+
+    sections = ["# Terraform Outputs"]
+    for output_name, output_data in outputs.items():
+        if not isinstance(output_data, dict):
+            output_data = {"value": output_data}
+        section = f"## {output_name}\n\n"
+        description = output_data.get("description", "")
+        if description:
+            section += f"_{description}_\n\n"
+
+        value_str = format_output_value(output_data)
+        value = output_data.get("value")
+        if output_data.get("sensitive"):
+            section += value_str
+        elif isinstance(value, (dict, list)):
+            section += f"```json\n{value_str}\n```"
+        elif "\n" in value_str or "`" in value_str:
+            section += f"```\n{value_str}\n```"
+        else:
+            section += f"`{value_str}`"
+        sections.append(section)
+    return "\n\n".join(sections) + "\n"
+
 
 def display_terraform_outputs(outputs):
     """Display terraform outputs in a nicely formatted way.
@@ -17,7 +94,6 @@ def display_terraform_outputs(outputs):
 
     rprint("\n[bold]Resource Outputs:[/bold]")
     for output_name, output_data in outputs.items():
-        value = output_data.get("value")
         description = output_data.get("description", "")
 
         # Create a formatted panel for each output
@@ -25,13 +101,7 @@ def display_terraform_outputs(outputs):
         if description:
             output_text.append(f"{description}\n", style="italic")
 
-        # Format the value based on type
-        if isinstance(value, (dict, list)):
-            value_str = json.dumps(value, indent=2)
-        else:
-            value_str = str(value)
-
-        output_text.append(value_str, style="bold green")
+        output_text.append(format_output_value(output_data), style="bold green")
 
         rprint(
             Panel(output_text, title=f"[blue]{output_name}[/blue]", border_style="blue")
@@ -1,5 +1,9 @@
 import re
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+
+FENCE = "```"
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
 
 
 def extract_code_blocks(text: str, title: Optional[str] = None) -> List[str]:
@@ -36,6 +40,144 @@ def extract_code_blocks(text: str, title: Optional[str] = None) -> List[str]:
     return results
 
 
+class CodeBlockStreamParser:
+    """
+    Incrementally extract code blocks from a streamed LLM response.
+
+    Chunks are fed as they arrive. Content between <think></think> tags (from
+    reasoning models) is dropped, and each ```{title}\n<content>``` block is
+    emitted as soon as its closing fence is received. The first block of each
+    title is kept in `blocks`, keyed by lowercased title, mirroring
+    `extract_code_blocks`.
+    """
+
+    def __init__(self):
+        self.blocks: Dict[str, str] = {}
+        self._pending = ""  # raw text not yet checked for <think> tags
+        self._thinking = False
+        self._think_buffer = ""
+        self._text = ""  # text outside <think> tags not yet parsed
+        self._title: Optional[str] = None  # title of the block being read
+        self._in_block = False
+        self._scan_from = 0  # where to resume looking for the closing fence
+        self._closed = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        """
+        Feed a chunk of the response.
+
+        Args:
+            chunk (str): Next piece of the streamed response
+
+        Returns:
+            List[Tuple[str, str]]: (title, content) of each block completed by this chunk
+        """
+        self._pending += chunk
+        self._strip_think(final=False)
+        return self._parse()
+
+    def close(self) -> List[Tuple[str, str]]:
+        """
+        Signal the end of the stream.
+
+        An unterminated <think> section is kept as regular text, like the
+        regex based stripping does.
+
+        Returns:
+            List[Tuple[str, str]]: (title, content) of the blocks completed at the end
+        """
+        if self._closed:
+            return []
+        self._closed = True
+        self._strip_think(final=True)
+        return self._parse()
+
+    def _strip_think(self, final: bool) -> None:
+        """Move text from the pending buffer to the parse buffer, dropping thoughts."""
+        while self._pending:
+            tag = THINK_CLOSE if self._thinking else THINK_OPEN
+            index = self._pending.find(tag)
+            if index >= 0:
+                if self._thinking:
+                    self._think_buffer = ""
+                else:
+                    self._text += self._pending[:index]
+                    self._think_buffer = THINK_OPEN
+                self._pending = self._pending[index + len(tag) :]
+                self._thinking = not self._thinking
+                continue
+
+            # Hold back a possible partial tag at the end of the buffer
+            keep = 0 if final else _partial_suffix_length(self._pending, tag)
+            released = self._pending[: len(self._pending) - keep]
+            self._pending = self._pending[len(self._pending) - keep :]
+            if self._thinking:
+                self._think_buffer += released
+            else:
+                self._text += released
+            break
+
+        if final and self._thinking:
+            self._thinking = False
+            self._text += self._think_buffer
+            self._think_buffer = ""
+
+    def _parse(self) -> List[Tuple[str, str]]:
+        """Extract the blocks completed in the parse buffer."""
+        completed = []
+        while True:
+            if not self._in_block:
+                index = self._text.find(FENCE)
+                if index < 0:
+                    # Only a partial fence at the end can still matter
+                    self._text = self._text[-(len(FENCE) - 1) :]
+                    break
+                header_end = self._text.find("\n", index + len(FENCE))
+                if header_end < 0:
+                    self._text = self._text[index:]
+                    break
+                self._title = self._text[index + len(FENCE) : header_end].strip()
+                self._text = self._text[header_end + 1 :]
+                self._in_block = True
+            else:
+                index = self._text.find(FENCE, self._scan_from)
+                if index < 0:
+                    self._scan_from = max(0, len(self._text) - (len(FENCE) - 1))
+                    break
+                self._scan_from = 0
+                title, content = self._title, self._text[:index].strip()
+                self._text = self._text[index + len(FENCE) :]
+                self._in_block = False
+                self._title = None
+                self.blocks.setdefault(title.lower(), content)
+                completed.append((title, content))
+        return completed
+
+
+def parse_code_blocks(text: str) -> Dict[str, str]:
+    """
+    Extract all code blocks of a complete response in a single pass.
+
+    Args:
+        text (str): The input text containing code blocks
+
+    Returns:
+        Dict[str, str]: Content of the first block of each title, keyed by lowercased title
+    """
+    parser = CodeBlockStreamParser()
+    parser.feed(text)
+    parser.close()
+    return parser.blocks
+
+
+def _partial_suffix_length(text: str, token: str) -> int:
+    """Length of the longest suffix of `text` that is a proper prefix of `token`."""
+    for length in range(min(len(token) - 1, len(text)), 0, -1):
+        if token.startswith(text[-length:]):
+            return length
+    return 0
+
+
 # Test the function
 if __name__ == "__main__":
     sample_text = """```terraform
@@ -0,0 +1,74 @@
+"""Local summaries of Terraform plans."""
+
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+# Order and wording of the summarized actions
+ACTION_LABELS: List[Tuple[str, str]] = [
+    ("create", "Create"),
+    ("update", "Update"),
+    ("replace", "Replace"),
+    ("delete", "Destroy"),
+    ("forget", "Forget"),
+]
+
+
+def plan_action(actions: List[str]) -> str:
+    """Reduce the actions of a resource change to a single action.
+
+    Args:
+        actions: Actions of a resource change in `terraform show -json` output,
+            e.g. ["create"] or ["delete", "create"]
+
+    Returns:
+        str: create, update, replace, delete, forget, read or no-op
+    """
+    if "delete" in actions and "create" in actions:
+        return "replace"
+    if len(actions) == 1:
+        return actions[0]
+    return "no-op"
+
+
+def summarize_plan_json(plan_json: Dict[str, Any]) -> str:
+    """Render the changes of a plan as a bullet list grouped by resource type.
+
+    Args:
+        plan_json: The plan as output by `terraform show -json`
+
+    Returns:
+        str: One bullet per action and resource type, e.g.
+            "- Create 2 aws_s3_bucket: logs, assets", or "No changes."
+    """
+    # action -> resource type -> resource names
+    changes: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+    for resource_change in plan_json.get("resource_changes") or []:
+        if resource_change.get("mode") == "data":
+            continue
+        action = plan_action(resource_change.get("change", {}).get("actions", []))
+        resource_type = resource_change.get("type", "")
+        changes[action][resource_type].append(_resource_name(resource_change))
+
+    lines = []
+    for action, label in ACTION_LABELS:
+        for resource_type, names in sorted(changes.get(action, {}).items()):
+            lines.append(f"- {label} {len(names)} {resource_type}: {', '.join(names)}")
+
+    output_changes = [
+        name
+        for name, change in (plan_json.get("output_changes") or {}).items()
+        if plan_action(change.get("actions", [])) not in ("no-op", "read")
+    ]
+    if output_changes:
+        lines.append(f"- Outputs: {', '.join(sorted(output_changes))}")
+
+    return "\n".join(lines) if lines else "No changes."
+
+
+def _resource_name(resource_change: Dict[str, Any]) -> str:
+    """Name of a resource within its type, keeping its module and instance key."""
+    address = resource_change.get("address", "")
+    prefix = f"{resource_change.get('type', '')}."
+    if address.startswith(prefix):
+        return address[len(prefix) :]
+    return address
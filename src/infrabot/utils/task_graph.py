@@ -0,0 +1,121 @@
+"""Run small dependency graphs of blocking tasks concurrently."""
+
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Task:
+    name: str
+    fn: Callable[..., Any]
+    deps: List[str] = field(default_factory=list)
+    required: bool = True
+
+
+class TaskGraph:
+    """A set of named tasks where each task starts once its dependencies are done.
+
+    Independent tasks run concurrently on a dedicated thread pool. A task is
+    called with the results of its dependencies as keyword arguments, and fails
+    with the same exception if one of them failed.
+
+    Example:
+        graph = TaskGraph()
+        graph.add("apply", lambda: wrapper.apply())
+        graph.add("outputs", lambda apply: wrapper.get_outputs(), deps=["apply"])
+        graph.add("summary", lambda: summarize(plan), required=False)
+        graph.start()
+        outputs = graph.wait("outputs")
+        results = graph.wait_all()
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, _Task] = {}
+        self._futures: Dict[str, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[..., Any],
+        deps: Optional[List[str]] = None,
+        required: bool = True,
+    ) -> None:
+        """Add a task to the graph.
+
+        Args:
+            name: Unique name of the task, also the keyword its result is passed as
+            fn: Callable receiving the results of `deps` as keyword arguments
+            deps: Names of the tasks that must complete first
+            required: Whether a failure of this task fails the whole graph
+        """
+        if self._executor is not None:
+            raise RuntimeError("Cannot add tasks to a graph that already started")
+        if name in self._tasks:
+            raise ValueError(f"Task '{name}' already exists")
+        for dep in deps or []:
+            if dep not in self._tasks:
+                raise ValueError(f"Unknown dependency '{dep}' for task '{name}'")
+        self._tasks[name] = _Task(name, fn, list(deps or []), required)
+
+    def start(self) -> None:
+        """Start running the tasks in the background."""
+        # One worker per task: tasks waiting on their dependencies never starve others
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self._tasks)), thread_name_prefix="infrabot-task"
+        )
+        # Dependencies are always added first, so their futures already exist
+        for task in self._tasks.values():
+            self._futures[task.name] = self._executor.submit(self._run_task, task)
+
+    def wait(self, name: str) -> Any:
+        """Wait for a task and return its result, raising its exception if it failed."""
+        return self._futures[name].result()
+
+    def join(self, *names: str) -> None:
+        """Wait for tasks to finish, or be cancelled, whether they failed or not.
+
+        Args:
+            names: Names of the tasks to wait for, all tasks if none is given
+        """
+        wait_futures([self._futures[name] for name in names or self._futures])
+
+    def wait_all(self) -> Dict[str, Any]:
+        """Wait for all tasks.
+
+        Returns:
+            dict: Result of each task, None for optional tasks that failed
+
+        Raises:
+            Exception: The exception of the first required task that failed
+        """
+        results = {}
+        error = None
+        try:
+            for name, task in self._tasks.items():
+                try:
+                    results[name] = self._futures[name].result()
+                except Exception as e:
+                    if task.required:
+                        error = error or e
+                    else:
+                        logger.warning(f"Optional task '{name}' failed: {str(e)}")
+                    results[name] = None
+        finally:
+            self.shutdown()
+        if error is not None:
+            raise error
+        return results
+
+    def shutdown(self) -> None:
+        """Cancel tasks that did not start yet and release the thread pool."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_task(self, task: _Task) -> Any:
+        kwargs = {dep: self._futures[dep].result() for dep in task.deps}
+        return task.fn(**kwargs)
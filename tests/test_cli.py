@@ -59,11 +59,17 @@ def initialized_project(runner, temp_dir, monkeypatch):
     def mock_terraform(*args, **kwargs):
         return TERRAFORM_MOCK_RESPONSE
 
+    def mock_terraform_stream(*args, **kwargs):
+        yield TERRAFORM_MOCK_RESPONSE
+
     def mock_summary(*args, **kwargs):
         return "Created S3 bucket 'mybucket'"
 
     # Use monkeypatch to replace the real function with our mock
     monkeypatch.setattr("infrabot.ai.terraform_generator.gen_terraform", mock_terraform)
+    monkeypatch.setattr(
+        "infrabot.ai.terraform_generator.gen_terraform_stream", mock_terraform_stream
+    )
     monkeypatch.setattr("infrabot.ai.summary.summarize_terraform_plan", mock_summary)
 
     from infrabot.cli import app
@@ -0,0 +1,110 @@
+"""Tests for the client of LLM completions shared by the AI modules."""
+
+import asyncio
+import threading
+
+import litellm
+import pytest
+
+from infrabot.ai import completion as completion_module
+from infrabot.ai.completion import CompletionClient, get_completion_client
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+@pytest.fixture(autouse=True)
+def restore_session(monkeypatch):
+    # Clients set litellm's session when they are created
+    monkeypatch.setattr(litellm, "client_session", None)
+
+
+@pytest.fixture
+def client():
+    client = CompletionClient(timeout=30, max_connections=4)
+    yield client
+    client.close()
+
+
+def test_completions_share_the_connection_pool(monkeypatch, client):
+    calls = []
+
+    def fake_completion(**kwargs):
+        calls.append((kwargs, litellm.client_session))
+        return "response"
+
+    monkeypatch.setattr(litellm, "completion", fake_completion)
+
+    assert client.complete("gpt-4o", MESSAGES, temperature=0.5) == "response"
+    # Completions do not set the session, another one set meanwhile is kept
+    other_session = litellm.client_session = object()
+    client.complete("gpt-4o", MESSAGES, timeout=5)
+    litellm.client_session = client.http_client
+    (first, first_session), (second, second_session) = calls
+    assert first_session is client.http_client
+    assert second_session is other_session
+    assert (first["timeout"], first["temperature"]) == (30, 0.5)
+    assert second["timeout"] == 5
+
+    client.close()
+    assert litellm.client_session is None
+
+
+def test_async_completions_use_a_client_per_event_loop(monkeypatch, client):
+    calls = []
+
+    async def fake_acompletion(**kwargs):
+        calls.append(kwargs)
+        return "response"
+
+    monkeypatch.setattr(litellm, "acompletion", fake_acompletion)
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+
+    async def complete_twice():
+        await client.acomplete("gpt-4o", MESSAGES)
+        await client.acomplete("gpt-4o", MESSAGES, timeout=5)
+        return client.async_http_client()
+
+    first_loop_client = asyncio.run(complete_twice())
+    second_loop_client = asyncio.run(complete_twice())
+    assert first_loop_client is not second_loop_client
+    http_clients = [kwargs["client"]._client for kwargs in calls]
+    assert http_clients == [first_loop_client] * 2 + [second_loop_client] * 2
+    assert [kwargs["timeout"] for kwargs in calls] == [30, 5, 30, 5]
+    # The global async session is left alone
+    assert litellm.aclient_session is None
+
+    # Other providers keep the clients litellm creates for them
+    asyncio.run(client.acomplete("claude-3-5-sonnet-20240620", MESSAGES))
+    assert "client" not in calls[-1]
+
+
+def test_shared_client_is_created_once(monkeypatch):
+    monkeypatch.setattr(completion_module, "_client", None)
+    clients = []
+    threads = [
+        threading.Thread(target=lambda: clients.append(get_completion_client()))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(client) for client in clients}) == 1
+    clients[0].close()
+
+
+def test_only_traced_completions_are_logged_to_langfuse(monkeypatch, client):
+    calls = []
+    monkeypatch.setattr(litellm, "completion", lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(completion_module, "LANGFUSE_ENABLED", True)
+
+    client.complete("gpt-4o", MESSAGES, traced=True)
+    client.complete("gpt-4o", MESSAGES)
+    traced, untraced = calls
+    assert traced["success_callback"] == traced["failure_callback"] == ["langfuse"]
+    assert "success_callback" not in untraced
+    assert "langfuse" not in litellm.success_callback
+
+    monkeypatch.setattr(completion_module, "LANGFUSE_ENABLED", False)
+    client.complete("gpt-4o", MESSAGES, traced=True)
+    assert "success_callback" not in calls[-1]
@@ -0,0 +1,108 @@
+"""Tests for the distillation of terraform errors before fixing them."""
+
+from infrabot.ai.error_context import distill_error, parse_diagnostics
+from infrabot.infra_utils.terraform_events import Diagnostic
+
+CODE = """resource "aws_s3_bucket" "logs" {
+  count  = 2
+  bucket = "logs"
+}
+
+resource "aws_iam_role" "app" {
+  name = "app"
+}
+
+data "aws_caller_identity" "current" {}
+
+output "arn" {
+  value = aws_s3_bucket.logs[0].arn
+}
+"""
+
+STDERR = """2024-05-01T10:00:00.000Z [DEBUG] provider.terraform-provider-aws: HTTP Request Sent
+2024-05-01T10:00:00.100Z [DEBUG] provider.terraform-provider-aws: HTTP Response Received
+╷
+│ Error: creating S3 Bucket (logs): BucketAlreadyExists
+│
+│   with aws_s3_bucket.logs[0],
+│   on storage.tf line 3, in resource "aws_s3_bucket" "logs":
+│    3:   bucket = "logs"
+│
+│ The requested bucket name is not available.
+╵
+╷
+│ Error: creating S3 Bucket (logs): BucketAlreadyExists
+│
+│   with aws_s3_bucket.logs[1],
+│   on storage.tf line 3, in resource "aws_s3_bucket" "logs":
+│    3:   bucket = "logs"
+│
+│ The requested bucket name is not available.
+╵
+╷
+│ Warning: Argument is deprecated
+│
+│ Use the aws_s3_bucket_acl resource instead.
+╵
+"""
+
+
+def test_parse_diagnostics():
+    diagnostics = parse_diagnostics(STDERR)
+    assert [(d.severity, d.summary) for d in diagnostics] == [
+        ("error", "creating S3 Bucket (logs): BucketAlreadyExists"),
+        ("error", "creating S3 Bucket (logs): BucketAlreadyExists"),
+        ("warning", "Argument is deprecated"),
+    ]
+    first = diagnostics[0]
+    assert first.address == "aws_s3_bucket.logs[0]"
+    assert (first.filename, first.line) == ("storage.tf", 3)
+    assert first.context == 'resource "aws_s3_bucket" "logs"'
+    assert first.code.strip() == 'bucket = "logs"'
+    assert first.detail == "The requested bucket name is not available."
+
+
+def test_distill_error():
+    context = distill_error(STDERR, CODE)
+
+    # Repeated diagnostics are merged, warnings and debug logs dropped
+    assert len(context.diagnostics) == 1
+    text = context.error_text()
+    assert "(reported 2 times)" in text
+    assert "DEBUG" not in text
+    assert "deprecated" not in text
+
+    assert [block.key for block in context.blocks] == ["resource.aws_s3_bucket.logs"]
+    excerpt = context.code_excerpt(CODE)
+    assert excerpt.startswith('resource "aws_s3_bucket" "logs" {')
+    assert "aws_iam_role" not in excerpt.split("#")[0]
+    assert excerpt.endswith(
+        "# Other blocks, unchanged: resource.aws_iam_role.app, "
+        "data.aws_caller_identity.current, output.arn"
+    )
+
+
+def test_distill_structured_diagnostics():
+    diagnostics = [
+        Diagnostic("error", "Invalid reference", line=13, code="  value = x"),
+        Diagnostic("error", "Unsupported argument", line=7, code='  name = "app"'),
+        Diagnostic("error", "No data", address="data.aws_caller_identity.current"),
+        Diagnostic("error", "Huge", detail="x" * 5000),
+    ]
+    context = distill_error("ignored", CODE, diagnostics)
+    # The first diagnostic's snippet does not match the code: another file
+    assert [block.key for block in context.blocks] == [
+        "resource.aws_iam_role.app",
+        "data.aws_caller_identity.current",
+    ]
+    assert len(context.diagnostics[-1].detail) < 2000
+    assert len(diagnostics[-1].detail) == 5000
+
+
+def test_distill_error_without_diagnostics():
+    context = distill_error("Error: terraform command timed out", CODE)
+    assert context.code_excerpt(CODE) == CODE
+    context = distill_error("unexpected failure\n" + "x" * 10000, CODE)
+    assert context.diagnostics == []
+    assert context.error_text().startswith("unexpected failure")
+    assert len(context.error_text()) < 5000
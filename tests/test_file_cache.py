@@ -0,0 +1,152 @@
+"""Tests for the cache of function results."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from infrabot.utils.file_cache import (
+    FileCache,
+    UnhashableArgument,
+    file_cache,
+    hash_key,
+)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("INFRABOT_FILE_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+class Config:
+    def __init__(self, name):
+        self.name = name
+
+
+def test_hash_key_is_canonical():
+    assert hash_key({"a": 1, "b": [1, 2]}) == hash_key({"b": [1, 2], "a": 1})
+    assert hash_key({1, 2, 3}) == hash_key({3, 2, 1})
+    assert hash_key(Config("a")) == hash_key(Config("a"))
+    assert hash_key(Config("a")) != hash_key(Config("b"))
+    # Values are tagged by type and length
+    assert hash_key(1) != hash_key("1")
+    assert hash_key(["ab", "c"]) != hash_key(["a", "bc"])
+    assert hash_key([1]) != hash_key((1,))
+
+
+def test_hash_key_ignores_nested_keys():
+    assert hash_key({"a": 1, "ts": 1}, ignore=["ts"]) == hash_key(
+        {"a": 1, "ts": 2}, ignore=["ts"]
+    )
+
+
+def test_hash_key_rejects_unknown_values():
+    with pytest.raises(UnhashableArgument):
+        hash_key(threading.Lock())
+
+
+def test_file_cache_decorator():
+    calls = []
+
+    @file_cache(ignore_params=["request_id"])
+    def add(a, b=1, request_id=None):
+        calls.append((a, b))
+        return a + b
+
+    assert add(1) == 2
+    assert add(1, b=1, request_id="x") == 2
+    assert add(a=1, request_id="y") == 2
+    assert add(2) == 3
+    assert calls == [(1, 1), (2, 1)]
+    stats = add.cache_info()
+    assert stats.hits == 2
+    assert stats.misses == 2
+
+    # Clearing drops both the memory and disk tiers
+    add.cache_clear()
+    assert add(1) == 2
+    assert len(calls) == 3
+
+
+def test_file_cache_skips_unhashable_arguments():
+    calls = []
+
+    @file_cache()
+    def identity(value):
+        calls.append(value)
+        return "done"
+
+    lock = threading.Lock()
+    identity(lock)
+    identity(lock)
+    assert len(calls) == 2
+
+
+def test_disk_tier_is_sharded(cache_dir):
+    cache = FileCache(str(cache_dir), memory_entries=0)
+    key = hash_key("value")
+    cache.set(key, {"a": 1})
+    assert os.path.exists(os.path.join(str(cache_dir), key[:2], f"{key}.pickle"))
+    assert cache.get(key) == (True, {"a": 1})
+    assert cache.stats.disk_hits == 1
+
+
+def test_unreadable_entries_are_misses(cache_dir):
+    cache = FileCache(str(cache_dir), memory_entries=0)
+    key = hash_key("value")
+    cache.set(key, "result")
+    with open(cache.path(key), "wb") as f:
+        f.write(b"torn")
+    assert cache.get(key) == (False, None)
+    assert not os.path.exists(cache.path(key))
+
+
+def test_ttl_expires_entries(cache_dir):
+    cache = FileCache(str(cache_dir), ttl=60)
+    key = hash_key("value")
+    cache.set(key, "result")
+    past = time.time() - 120
+    os.utime(cache.path(key), (past, past))
+    cache._memory.clear()
+    assert cache.get(key) == (False, None)
+
+
+def test_max_bytes_evicts_oldest_entries(cache_dir):
+    cache = FileCache(str(cache_dir), max_bytes=2500)
+    keys = [hash_key(i) for i in range(5)]
+    for index, key in enumerate(keys):
+        cache.set(key, "x" * 1000)
+        past = time.time() - 100 + index
+        os.utime(cache.path(key), (past, past))
+
+    assert cache.stats.evictions == 3
+    assert [os.path.exists(cache.path(key)) for key in keys] == [
+        False,
+        False,
+        False,
+        True,
+        True,
+    ]
+
+
+def test_cached_values_are_copies(cache_dir):
+    cache = FileCache(str(cache_dir))
+    key = hash_key("value")
+    value = {"outputs": ["a"]}
+    cache.set(key, value)
+    value["outputs"].append("b")
+    found, cached = cache.get(key)
+    cached["outputs"].append("c")
+    assert cache.get(key) == (True, {"outputs": ["a"]})
+    assert cache.stats.memory_hits == 2
+
+
+def test_overwritten_entries_are_counted_once(cache_dir):
+    cache = FileCache(str(cache_dir), max_bytes=10**6)
+    cache.evict()
+    key = hash_key("value")
+    for _ in range(3):
+        cache.set(key, "x" * 1000)
+    assert cache._disk_bytes == os.path.getsize(cache.path(key))
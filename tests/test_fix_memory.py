@@ -0,0 +1,170 @@
+"""Tests for the memory of fixes of recurring terraform errors."""
+
+import threading
+
+from infrabot.ai.error_context import distill_error
+from infrabot.ai.fix_memory import FixMemory, FixRecipe, FixTracker, error_signature
+
+CODE = """resource "aws_s3_bucket" "logs" {
+  bucket = "logs"
+  acl    = "private"
+
+  versioning {
+    enabled = true
+  }
+}
+
+resource "aws_iam_role" "app" {
+  name = "app"
+}
+"""
+
+OTHER_CODE = """resource "aws_s3_bucket" "assets" {
+  bucket = "assets"
+  acl    = "private"
+
+  versioning {
+    enabled = true
+  }
+}
+"""
+
+
+def bucket_error(name: str) -> str:
+    return f"""╷
+│ Error: creating S3 Bucket ({name}): BucketAlreadyExists
+│
+│   with aws_s3_bucket.{name},
+│   on main.tf line 2, in resource "aws_s3_bucket" "{name}":
+│    2:   bucket = "{name}"
+│
+│ The requested bucket name is not available.
+╵
+"""
+
+
+def block_of(code: str, error: str):
+    return distill_error(error, code).blocks[0]
+
+
+def test_error_signature_ignores_names():
+    logs = error_signature(distill_error(bucket_error("logs"), CODE))
+    assets = error_signature(distill_error(bucket_error("assets"), OTHER_CODE))
+    assert logs == "resource.aws_s3_bucket: creating s3 bucket (*): bucketalreadyexists"
+    assert logs == assets
+
+
+def test_error_signature_needs_a_single_resource():
+    assert error_signature(distill_error("Error: something went wrong", CODE)) is None
+
+
+def test_recipe_replays_on_another_resource():
+    fixed = CODE.replace('bucket = "logs"', 'bucket = "logs-infrabot"').replace(
+        """
+  versioning {
+    enabled = true
+  }
+""",
+        "",
+    )
+    fixed += """
+resource "aws_s3_bucket_versioning" "logs" {
+  bucket = aws_s3_bucket.logs.id
+  versioning_configuration {
+    status = "Enabled"
+  }
+}
+"""
+    recipe = FixRecipe.from_fix(block_of(CODE, bucket_error("logs")), CODE, fixed)
+    assert recipe is not None
+
+    replayed = recipe.apply(block_of(OTHER_CODE, bucket_error("assets")), OTHER_CODE)
+    assert 'bucket = "assets-infrabot"' in replayed
+    assert "versioning {" not in replayed
+    assert 'resource "aws_s3_bucket_versioning" "assets"' in replayed
+    assert "bucket = aws_s3_bucket.assets.id" in replayed
+
+
+def test_recipe_rejects_fixes_of_other_blocks():
+    fixed = CODE.replace('bucket = "logs"', 'bucket = "logs-1"').replace(
+        'name = "app"', 'name = "app-1"'
+    )
+    assert FixRecipe.from_fix(block_of(CODE, bucket_error("logs")), CODE, fixed) is None
+
+
+def test_tracker_records_confirmed_fixes(tmp_path):
+    memory = FixMemory(str(tmp_path / "fix-memory.json"))
+    fixed = CODE.replace('bucket = "logs"', 'bucket = "logs-infrabot"')
+
+    tracker = FixTracker(memory)
+    assert tracker.recall(bucket_error("logs"), CODE) is None
+    tracker.learn(bucket_error("logs"), CODE, fixed, duration=12.0)
+    # Nothing is remembered until the next attempt succeeds
+    signature = tracker.pending.signature
+    assert memory.lookup(signature) is None
+    tracker.resolve()
+    assert memory.lookup(signature) is not None
+
+    # The fix is persisted and replayed on another component
+    tracker = FixTracker(FixMemory(memory.path))
+    replayed = tracker.recall(bucket_error("assets"), OTHER_CODE)
+    assert 'bucket = "assets-infrabot"' in replayed
+    fix = tracker.resolve()
+    assert fix.source == "memory"
+    assert 0 < fix.time_saved <= 12.0
+
+
+def test_tracker_forgets_failing_fixes(tmp_path):
+    memory = FixMemory(str(tmp_path / "fix-memory.json"))
+    tracker = FixTracker(memory)
+    fixed = CODE.replace('bucket = "logs"', 'bucket = "logs-infrabot"')
+    tracker.learn(bucket_error("logs"), CODE, fixed, duration=3.0)
+    tracker.resolve()
+
+    replayed = tracker.recall(bucket_error("logs"), CODE)
+    # The remembered fix failed with the same error
+    fix = tracker.resolve(bucket_error("logs"), replayed)
+    assert fix.time_saved == 0.0
+    assert memory.lookup(fix.signature) is None
+
+
+def test_hit_rate_of_recurring_errors(tmp_path):
+    memory = FixMemory(str(tmp_path / "fix-memory.json"))
+    fixed = CODE.replace('bucket = "logs"', 'bucket = "logs-infrabot"')
+    tracker = FixTracker(memory)
+    tracker.recall(bucket_error("logs"), CODE)
+    tracker.learn(bucket_error("logs"), CODE, fixed, duration=3.0)
+    assert tracker.resolve().hit_rate == 0.0
+
+    tracker.recall(bucket_error("assets"), OTHER_CODE)
+    fix = tracker.resolve()
+    assert fix.source == "memory"
+    assert fix.hit_rate == 0.5
+    assert FixMemory(memory.path).hit_rate() == 0.5
+
+
+def test_workers_sharing_the_file_merge_their_fixes(tmp_path):
+    path = str(tmp_path / "fix-memory.json")
+    recipe = FixRecipe([["remove_attribute", "acl"]])
+    workers = [FixMemory(path) for _ in range(4)]
+    for memory in workers:
+        # Each worker has its own view of the file
+        memory.lookup("unknown")
+
+    def record(index, memory):
+        for signature in range(5):
+            memory.record(f"worker-{index}-{signature}", recipe, 1.0)
+
+    threads = [
+        threading.Thread(target=record, args=(index, memory))
+        for index, memory in enumerate(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    memory = FixMemory(path)
+    for index in range(4):
+        for signature in range(5):
+            assert memory.lookup(f"worker-{index}-{signature}") == recipe
@@ -0,0 +1,213 @@
+"""Tests for the HCL top-level block index."""
+
+import pytest
+
+from infrabot.infra_utils import hcl_index
+from infrabot.infra_utils.component_manager import TerraformComponent
+from infrabot.infra_utils.hcl_index import (
+    component_addresses,
+    index_components,
+    line_number,
+    parse_blocks,
+    parse_body,
+    replace_blocks,
+    resource_addresses,
+)
+
+CODE = """# Braces in comments are ignored {
+terraform {
+  required_providers {
+    aws = { source = "hashicorp/aws" }
+  }
+}
+
+variable "suffix" {
+  default = "a}b${upper("c{")}"
+}
+
+resource "aws_s3_bucket" "logs" {
+  bucket = "logs-${random_id.suffix.hex}" # }
+  /* } */
+}
+
+resource "aws_iam_policy" "read" {
+  policy = <<-EOT
+    { "Statement": "}" }
+  EOT
+}
+
+module vpc {
+  source = "terraform-aws-modules/vpc/aws"
+}
+
+data "aws_caller_identity" "current" {}
+
+resource "random_id" "suffix" { byte_length = 4 }
+
+output "escaped" {
+  value = "$${not_interpolated"
+}
+"""
+
+
+def test_parse_blocks():
+    blocks = parse_blocks(CODE)
+
+    assert [(block.type, block.labels) for block in blocks] == [
+        ("terraform", []),
+        ("variable", ["suffix"]),
+        ("resource", ["aws_s3_bucket", "logs"]),
+        ("resource", ["aws_iam_policy", "read"]),
+        ("module", ["vpc"]),
+        ("data", ["aws_caller_identity", "current"]),
+        ("resource", ["random_id", "suffix"]),
+        ("output", ["escaped"]),
+    ]
+    for block in blocks:
+        assert block.text == CODE[block.start : block.end]
+        assert block.text.endswith("}")
+
+
+def test_parse_body():
+    blocks = parse_blocks(CODE)
+    bucket = blocks[2]
+    attributes, nested = parse_body(CODE, bucket)
+    assert [a.name for a in attributes] == ["bucket"]
+    assert nested == []
+
+    # Multi-line expressions do not hide the following attributes
+    code = """resource "aws_instance" "web" {
+  tags = {
+    Name = "web"
+  }
+  user_data = <<-EOT
+    echo {
+  EOT
+  ebs_block_device {
+    volume_size = 8
+  }
+  count = var.enabled ? 1 : 0
+}
+"""
+    attributes, nested = parse_body(code, parse_blocks(code)[0])
+    assert [(a.name, line_number(code, a.start)) for a in attributes] == [
+        ("tags", 2),
+        ("user_data", 5),
+        ("count", 11),
+    ]
+    assert [(b.type, line_number(code, b.start)) for b in nested] == [
+        ("ebs_block_device", 8)
+    ]
+    assert [a.name for a in parse_body(code, nested[0])[0]] == ["volume_size"]
+
+
+def test_resource_addresses():
+    assert resource_addresses(CODE) == [
+        "aws_s3_bucket.logs",
+        "aws_iam_policy.read",
+        "module.vpc",
+        "random_id.suffix",
+    ]
+
+
+def test_component_addresses_from_files(tmp_path):
+    workdir = str(tmp_path)
+    (tmp_path / "provider.tf").write_text('provider "aws" {}\n')
+    (tmp_path / "storage.tf").write_text(CODE)
+    (tmp_path / "queue.tf").write_text('resource "aws_sqs_queue" "jobs" {}\n')
+
+    component = TerraformComponent(name="queue", terraform_code="", workdir=workdir)
+    assert component_addresses(component) == ["aws_sqs_queue.jobs"]
+
+    index = index_components(workdir)
+    assert index["queue"] == ["aws_sqs_queue.jobs"]
+    assert index["storage"] == resource_addresses(CODE)
+
+
+def test_parsed_files_are_bounded_and_refreshed(tmp_path, monkeypatch):
+    monkeypatch.setattr(hcl_index, "FILE_CACHE_SIZE", 2)
+    monkeypatch.setattr(hcl_index, "_file_cache", hcl_index.OrderedDict())
+    components = []
+    for name in ["a", "b", "c"]:
+        (tmp_path / f"{name}.tf").write_text(
+            f'resource "aws_sqs_queue" "{name}" {{}}\n'
+        )
+        components.append(
+            TerraformComponent(name=name, terraform_code="", workdir=str(tmp_path))
+        )
+        component_addresses(components[-1])
+    assert list(hcl_index._file_cache) == [
+        str(tmp_path / "b.tf"),
+        str(tmp_path / "c.tf"),
+    ]
+
+    (tmp_path / "c.tf").write_text('resource "aws_sqs_queue" "renamed" {}\n')
+    assert component_addresses(components[-1]) == ["aws_sqs_queue.renamed"]
+    assert len(hcl_index._file_cache) == 2
+
+
+def test_replace_blocks():
+    code = """resource "aws_s3_bucket" "logs" {
+  bucket = "logs"
+}
+
+resource "aws_s3_bucket_versioning" "logs" {
+  bucket = aws_s3_bucket.logs.id
+}
+
+output "arn" {
+  value = aws_s3_bucket.logs.arn
+}
+"""
+    patch = """resource "aws_s3_bucket" "logs" {
+  bucket_prefix = "logs-"
+}
+
+output "id" {
+  value = aws_s3_bucket.logs.id
+}
+"""
+    patched = replace_blocks(
+        code, patch, remove=["resource.aws_s3_bucket_versioning.logs"]
+    )
+    assert (
+        patched
+        == """resource "aws_s3_bucket" "logs" {
+  bucket_prefix = "logs-"
+}
+
+output "arn" {
+  value = aws_s3_bucket.logs.arn
+}
+
+output "id" {
+  value = aws_s3_bucket.logs.id
+}
+"""
+    )
+
+
+def test_replace_blocks_rejects_invalid_patches():
+    code = 'resource "aws_s3_bucket" "logs" {}\n'
+    for patch, remove in [
+        ("", []),
+        ('resource "aws_s3_bucket" "logs" {\n  bucket = "logs"\n', []),
+        ("", ["resource.aws_s3_bucket.missing"]),
+        ("locals {\n  a = 1\n}\n\nlocals {\n  b = 2\n}\n", []),
+    ]:
+        try:
+            replace_blocks(code, patch, remove=remove)
+        except ValueError:
+            continue
+        raise AssertionError(f"Patch should not apply: {patch!r} {remove!r}")
+
+
+def test_replace_blocks_rejects_keys_of_several_blocks():
+    code = "locals {\n  a = 1\n}\n\nlocals {\n  b = 2\n}\n"
+    with pytest.raises(ValueError):
+        replace_blocks(code, "locals {\n  a = 3\n}\n")
+    with pytest.raises(ValueError):
+        replace_blocks(code, "", remove=["locals"])
+    # Other blocks can still be patched
+    patched = replace_blocks(code, 'resource "aws_s3_bucket" "logs" {}\n')
+    assert patched.startswith(code)
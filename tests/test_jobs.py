@@ -0,0 +1,133 @@
+"""Tests for background jobs and their cancellation."""
+
+import threading
+import time
+
+import pytest
+
+from infrabot import service
+from infrabot.jobs import JobManager, JobStatus
+
+
+def wait_done(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not job.done:
+        assert time.monotonic() < deadline, f"Job {job.id} did not finish"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=1)
+    yield manager
+    manager.shutdown()
+
+
+def test_job_states(manager):
+    release = threading.Event()
+    statuses = []
+
+    def work(job):
+        statuses.append(job.status)
+        job.add_event("working", {"step": 1})
+        release.wait(5)
+        return "result"
+
+    job = manager.submit(work)
+    assert manager.get(job.id) is job
+    release.set()
+    wait_done(job)
+
+    assert statuses == [JobStatus.RUNNING]
+    assert job.status == JobStatus.COMPLETED
+    assert job.result == "result"
+    assert [event["stage"] for event in job.events] == ["working"]
+    assert job.started_at <= job.finished_at
+
+
+def test_failed_job(manager):
+    def work(job):
+        raise ValueError("boom")
+
+    job = manager.submit(work)
+    wait_done(job)
+    assert job.status == JobStatus.FAILED
+    assert job.error == "boom"
+    assert job.events[-1]["stage"] == "failed"
+
+
+def test_cancelled_pending_job_never_runs(manager):
+    release = threading.Event()
+    calls = []
+    blocking = manager.submit(lambda job: release.wait(5))
+    pending = manager.submit(lambda job: calls.append(job.id))
+    assert pending.status == JobStatus.PENDING
+
+    assert manager.cancel(pending.id) is pending
+    release.set()
+    wait_done(blocking)
+    wait_done(pending)
+
+    assert calls == []
+    assert pending.status == JobStatus.FAILED
+    assert pending.started_at is None
+    assert [event["stage"] for event in pending.events] == ["cancelled", "failed"]
+    assert pending.events[-1]["data"] == {"error": pending.error}
+    assert manager.cancel("unknown") is None
+
+
+def test_cancelled_running_job_sees_its_event(manager):
+    started = threading.Event()
+
+    def work(job):
+        started.set()
+        return job.cancel_event.wait(5)
+
+    job = manager.submit(work)
+    started.wait(5)
+    manager.cancel(job.id)
+    wait_done(job)
+    assert job.result is True
+    # Finished jobs are left as they are
+    manager.cancel(job.id)
+    assert job.status == JobStatus.COMPLETED
+
+
+def test_cancelled_creation_skips_generation(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        service, "gen_terraform_stream", lambda *args, **kwargs: calls.append(args)
+    )
+    cancel_event = threading.Event()
+    cancel_event.set()
+    stages = []
+
+    result = service.create_component(
+        "an s3 bucket",
+        workdir=str(tmp_path),
+        progress_callback=lambda stage, data: stages.append(stage),
+        cancel_event=cancel_event,
+    )
+    assert not result.success
+    assert result.error_message == "Component creation was cancelled"
+    assert calls == []
+    assert stages == ["cancelled"]
+
+
+def test_creation_cancelled_while_generating(tmp_path, monkeypatch):
+    cancel_event = threading.Event()
+    read = []
+
+    def stream(*args, **kwargs):
+        for chunk in ["```terraform\n", 'resource "aws_s3_bucket" "a" {}\n', "```"]:
+            read.append(chunk)
+            cancel_event.set()
+            yield chunk
+
+    monkeypatch.setattr(service, "gen_terraform_stream", stream)
+    result = service.create_component(
+        "an s3 bucket", workdir=str(tmp_path), cancel_event=cancel_event
+    )
+    assert result.error_message == "Component creation was cancelled"
+    assert len(read) == 1
+    assert not (tmp_path / "main.tf").exists()
@@ -0,0 +1,52 @@
+"""Tests for the formatting of Terraform outputs."""
+
+from infrabot.ai import output_format
+from infrabot.utils.output_formatter import (
+    SENSITIVE_PLACEHOLDER,
+    mask_sensitive_outputs,
+    render_outputs_markdown,
+)
+
+OUTPUTS = {
+    "bucket_name": {
+        "sensitive": False,
+        "type": "string",
+        "value": "logs",
+        "description": "Name of the bucket",
+    },
+    "tags": {"sensitive": False, "value": {"env": "dev"}},
+    "password": {"sensitive": True, "value": "hunter2"},
+}
+
+
+def test_render_outputs_markdown():
+    markdown = render_outputs_markdown(OUTPUTS)
+    assert markdown.startswith("# Terraform Outputs")
+    assert "## bucket_name\n\n_Name of the bucket_\n\n`logs`" in markdown
+    assert '```json\n{\n  "env": "dev"\n}\n```' in markdown
+    assert f"## password\n\n{SENSITIVE_PLACEHOLDER}" in markdown
+    assert "hunter2" not in markdown
+
+
+def test_render_outputs_markdown_without_outputs():
+    assert render_outputs_markdown({}) == "No outputs available."
+
+
+def test_mask_sensitive_outputs():
+    masked = mask_sensitive_outputs(OUTPUTS)
+    assert masked["password"]["value"] == SENSITIVE_PLACEHOLDER
+    assert masked["bucket_name"] == OUTPUTS["bucket_name"]
+    assert OUTPUTS["password"]["value"] == "hunter2"
+
+
+def test_ai_format_output_is_local_by_default(monkeypatch):
+    monkeypatch.delenv("OUTPUT_FORMAT_MODE", raising=False)
+    monkeypatch.setattr(output_format, "completion", lambda **kwargs: 1 / 0)
+    assert output_format.ai_format_output(OUTPUTS) == render_outputs_markdown(OUTPUTS)
+
+
+def test_ai_format_output_llm_mode_falls_back(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("OUTPUT_FORMAT_MODE", "llm")
+    monkeypatch.setattr(output_format, "completion", lambda **kwargs: 1 / 0)
+    assert output_format.ai_format_output(OUTPUTS) == render_outputs_markdown(OUTPUTS)
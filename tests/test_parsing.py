@@ -0,0 +1,70 @@
+"""Tests for the code block parsing utilities."""
+
+import pytest
+
+from infrabot.utils.parsing import (
+    CodeBlockStreamParser,
+    extract_code_blocks,
+    parse_code_blocks,
+)
+
+RESPONSE = """<think>
+Maybe a ```terraform
+fake block
+```
+</think>
+Here is your configuration:
+```terraform
+resource "aws_s3_bucket" "mybucket" {
+  bucket = "mybucket"
+}
+```
+```remarks
+Bucket names are globally unique.
+```
+```module.tfvars
+aws_region = "eu-west-2"
+```
+"""
+
+
+def _feed_in_chunks(text, size):
+    parser = CodeBlockStreamParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start : start + size]))
+    completed.extend(parser.close())
+    return parser, completed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(RESPONSE)])
+def test_stream_parser_matches_regex_extraction(size):
+    """Blocks are the same whatever the chunking, and thoughts are dropped."""
+    parser, completed = _feed_in_chunks(RESPONSE, size)
+
+    assert [title for title, _ in completed] == [
+        "terraform",
+        "remarks",
+        "module.tfvars",
+    ]
+    assert (
+        parser.blocks["terraform"]
+        == extract_code_blocks(RESPONSE.split("</think>")[1], title="terraform")[0]
+    )
+    assert parser.blocks["module.tfvars"] == 'aws_region = "eu-west-2"'
+
+
+def test_stream_parser_emits_blocks_when_fence_closes():
+    """A block is emitted as soon as its closing fence arrives."""
+    parser = CodeBlockStreamParser()
+
+    assert parser.feed("```terraform\nresource {}\n``") == []
+    assert parser.feed("`\n```remarks\nstill writing") == [("terraform", "resource {}")]
+    assert parser.feed("...\n```") == [("remarks", "still writing...")]
+
+
+def test_parse_code_blocks_keeps_unterminated_think_as_text():
+    """An unterminated <think> tag is left in place, like the regex stripping."""
+    blocks = parse_code_blocks("<think>\n```terraform\nx = 1\n```")
+
+    assert blocks == {"terraform": "x = 1"}
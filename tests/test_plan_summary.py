@@ -0,0 +1,75 @@
+"""Tests for the local summaries of Terraform plans."""
+
+from infrabot.ai import summary
+from infrabot.utils.plan_summary import plan_action, summarize_plan_json
+
+
+def resource_change(address, resource_type, actions, mode="managed"):
+    return {
+        "address": address,
+        "mode": mode,
+        "type": resource_type,
+        "change": {"actions": actions},
+    }
+
+
+PLAN = {
+    "resource_changes": [
+        resource_change("aws_s3_bucket.logs", "aws_s3_bucket", ["create"]),
+        resource_change("aws_s3_bucket.assets", "aws_s3_bucket", ["create"]),
+        resource_change("aws_instance.web", "aws_instance", ["delete", "create"]),
+        resource_change("aws_iam_role.app", "aws_iam_role", ["update"]),
+        resource_change("aws_sqs_queue.old", "aws_sqs_queue", ["delete"]),
+        resource_change("aws_vpc.main", "aws_vpc", ["no-op"]),
+        resource_change("data.aws_ami.ubuntu", "aws_ami", ["read"], mode="data"),
+        resource_change('module.net.aws_subnet.this["a"]', "aws_subnet", ["create"]),
+    ],
+    "output_changes": {
+        "bucket_arn": {"actions": ["create"]},
+        "vpc_id": {"actions": ["no-op"]},
+    },
+}
+
+
+def test_plan_action():
+    assert plan_action(["create"]) == "create"
+    assert plan_action(["delete", "create"]) == "replace"
+    assert plan_action(["create", "delete"]) == "replace"
+    assert plan_action(["no-op"]) == "no-op"
+
+
+def test_summarize_plan_json():
+    assert summarize_plan_json(PLAN) == "\n".join(
+        [
+            "- Create 2 aws_s3_bucket: logs, assets",
+            '- Create 1 aws_subnet: module.net.aws_subnet.this["a"]',
+            "- Update 1 aws_iam_role: app",
+            "- Replace 1 aws_instance: web",
+            "- Destroy 1 aws_sqs_queue: old",
+            "- Outputs: bucket_arn",
+        ]
+    )
+
+
+def test_summarize_plan_json_without_changes():
+    assert summarize_plan_json({"resource_changes": []}) == "No changes."
+    assert summarize_plan_json({}) == "No changes."
+
+
+def test_summarize_terraform_plan_is_local_by_default(monkeypatch):
+    monkeypatch.delenv("PLAN_SUMMARY_MODE", raising=False)
+    monkeypatch.setattr(summary, "_llm_summary", lambda content: 1 / 0)
+    assert summary.summarize_terraform_plan("", PLAN).startswith("- Create 2")
+    assert summary.summarize_terraform_plan("", None) is None
+
+
+def test_summarize_terraform_plan_llm_mode(monkeypatch):
+    monkeypatch.setenv("PLAN_SUMMARY_MODE", "llm")
+    prompts = []
+    monkeypatch.setattr(
+        summary, "_llm_summary", lambda content: prompts.append(content) or "Polished"
+    )
+    assert summary.summarize_terraform_plan("plan text", PLAN) == "Polished"
+    assert "- Create 2 aws_s3_bucket" in prompts[0]
+    assert summary.summarize_terraform_plan("plan text", None) == "Polished"
+    assert prompts[1].endswith("plan text")
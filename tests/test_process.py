@@ -0,0 +1,95 @@
+"""Tests for the subprocess runner of terraform commands."""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+
+from infrabot.infra_utils import process
+from infrabot.infra_utils.process import run_process, run_sync, stream_process
+from infrabot.infra_utils.terraform import TerraformWrapper
+
+
+def is_running(pid: int) -> bool:
+    """Check if a process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_output_is_streamed_line_by_line():
+    stdout, stderr = [], []
+    result = asyncio.run(
+        run_process(
+            "sh -c 'echo one; echo two >&2; printf three'",
+            on_stdout=stdout.append,
+            on_stderr=stderr.append,
+        )
+    )
+    assert result.ok
+    assert stdout == ["one", "three"]
+    assert stderr == ["two"]
+    assert result.stdout == "one\nthree"
+
+
+def test_long_lines_are_read_whole():
+    result = asyncio.run(
+        run_process(
+            f"{sys.executable} -c \"print('x' * 200000)\"",
+            on_stdout=lambda line: None,
+        )
+    )
+    assert len(result.stdout) == 200001
+
+
+def test_timeout_stops_the_command():
+    result = asyncio.run(run_process("sleep 10", timeout=0.2))
+    assert result.timed_out
+    assert not result.cancelled and not result.ok
+    assert result.duration < 5
+
+
+def test_cancel_event_stops_the_command():
+    cancel_event = threading.Event()
+    threading.Timer(0.2, cancel_event.set).start()
+    result = asyncio.run(run_process("sleep 10", cancel_event=cancel_event))
+    assert result.cancelled
+    assert not result.timed_out
+    assert result.duration < 5
+
+
+def test_whole_process_group_is_killed(monkeypatch):
+    monkeypatch.setattr(process, "KILL_GRACE_PERIOD", 0.2)
+    pids = []
+    # The shell and its child both ignore the interrupt
+    result = asyncio.run(
+        run_process(
+            "sh -c 'trap \"\" INT; sleep 30 & echo $!; wait'",
+            timeout=0.5,
+            on_stdout=lambda line: pids.append(int(line)),
+        )
+    )
+    assert result.timed_out
+    time.sleep(0.1)
+    assert pids and not is_running(pids[0])
+
+
+def test_stream_process_yields_lines_then_exit_status():
+    async def collect():
+        return [item async for item in stream_process("sh -c 'echo a; exit 3'")]
+
+    assert asyncio.run(collect()) == [("stdout", "a"), ("exit", "3")]
+
+
+def test_run_sync_inside_a_running_loop(tmp_path):
+    async def endpoint():
+        # Like an async endpoint calling blocking terraform helpers
+        return TerraformWrapper(str(tmp_path)).execute("pwd")
+
+    result = asyncio.run(endpoint())
+    assert result.ok
+    assert result.stdout.strip() == os.path.realpath(str(tmp_path))
+    assert run_sync(asyncio.sleep(0, result="done")) == "done"
@@ -0,0 +1,196 @@
+"""Tests for the provider schema index."""
+
+import json
+
+import pytest
+
+from infrabot.infra_utils import provider_schema
+from infrabot.infra_utils.provider_schema import (
+    ProviderSchema,
+    SchemaIndex,
+    load_schema_index,
+    locked_providers,
+)
+
+AWS = "registry.terraform.io/hashicorp/aws"
+
+LOCK_FILE = f"""# This file is maintained automatically by "terraform init".
+provider "{AWS}" {{
+  version     = "5.31.0"
+  constraints = "~> 5.0"
+  hashes = [
+    "h1:abc=",
+  ]
+}}
+"""
+
+SCHEMA = {
+    "format_version": "1.0",
+    "provider_schemas": {
+        AWS: {
+            "resource_schemas": {
+                "aws_s3_bucket": {
+                    "block": {
+                        "attributes": {
+                            "bucket": {"type": "string", "optional": True},
+                            "arn": {"type": "string", "computed": True},
+                            "acl": {
+                                "type": "string",
+                                "optional": True,
+                                "deprecated": True,
+                            },
+                        },
+                        "block_types": {
+                            "versioning": {
+                                "nesting_mode": "list",
+                                "max_items": 1,
+                                "block": {
+                                    "attributes": {
+                                        "enabled": {"type": "bool", "optional": True}
+                                    },
+                                    "deprecated": True,
+                                },
+                            },
+                            "rule": {
+                                "nesting_mode": "set",
+                                "block": {
+                                    "attributes": {
+                                        "id": {"type": "string", "required": True}
+                                    }
+                                },
+                            },
+                        },
+                    }
+                },
+                "aws_iam_role": {
+                    "block": {
+                        "attributes": {
+                            "assume_role_policy": {"type": "string", "required": True}
+                        }
+                    }
+                },
+            },
+            "data_source_schemas": {
+                "aws_caller_identity": {
+                    "block": {
+                        "attributes": {
+                            "account_id": {"type": "string", "computed": True}
+                        }
+                    }
+                }
+            },
+        }
+    },
+}
+
+
+@pytest.fixture
+def index():
+    return SchemaIndex(
+        [ProviderSchema.from_terraform(AWS, "5.31.0", SCHEMA["provider_schemas"][AWS])]
+    )
+
+
+def summaries(diagnostics):
+    return [(d.severity, d.summary, d.line) for d in diagnostics]
+
+
+def test_valid_code(index):
+    code = """resource "aws_s3_bucket" "logs" {
+  bucket = "logs"
+  count  = 1
+
+  dynamic "rule" {
+    for_each = ["a"]
+    content {
+      id = rule.value
+    }
+  }
+
+  lifecycle {
+    prevent_destroy = true
+  }
+}
+
+data "aws_caller_identity" "current" {}
+
+resource "random_id" "suffix" {
+  unknown = 4
+}
+"""
+    assert index.check(code) == []
+
+
+def test_invalid_code(index):
+    code = """resource "aws_s3_bucket" "logs" {
+  bucket_name = "logs"
+  arn         = "arn:aws:s3:::logs"
+  acl         = "private"
+  versioning {
+    enabled = true
+  }
+  versioning {}
+  rule {}
+  website {}
+}
+
+resource "aws_iam_role" "app" {}
+
+resource "aws_s3_buckets" "typo" {}
+"""
+    diagnostics = index.check(code, filename="logs.tf")
+    assert summaries(diagnostics) == [
+        ("error", "Unsupported argument", 2),
+        ("error", "Value for unconfigurable attribute", 3),
+        ("warning", "Deprecated argument", 4),
+        ("warning", "Deprecated argument", 5),
+        ("warning", "Deprecated argument", 8),
+        ("error", "Missing required argument", 9),
+        ("error", "Unsupported block type", 10),
+        ("error", "Too many versioning blocks", 1),
+        ("error", "Missing required argument", 13),
+        ("error", "Invalid resource type", 15),
+    ]
+    assert diagnostics[0].render() == "\n".join(
+        [
+            "Error: Unsupported argument",
+            "",
+            "  with aws_s3_bucket.logs,",
+            '  on logs.tf line 2, in resource "aws_s3_bucket" "logs":',
+            '  2: bucket_name = "logs"',
+            "",
+            'An argument named "bucket_name" is not expected here.',
+        ]
+    )
+
+
+def test_load_schema_index(tmp_path, monkeypatch):
+    monkeypatch.setenv("INFRABOT_SCHEMA_CACHE_DIR", str(tmp_path / "schemas"))
+    monkeypatch.setattr(provider_schema, "_schemas", {})
+    workdir = tmp_path / "project"
+    workdir.mkdir()
+    (workdir / ".terraform.lock.hcl").write_text(LOCK_FILE)
+    assert locked_providers(str(workdir)) == {AWS: "5.31.0"}
+
+    dumps = []
+
+    def dump_schema():
+        dumps.append(1)
+        return SCHEMA
+
+    index = load_schema_index(str(workdir), dump_schema)
+    assert [p.name for p in index.providers] == ["aws"]
+    cached = tmp_path / "schemas" / "registry.terraform.io" / "hashicorp" / "aws"
+    assert json.loads((cached / "5.31.0.json").read_text())["version"] == "5.31.0"
+
+    # Later loads use the index, in memory then on disk
+    load_schema_index(str(workdir), dump_schema)
+    monkeypatch.setattr(provider_schema, "_schemas", {})
+    index = load_schema_index(str(workdir), dump_schema)
+    assert len(dumps) == 1
+    assert "aws_s3_bucket" in index.providers[0].resources
+
+
+def test_load_schema_index_without_lock_file(tmp_path):
+    index = load_schema_index(str(tmp_path), lambda: 1 / 0)
+    assert index.providers == []
@@ -0,0 +1,100 @@
+"""Tests for the scheduling of terraform operations across workdirs."""
+
+import asyncio
+import os
+import threading
+import time
+
+from infrabot import service
+from infrabot.scheduler import WorkdirScheduler
+
+
+class Concurrency:
+    """Track how many operations run at the same time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+
+    def run(self, scheduler, workdir, duration=0.05):
+        with scheduler.operation(workdir, "apply"):
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            time.sleep(duration)
+            with self.lock:
+                self.running -= 1
+
+
+def run_threads(target, args_list):
+    threads = [threading.Thread(target=target, args=args) for args in args_list]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_operations_on_a_workdir_are_serialized(tmp_path):
+    scheduler = WorkdirScheduler(max_concurrent_operations=4)
+    concurrency = Concurrency()
+    run_threads(concurrency.run, [(scheduler, str(tmp_path))] * 4)
+
+    assert concurrency.max_running == 1
+    stats = scheduler.stats()
+    workdir = stats["workdirs"][os.path.abspath(str(tmp_path))]
+    assert workdir["completed"] == 4
+    assert workdir["max_wait"] > 0
+    assert stats["running"] == stats["queue_depth"] == 0
+
+
+def test_operations_are_capped_globally(tmp_path):
+    scheduler = WorkdirScheduler(max_concurrent_operations=2)
+    concurrency = Concurrency()
+    run_threads(
+        concurrency.run,
+        [(scheduler, str(tmp_path / str(index))) for index in range(6)],
+    )
+    assert concurrency.max_running == 2
+
+
+def test_nested_operations_run_directly(tmp_path):
+    scheduler = WorkdirScheduler(max_concurrent_operations=1)
+    with scheduler.operation(str(tmp_path), "apply"):
+        with scheduler.operation(str(tmp_path / "."), "cleanup"):
+            pass
+    assert scheduler.stats()["workdirs"][str(tmp_path)]["completed"] == 1
+
+
+def test_init_waits_for_the_workdir_off_the_event_loop(tmp_path, monkeypatch):
+    workdir = os.path.join(str(tmp_path), ".infrabot/default")
+
+    def init_project(workdir, **kwargs):
+        with service.scheduler.operation(workdir, "init"):
+            return "initialized"
+
+    monkeypatch.setattr(service, "init_project", init_project)
+    held = threading.Event()
+    release = threading.Event()
+
+    def create():
+        with service.scheduler.operation(workdir, "apply"):
+            held.set()
+            release.wait(5)
+
+    creation = threading.Thread(target=create)
+    creation.start()
+    held.wait(5)
+
+    async def main():
+        init = asyncio.ensure_future(
+            service.api_init_project(service.InitProjectRequest(workdir=str(tmp_path)))
+        )
+        # The loop keeps serving other requests while init waits for the lock
+        await asyncio.sleep(0.1)
+        assert not init.done()
+        release.set()
+        return await init
+
+    assert asyncio.run(main()) == "initialized"
+    creation.join()
@@ -0,0 +1,90 @@
+"""Tests for the reuse of code generated for similar prompts."""
+
+from infrabot.ai.semantic_cache import SemanticCache, cosine, embed
+
+
+def similarity(first: str, second: str) -> float:
+    return cosine(embed(first).vector, embed(second).vector)
+
+
+def test_paraphrases_are_similar():
+    assert (
+        similarity(
+            "make an s3 bucket w/ versioning", "S3 bucket with versioning enabled"
+        )
+        > 0.99
+    )
+    assert similarity("Create S3 buckets", "create an s3 bucket") > 0.99
+    assert similarity("an s3 bucket with versioning", "an sqs queue") < 0.5
+
+
+def test_literals_must_match():
+    assert embed('a bucket named "logs"').literals == frozenset(["logs"])
+    assert embed("ec2 t3.micro instance in eu-west-1").literals == frozenset(
+        ["t3.micro", "eu-west-1"]
+    )
+    assert embed("2 sqs queues").literals != embed("3 sqs queues").literals
+    assert (
+        embed("s3 bucket with versioning").literals
+        != embed("s3 bucket without versioning").literals
+    )
+
+
+def test_lookup():
+    cache = SemanticCache()
+    cache.add("S3 bucket with versioning enabled", "gpt-4o", "versioned")
+    cache.add("An SQS queue with a dead letter queue", "gpt-4o", "queue")
+
+    entry, score = cache.lookup("make an s3 bucket w/ versioning", "gpt-4o")
+    assert entry.response == "versioned"
+    assert score > 0.99
+    assert cache.lookup("make an s3 bucket w/ versioning", "gpt-4o-mini") is None
+    assert cache.lookup("s3 bucket without versioning", "gpt-4o") is None
+    assert cache.lookup("an sns topic", "gpt-4o") is None
+
+
+def test_entries_are_replaced_and_evicted():
+    cache = SemanticCache(max_entries=2)
+    cache.add("an s3 bucket", "ns", "first")
+    cache.add("An S3  bucket", "ns", "second")
+    assert len(cache) == 1
+    assert cache.lookup("an s3 bucket", "ns")[0].response == "second"
+
+    cache.add("an sqs queue", "ns", "queue")
+    cache.add("an sns topic", "ns", "topic")
+    assert len(cache) == 2
+    assert cache.lookup("an s3 bucket", "ns") is None
+
+
+def test_entries_persist(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    SemanticCache(path).add("an s3 bucket with versioning", "ns", "code")
+
+    entry, _ = SemanticCache(path).lookup("s3 bucket w/ versioning", "ns")
+    assert entry.response == "code"
+
+
+def test_expired_entries_are_ignored():
+    cache = SemanticCache(ttl=60)
+    cache.add("an s3 bucket", "ns", "code")
+    next(iter(cache._entries.values()))[0].created_at -= 120
+    assert cache.lookup("an s3 bucket", "ns") is None
+
+
+def test_prompts_asking_for_more_are_misses():
+    table = (
+        "a dynamodb table named orders with partition key id and range key timestamp"
+    )
+    cache = SemanticCache()
+    cache.add(table, "ns", "table")
+    assert similarity(table, f"{table} and TTL") > 0.9
+    assert cache.lookup(f"{table} and TTL", "ns") is None
+    assert cache.lookup(f"create {table}", "ns")[0].response == "table"
+
+
+def test_signatures_of_similar_prompts_are_close():
+    first = embed("make an s3 bucket w/ versioning").signature
+    second = embed("S3 bucket with versioning enabled").signature
+    other = embed("an sqs queue with a dead letter queue").signature
+    assert first < 1 << 64
+    assert (first ^ second).bit_count() < (first ^ other).bit_count()
@@ -0,0 +1,124 @@
+"""Tests for the concurrent dependency graphs of pipeline stages."""
+
+import threading
+import time
+
+import pytest
+
+from infrabot.utils.task_graph import TaskGraph
+
+
+def test_tasks_receive_the_results_of_their_dependencies():
+    order = []
+
+    def task(name, result):
+        def run(**deps):
+            order.append(name)
+            return result, deps
+
+        return run
+
+    graph = TaskGraph()
+    graph.add("apply", task("apply", 1))
+    graph.add("outputs", task("outputs", 2), deps=["apply"])
+    graph.add("formatted", task("formatted", 3), deps=["outputs"])
+    graph.start()
+
+    assert graph.wait("outputs") == (2, {"apply": (1, {})})
+    results = graph.wait_all()
+    assert results["formatted"] == (3, {"outputs": (2, {"apply": (1, {})})})
+    assert order == ["apply", "outputs", "formatted"]
+
+
+def test_independent_tasks_run_concurrently():
+    barrier = threading.Barrier(2, timeout=5)
+    graph = TaskGraph()
+    graph.add("apply", barrier.wait)
+    graph.add("summary", barrier.wait)
+    graph.start()
+    # Would time out if the tasks ran one after the other
+    graph.wait_all()
+
+
+def test_failures_propagate_to_dependents():
+    calls = []
+
+    def fail():
+        raise ValueError("apply failed")
+
+    graph = TaskGraph()
+    graph.add("apply", fail)
+    graph.add("outputs", lambda apply: calls.append("outputs"), deps=["apply"])
+    graph.add("summary", lambda: "summary")
+    graph.start()
+
+    with pytest.raises(ValueError, match="apply failed"):
+        graph.wait("outputs")
+    with pytest.raises(ValueError, match="apply failed"):
+        graph.wait_all()
+    assert calls == []
+
+
+def test_optional_failures_do_not_fail_the_graph():
+    def fail():
+        raise ValueError("no summary")
+
+    graph = TaskGraph()
+    graph.add("summary", fail, required=False)
+    graph.add("apply", lambda: "applied")
+    graph.start()
+    assert graph.wait_all() == {"summary": None, "apply": "applied"}
+
+
+def test_join_waits_without_raising():
+    finished = []
+
+    def slow():
+        time.sleep(0.05)
+        finished.append("plan_json")
+        raise ValueError("show failed")
+
+    graph = TaskGraph()
+    graph.add("plan_json", slow, required=False)
+    graph.start()
+    graph.join("plan_json")
+    assert finished == ["plan_json"]
+    graph.shutdown()
+
+
+def test_join_after_shutdown_waits_for_running_tasks():
+    started = threading.Event()
+    finished = []
+
+    def summarize():
+        started.set()
+        time.sleep(0.05)
+        finished.append("summary")
+
+    def apply():
+        started.wait()
+        raise RuntimeError("apply failed")
+
+    graph = TaskGraph()
+    graph.add("summary", summarize, required=False)
+    graph.add("apply", apply)
+    graph.add("outputs", lambda apply: None, deps=["apply"])
+    graph.start()
+    with pytest.raises(RuntimeError):
+        graph.wait("outputs")
+    graph.shutdown()
+    graph.join()
+    assert finished == ["summary"]
+
+
+def test_invalid_graphs_are_rejected():
+    graph = TaskGraph()
+    graph.add("apply", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("apply", lambda: None)
+    with pytest.raises(ValueError):
+        graph.add("outputs", lambda plan: None, deps=["plan"])
+    graph.start()
+    with pytest.raises(RuntimeError):
+        graph.add("summary", lambda: None)
+    graph.wait_all()
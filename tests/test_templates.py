@@ -0,0 +1,138 @@
+"""Tests for the generation of common components from templates."""
+
+import base64
+import io
+import itertools
+import re
+import zipfile
+
+from infrabot.ai.config import TERRAFORM_TEMPLATES
+from infrabot.ai.templates import (
+    TemplateMatch,
+    generate_from_template,
+    match_template,
+    render_template,
+)
+from infrabot.infra_utils.hcl_index import parse_blocks, resource_addresses
+from infrabot.utils.parsing import parse_code_blocks
+
+
+def test_match_template_fills_slots():
+    match = match_template(
+        "Create an S3 bucket named logs-archive with versioning in eu-west-1"
+    )
+    assert match == TemplateMatch(
+        "s3_bucket",
+        {"region": "eu-west-1", "name": "logs-archive", "versioning": True},
+    )
+
+    match = match_template("a node.js lambda with 256 MB and a 30 seconds timeout")
+    assert match.template == "lambda_function"
+    assert match.params["runtime"] == "nodejs20.x"
+    assert (match.params["memory_size"], match.params["timeout"]) == (256, 30)
+
+    match = match_template(
+        'a dynamodb table "users" with partition key user_id and sort key created_at'
+    )
+    assert match.template == "dynamodb_table"
+    assert match.params["name"] == "users"
+    assert (match.params["hash_key"], match.params["range_key"]) == (
+        "user_id",
+        "created_at",
+    )
+
+
+def test_requests_beyond_templates_fall_back_to_the_model():
+    for request in [
+        "a public s3 bucket",
+        "an s3 bucket without versioning",
+        "2 sqs queues",
+        "a lambda that reads from an sqs queue",
+        "a lambda in python and node",
+        "a lambda with 20000 MB of memory",
+        "an s3 bucket named Logs",
+        "an s3 bucket named logs in eu-west-1 and us-east-1",
+        "a bucket named with versioning",
+        "an ec2 instance",
+    ]:
+        assert match_template(request) is None, request
+
+
+def test_render_template():
+    match = match_template("an SQS FIFO queue called orders with a DLQ in us-east-1")
+    blocks = parse_code_blocks(render_template(match, "orders"))
+    assert blocks["module.tfvars"] == 'aws_region = "us-east-1"'
+    assert resource_addresses(blocks["terraform"]) == [
+        "aws_sqs_queue.orders_dead_letter",
+        "aws_sqs_queue.orders",
+    ]
+    assert 'name = "orders.fifo"' in blocks["terraform"]
+    assert "sqs_queue template" in blocks["remarks"]
+
+
+def variants(template):
+    """Parameters of a template, for all combinations of its flags and choices."""
+    flags = list(template.get("flags", {}))
+    choices = [
+        [
+            {**option["params"], **{other: other == name for other in spec["options"]}}
+            for name, option in spec["options"].items()
+        ]
+        for spec in template.get("choices", {}).values()
+    ]
+    for switches in itertools.product([True, False], repeat=len(flags) + 1):
+        for chosen in itertools.product(*choices):
+            params = dict(zip(flags, switches))
+            params["name"] = "example" if switches[-1] else None
+            for slot, spec in template.get("values", {}).items():
+                params[slot] = spec.get("default") or "key"
+            for choice in chosen:
+                params.update(choice)
+            yield params
+
+
+def test_all_template_variants_render():
+    for name, template in TERRAFORM_TEMPLATES.items():
+        for params in variants(template):
+            response = render_template(TemplateMatch(name, params))
+            code = parse_code_blocks(response)["terraform"]
+            assert "{{" not in code and "}}" not in code, (name, params)
+            assert "True" not in code and "None" not in code, (name, params)
+            assert any(block.type == "resource" for block in parse_blocks(code))
+
+
+def test_templates_can_be_disabled(monkeypatch):
+    assert generate_from_template("an sqs queue") is not None
+    monkeypatch.setenv("TERRAFORM_TEMPLATES", "false")
+    assert generate_from_template("an sqs queue") is None
+
+
+def test_components_sharing_a_root_module_do_not_clash():
+    first = parse_code_blocks(generate_from_template("an s3 bucket", "logs"))
+    second = parse_code_blocks(generate_from_template("an s3 bucket", "assets"))
+    first_keys = {block.key for block in parse_blocks(first["terraform"])}
+    second_keys = {block.key for block in parse_blocks(second["terraform"])}
+    assert "output.logs_bucket_name" in first_keys
+    assert not first_keys & second_keys
+
+    code = parse_code_blocks(generate_from_template("a dynamodb table", "2024-orders"))
+    assert 'resource "aws_dynamodb_table" "_2024-orders"' in code["terraform"]
+
+
+def test_templates_only_use_the_aws_provider():
+    for name, template in TERRAFORM_TEMPLATES.items():
+        for params in variants(template):
+            code = parse_code_blocks(render_template(TemplateMatch(name, params)))
+            for block in parse_blocks(code["terraform"]):
+                if block.type in ("resource", "data"):
+                    assert block.labels[0].startswith("aws_"), (name, block.key)
+
+
+def test_lambda_package():
+    match = match_template("a python lambda")
+    code = parse_code_blocks(render_template(match, "api"))["terraform"]
+    package = re.search(r'content_base64 = "([^"]+)"', code)[1]
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(package))) as archive:
+        assert archive.namelist() == ["index.py"]
+        assert b"def handler(event, context)" in archive.read("index.py")
+    assert 'function_name = "infrabot-api-${substr(sha1(' in code
@@ -0,0 +1,178 @@
+"""Tests for the parsing of Terraform's machine-readable output."""
+
+import json
+import os
+import shlex
+
+from infrabot.infra_utils.process import ProcessResult
+from infrabot.infra_utils.terraform import TerraformWrapper
+from infrabot.infra_utils.terraform_events import (
+    ChangeSummaryEvent,
+    DiagnosticEvent,
+    ResourceEvent,
+    TerraformError,
+    TerraformEventLog,
+    parse_event,
+)
+
+LINES = [
+    {"@level": "info", "@message": "Terraform 1.6.6", "type": "version"},
+    {
+        "@level": "info",
+        "@message": "aws_s3_bucket.logs: Plan to create",
+        "type": "planned_change",
+        "change": {
+            "resource": {
+                "addr": "aws_s3_bucket.logs",
+                "resource_type": "aws_s3_bucket",
+            },
+            "action": "create",
+        },
+    },
+    {
+        "@level": "info",
+        "@message": "aws_s3_bucket.logs: Creation complete after 2s",
+        "type": "apply_complete",
+        "hook": {
+            "resource": {
+                "addr": "aws_s3_bucket.logs",
+                "resource_type": "aws_s3_bucket",
+            },
+            "action": "create",
+            "elapsed_seconds": 2,
+        },
+    },
+    {
+        "@level": "info",
+        "@message": "Plan: 1 to add, 0 to change, 0 to destroy.",
+        "type": "change_summary",
+        "changes": {
+            "add": 1,
+            "change": 0,
+            "import": 0,
+            "remove": 0,
+            "operation": "plan",
+        },
+    },
+    {
+        "@level": "error",
+        "@message": "Error: Unsupported argument",
+        "type": "diagnostic",
+        "diagnostic": {
+            "severity": "error",
+            "summary": "Unsupported argument",
+            "detail": 'An argument named "acl2" is not expected here.',
+            "range": {"filename": "logs.tf", "start": {"line": 3}},
+            "snippet": {
+                "context": 'resource "aws_s3_bucket" "logs"',
+                "code": '  acl2 = "private"',
+            },
+        },
+    },
+]
+
+
+def test_parse_event():
+    planned = parse_event(json.dumps(LINES[1]))
+    assert isinstance(planned, ResourceEvent)
+    assert (planned.address, planned.action) == ("aws_s3_bucket.logs", "create")
+
+    applied = parse_event(json.dumps(LINES[2]))
+    assert isinstance(applied, ResourceEvent)
+    assert applied.elapsed_seconds == 2
+
+    assert isinstance(parse_event(json.dumps(LINES[3])), ChangeSummaryEvent)
+    assert isinstance(parse_event(json.dumps(LINES[4])), DiagnosticEvent)
+    assert parse_event("Initializing the backend...") is None
+
+
+def test_event_log():
+    log = TerraformEventLog()
+    for line in LINES:
+        log.feed(json.dumps(line))
+
+    assert [event.address for event in log.planned_changes] == ["aws_s3_bucket.logs"]
+    assert log.change_summary.add == 1
+    assert [error.summary for error in log.errors] == ["Unsupported argument"]
+    assert "Terraform 1.6.6" not in log.text()
+    assert "aws_s3_bucket.logs: Plan to create" in log.text()
+
+
+def test_terraform_error_renders_diagnostics():
+    log = TerraformEventLog()
+    log.feed(json.dumps(LINES[4]))
+    error = TerraformError(log.errors)
+
+    assert str(error) == (
+        "Error: Unsupported argument\n"
+        "\n"
+        '  on logs.tf line 3, in resource "aws_s3_bucket" "logs":\n'
+        '  3: acl2 = "private"\n'
+        "\n"
+        'An argument named "acl2" is not expected here.'
+    )
+    assert str(TerraformError([], stderr="boom")) == "Error: boom"
+
+
+def test_json_flag_precedes_positional_arguments(tmp_path):
+    wrapper = TerraformWrapper(str(tmp_path))
+    commands = []
+
+    def execute(command, verbose=False, cwd=None, on_output=None):
+        commands.append(shlex.split(command))
+        if "show" in command:
+            return ProcessResult(command, 0, "+ bucket = (known after apply)", "", 0, 0)
+        for line in LINES:
+            on_output(json.dumps(line))
+        return ProcessResult(command, 0, "", "", 0.0, 0.0)
+
+    wrapper.execute = execute
+    plan_file = wrapper.new_plan_file()
+    # The detailed plan is rendered from the saved plan
+    assert wrapper.plan(plan_file=plan_file) == "+ bucket = (known after apply)"
+    assert "aws_s3_bucket.logs" in wrapper.apply(plan_file=plan_file)
+    wrapper.destroy()
+    assert commands == [
+        ["terraform", "plan", "-json", "-input=false", f"-out={plan_file}"],
+        ["terraform", "show", "-no-color", plan_file],
+        ["terraform", "apply", "-json", plan_file],
+        ["terraform", "destroy", "-json", "-auto-approve"],
+    ]
+
+
+def test_plan_falls_back_to_its_events(tmp_path):
+    wrapper = TerraformWrapper(str(tmp_path))
+
+    def execute(command, verbose=False, cwd=None, on_output=None):
+        if "show" in command:
+            return ProcessResult(command, 1, "", "show failed", 0.0, 0.0)
+        for line in LINES[:4]:
+            on_output(json.dumps(line))
+        return ProcessResult(command, 0, "", "", 0.0, 0.0)
+
+    wrapper.execute = execute
+    assert "aws_s3_bucket.logs: Plan to create" in wrapper.plan()
+    # The plan saved for rendering is removed
+    assert os.listdir(os.path.dirname(wrapper.new_plan_file())) == []
+
+
+def test_paths_with_spaces_are_quoted(tmp_path):
+    wrapper = TerraformWrapper(str(tmp_path / "my project"))
+    commands = []
+
+    def execute(command, verbose=False, cwd=None, on_output=None):
+        commands.append(shlex.split(command))
+        return ProcessResult(command, 0, "{}", "", 0.0, 0.0)
+
+    wrapper.execute = execute
+    plan_file = wrapper.new_plan_file()
+    assert " " in plan_file
+    wrapper.plan(plan_file=plan_file)
+    wrapper.show_plan_json(plan_file)
+    wrapper.apply(plan_file=plan_file)
+    assert commands == [
+        ["terraform", "plan", "-json", "-input=false", f"-out={plan_file}"],
+        ["terraform", "show", "-no-color", plan_file],
+        ["terraform", "show", "-json", plan_file],
+        ["terraform", "apply", "-json", plan_file],
+    ]
@@ -0,0 +1,135 @@
+"""Tests for the requests and responses of terraform generation and fixes."""
+
+from infrabot.ai import terraform_generator
+from infrabot.ai.terraform_generator import (
+    _fix_completion_kwargs,
+    apply_fix,
+    cache_generation,
+    gen_terraform_stream,
+    generation_scope,
+    get_cached_generation,
+    get_fix_mode,
+    normalize_prompt,
+)
+from infrabot.infra_utils.terraform_events import Diagnostic
+from infrabot.utils.parsing import parse_code_blocks
+
+CODE = """resource "aws_s3_bucket" "logs" {
+  bucket = "logs"
+}
+
+output "arn" {
+  value = aws_s3_bucket.logs.arn
+}
+"""
+
+
+def test_apply_fix_full_rewrite():
+    blocks = {"terraform": 'resource "aws_sqs_queue" "jobs" {}'}
+    assert apply_fix(blocks, CODE, "aws_region = 1") == (blocks["terraform"], "")
+
+
+def test_apply_fix_patch():
+    blocks = {
+        "terraform-patch": 'resource "aws_s3_bucket" "logs" {\n  bucket_prefix = "logs-"\n}',
+        "remarks": "Use a prefix to avoid name collisions",
+    }
+    code, tfvars = apply_fix(blocks, CODE, 'aws_region = "eu-west-1"')
+    assert 'bucket_prefix = "logs-"' in code
+    assert 'bucket = "logs"' not in code
+    assert 'output "arn"' in code
+    assert tfvars == 'aws_region = "eu-west-1"'
+
+    code, _ = apply_fix({"remove": "output.arn\n"}, CODE, "")
+    assert 'output "arn"' not in code
+
+
+def test_apply_fix_without_usable_code():
+    assert apply_fix({"remarks": "Nothing to fix"}, CODE, "") is None
+    assert (
+        apply_fix({"terraform-patch": 'resource "aws_s3_bucket" {'}, CODE, "") is None
+    )
+    assert apply_fix({"remove": "resource.aws_s3_bucket.missing"}, CODE, "") is None
+
+
+def test_get_fix_mode(monkeypatch):
+    monkeypatch.delenv("TERRAFORM_FIX_MODE", raising=False)
+    assert get_fix_mode() == "patch"
+    monkeypatch.setenv("TERRAFORM_FIX_MODE", "FULL")
+    assert get_fix_mode() == "full"
+    monkeypatch.setenv("TERRAFORM_FIX_MODE", "diff")
+    assert get_fix_mode() == "patch"
+
+
+def test_fix_prompt_only_includes_referenced_blocks():
+    diagnostics = [Diagnostic("error", "Bucket exists", address="aws_s3_bucket.logs")]
+    kwargs = _fix_completion_kwargs(
+        "a bucket", CODE, "", "Error: Bucket exists", "gpt-4o", "patch", diagnostics
+    )
+    prompt = kwargs["messages"][1]["content"]
+    assert "Error: Bucket exists" in prompt
+    assert "aws_s3_bucket.logs.arn" not in prompt
+    assert "# Other blocks, unchanged: output.arn" in prompt
+    assert "prediction" not in kwargs
+
+    kwargs = _fix_completion_kwargs(
+        "a bucket", CODE, "", "Error: Bucket exists", "gpt-4o", "full", diagnostics
+    )
+    assert CODE in kwargs["messages"][1]["content"]
+    assert kwargs["prediction"]["content"] == CODE
+
+
+def test_normalize_prompt_keeps_quoted_names():
+    assert normalize_prompt('  Create an S3 bucket\n named "Logs".') == (
+        'create an s3 bucket named "Logs"'
+    )
+
+
+def test_cached_generation_skips_the_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("INFRABOT_FILE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("TERRAFORM_TEMPLATES", "false")
+    calls = []
+
+    def fake_completion(**kwargs):
+        calls.append(kwargs)
+        return iter([])
+
+    monkeypatch.setattr(terraform_generator, "completion", fake_completion)
+
+    request = "Create an S3 bucket with versioning"
+    assert get_cached_generation(request, "gpt-4o") is None
+    cache_generation(request, "gpt-4o", CODE, 'aws_region = "eu-west-1"')
+
+    response = "".join(gen_terraform_stream("create an S3 bucket with versioning"))
+    assert parse_code_blocks(response) == {
+        "terraform": CODE.strip(),
+        "module.tfvars": 'aws_region = "eu-west-1"',
+    }
+    assert calls == []
+    # Paraphrases reuse the code of the similar request
+    assert get_cached_generation("make an s3 bucket w/ versioning", "gpt-4o") == (
+        response
+    )
+    assert get_cached_generation("an s3 bucket without versioning", "gpt-4o") is None
+
+    # Other models and bypassed caches still call the model
+    list(gen_terraform_stream(request, model="gpt-4o-mini"))
+    list(gen_terraform_stream(request, use_cache=False))
+    assert len(calls) == 2
+
+
+def test_cached_generation_is_scoped_to_the_layout(tmp_path, monkeypatch):
+    monkeypatch.setenv("INFRABOT_FILE_CACHE_DIR", str(tmp_path))
+    request = "Create an S3 bucket with versioning"
+    cache_generation(request, "gpt-4o", CODE, scope=generation_scope("logs"))
+
+    # Another component of the same root module would duplicate the resources
+    assert get_cached_generation(request, "gpt-4o", generation_scope("logs"))
+    assert get_cached_generation(request, "gpt-4o", generation_scope("assets")) is None
+    assert (
+        get_cached_generation(request, "gpt-4o", generation_scope("logs", True)) is None
+    )
+
+    # Isolated components each have their own root module
+    cache_generation(request, "gpt-4o", CODE, scope=generation_scope("logs", True))
+    assert get_cached_generation(request, "gpt-4o", generation_scope("assets", True))
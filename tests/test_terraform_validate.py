@@ -0,0 +1,87 @@
+"""Tests for the local validation of components before they are planned."""
+
+import json
+
+import pytest
+
+from infrabot.infra_utils.component_manager import TerraformComponent
+from infrabot.infra_utils.process import ProcessResult
+from infrabot.infra_utils.terraform import TerraformWrapper
+from infrabot.infra_utils.terraform_events import TerraformError
+
+INVALID = {
+    "format_version": "1.0",
+    "valid": False,
+    "error_count": 1,
+    "warning_count": 0,
+    "diagnostics": [
+        {
+            "severity": "error",
+            "summary": "Unsupported argument",
+            "detail": 'An argument named "bucket_nam" is not expected here.',
+            "range": {"filename": "logs.tf", "start": {"line": 2}},
+            "snippet": {"code": '  bucket_nam = "logs"'},
+        }
+    ],
+}
+
+
+def fake_wrapper(tmp_path, results):
+    """A wrapper whose commands return `results` in order, recording them."""
+    wrapper = TerraformWrapper(str(tmp_path))
+    wrapper.commands = []
+
+    def execute(command, verbose=False, cwd=None, on_output=None):
+        wrapper.commands.append(command)
+        returncode, stdout, stderr = results.pop(0)
+        return ProcessResult(command, returncode, stdout, stderr, 0.0, 0.0)
+
+    wrapper.execute = execute
+    return wrapper
+
+
+def make_component(tmp_path):
+    component = TerraformComponent(
+        name="logs",
+        terraform_code='resource "aws_s3_bucket" "logs" {}',
+        workdir=str(tmp_path),
+    )
+    with open(component.tf_file_path, "w") as f:
+        f.write(component.terraform_code)
+    return component
+
+
+def test_validate_raises_diagnostics(tmp_path):
+    wrapper = fake_wrapper(tmp_path, [(1, json.dumps(INVALID), "")])
+    with pytest.raises(TerraformError) as error:
+        wrapper.validate(make_component(tmp_path))
+    assert wrapper.commands == ["terraform validate -json"]
+    assert error.value.diagnostics[0].summary == "Unsupported argument"
+    assert str(error.value).startswith("Error: Unsupported argument")
+    assert "on logs.tf line 2" in str(error.value)
+
+
+def test_validate_returns_warnings(tmp_path):
+    report = {
+        "valid": True,
+        "diagnostics": [{"severity": "warning", "summary": "Deprecated attribute"}],
+    }
+    wrapper = fake_wrapper(tmp_path, [(0, json.dumps(report), "")])
+    warnings = wrapper.validate(make_component(tmp_path))
+    assert [w.summary for w in warnings] == ["Deprecated attribute"]
+
+
+def test_fmt(tmp_path):
+    component = make_component(tmp_path)
+    wrapper = fake_wrapper(tmp_path, [(0, "", "")])
+    assert not wrapper.fmt(component)
+    assert wrapper.commands == ["terraform fmt -check -list=false logs.tf"]
+
+    # Valid but badly formatted files are formatted in place
+    wrapper = fake_wrapper(tmp_path, [(3, "", ""), (0, "", "")])
+    assert wrapper.fmt(component)
+    assert wrapper.commands[1] == "terraform fmt -list=false logs.tf"
+
+    wrapper = fake_wrapper(tmp_path, [(2, "", "Error: Invalid expression")])
+    with pytest.raises(Exception, match="Invalid expression"):
+        wrapper.fmt(component)
@@ -1,5 +1,5 @@
 import { useEffect, useState } from "react";
-import { infrabotApi, CreateComponentResponse } from "@/lib/api";
+import { infrabotApi, CreateComponentResponse, JobEvent } from "@/lib/api";
 import { useProject } from "@/context/ProjectContext";
 
 // Shared state for component output
@@ -8,6 +8,7 @@ const listeners: Set<(output: CreateComponentResponse | null) => void> = new Set
 
 export function useInfrabot() {
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState<JobEvent[]>([]);
   const [componentOutput, setComponentOutput] = useState<CreateComponentResponse | null>(sharedComponentOutput);
   const { currentProject } = useProject();
 
@@ -25,16 +26,20 @@ export function useInfrabot() {
   const createComponent = async (prompt: string) => {
     try {
       setIsLoading(true);
+      setProgress([]);
 
       if (!currentProject) {
         throw new Error("No project selected");
       }
 
-      const response = await infrabotApi.createComponent({
-        prompt,
-        workdir: currentProject,
-        self_healing: true, // Enable self-healing by default
-      });
+      const response = await infrabotApi.createComponentStream(
+        {
+          prompt,
+          workdir: currentProject,
+          self_healing: true, // Enable self-healing by default
+        },
+        (event) => setProgress((events) => [...events, event]),
+      );
 
       // Update shared state
       sharedComponentOutput = response;
@@ -63,6 +68,7 @@ export function useInfrabot() {
 
   return {
     isLoading,
+    progress,
     componentOutput,
     createComponent,
   };
@@ -4,6 +4,7 @@ export interface InitProjectParams {
   workdir?: string;
   verbose?: boolean;
   local?: boolean;
+  isolated?: boolean;
 }
 
 export interface InitProjectResponse {
@@ -21,6 +22,17 @@ export interface CreateComponentParams {
   keep_on_failure?: boolean;
   langfuse_session_id?: string | null;
   workdir?: string;
+  background?: boolean;
+  no_cache?: boolean;
+}
+
+export interface FixedError {
+  attempt: number;
+  error: string;
+  fix_source: "llm" | "memory";
+  duration: number;
+  time_saved: number;
+  hit_rate: number;
 }
 
 export interface CreateComponentResponse {
@@ -33,16 +45,63 @@ export interface CreateComponentResponse {
   outputs: Record<string, string>;
   formatted_outputs?: string;
   self_healing_attempts?: number;
-  fixed_errors?: string[];
+  fixed_errors?: FixedError[];
   diagram?: string;
 }
 
+export interface JobResponse {
+  job_id: string;
+  status: "pending" | "running" | "completed" | "failed";
+  stage: string;
+  created_at: number;
+  started_at?: number | null;
+  finished_at?: number | null;
+  error_message?: string;
+  result?: CreateComponentResponse | null;
+}
+
+export interface JobEvent {
+  stage: string;
+  timestamp: number;
+  data: Record<string, any>;
+}
+
 export interface ListProjectsResponse {
   success: boolean;
   message: string;
   projects: string[];
 }
 
+// Stages emitted by the component creation pipeline
+export const JOB_STAGES = [
+  "generating",
+  "generation_progress",
+  "code_block",
+  "generated",
+  "saving",
+  "initializing",
+  "validating",
+  "planning",
+  "change_summary",
+  "summarizing",
+  "planned",
+  "applying",
+  "resource_progress",
+  "applied",
+  "fetching_outputs",
+  "outputs",
+  "formatting_outputs",
+  "formatted_outputs",
+  "generating_diagram",
+  "diagram",
+  "self_healing",
+  "fix_progress",
+  "fixed",
+  "cancelled",
+  "completed",
+  "failed",
+];
+
 export const infrabotApi = {
   // Initialize a project
   async initProject(projectName: string, parentDir: string): Promise<InitProjectResponse> {
@@ -60,6 +119,47 @@ export const infrabotApi = {
     return response.json();
   },
 
+  // Create a component as a background job, streaming its stage events
+  async createComponentStream(
+    params: CreateComponentParams,
+    onEvent?: (event: JobEvent) => void,
+  ): Promise<CreateComponentResponse> {
+    const response = await apiRequest("POST", "/api/component/create", {
+      ...params,
+      background: true,
+    });
+    const job: JobResponse = await response.json();
+
+    return new Promise((resolve, reject) => {
+      const source = new EventSource(`/api/jobs/${encodeURIComponent(job.job_id)}/events`);
+
+      const handle = (message: MessageEvent) => {
+        const event: JobEvent = JSON.parse(message.data);
+        onEvent?.(event);
+
+        if (event.stage === "completed" || event.stage === "failed") {
+          source.close();
+          if (event.data.result) {
+            resolve(event.data.result as CreateComponentResponse);
+          } else {
+            reject(new Error(event.data.error || "Component creation failed"));
+          }
+        }
+      };
+
+      for (const stage of JOB_STAGES) {
+        source.addEventListener(stage, handle as EventListener);
+      }
+
+      source.onerror = () => {
+        // EventSource reconnects on its own; only give up once the stream is closed
+        if (source.readyState === EventSource.CLOSED) {
+          reject(new Error("Lost connection to the job event stream"));
+        }
+      };
+    });
+  },
+
   // List projects
   async listProjects(parentDir: string): Promise<ListProjectsResponse> {
     const url = `/api/projects?parent_dir=${encodeURIComponent(parentDir)}`;
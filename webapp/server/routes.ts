@@ -13,7 +13,7 @@ export async function registerRoutes(app: Express): Promise<Server> {
   // Initialize a project
   app.post(`${apiPrefix}/init`, async (req, res) => {
     try {
-      const { workdir, verbose, local } = req.body;
+      const { workdir, verbose, local, isolated } = req.body;
 
       // Validation
       if (!workdir) {
@@ -33,7 +33,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
           body: JSON.stringify({
             workdir,
             verbose: verbose || false,
-            local: local || false
+            local: local || false,
+            isolated: isolated || false
           }),
         });
 
@@ -72,7 +73,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
         max_attempts = 3,
         keep_on_failure = true,
         langfuse_session_id = null,
-        workdir
+        workdir,
+        background = false
       } = req.body;
 
       // Validation
@@ -105,7 +107,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
             max_attempts,
             keep_on_failure,
             langfuse_session_id,
-            workdir
+            workdir,
+            background
           }),
         });
 
@@ -133,6 +136,62 @@ export async function registerRoutes(app: Express): Promise<Server> {
     }
   });
 
+  // Get the status of a background job
+  app.get(`${apiPrefix}/jobs/:jobId`, async (req, res) => {
+    try {
+      const response = await fetch(`${INFRABOT_API_URL}/jobs/${encodeURIComponent(req.params.jobId)}`);
+      const data = await response.json();
+      return res.status(response.status).json(data);
+    } catch (error: unknown) {
+      const apiError = error as Error;
+      console.error("Error calling InfraBot API:", apiError);
+      return res.status(502).json({
+        success: false,
+        message: "Failed to retrieve job from InfraBot API",
+        error: apiError.message
+      });
+    }
+  });
+
+  // Relay the server-sent events stream of a background job
+  app.get(`${apiPrefix}/jobs/:jobId/events`, async (req, res) => {
+    try {
+      const headers: Record<string, string> = {};
+      const lastEventId = req.header("Last-Event-ID");
+      if (lastEventId) {
+        headers["Last-Event-ID"] = lastEventId;
+      }
+
+      const response = await fetch(
+        `${INFRABOT_API_URL}/jobs/${encodeURIComponent(req.params.jobId)}/events`,
+        { headers }
+      );
+
+      if (!response.ok || !response.body) {
+        return res.status(response.status).json(await response.json());
+      }
+
+      res.writeHead(200, {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+      });
+      response.body.pipe(res);
+      req.on("close", () => {
+        response.body?.unpipe(res);
+      });
+    } catch (error: unknown) {
+      const apiError = error as Error;
+      console.error("Error calling InfraBot API:", apiError);
+      return res.status(502).json({
+        success: false,
+        message: "Failed to stream job events from InfraBot API",
+        error: apiError.message
+      });
+    }
+  });
+
   // List projects
   app.get(`${apiPrefix}/projects`, async (req, res) => {
     try {